@@ -0,0 +1,88 @@
+"""
+Benchmark de datos astronómicos
+Compara el cálculo con astral en cada petición (sol, crepúsculos, orto y
+ocaso de la Luna y fase) con las tablas anuales: cálculo vectorizado del año,
+apertura de las tablas ya guardadas y consulta de un día o del próximo evento.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_astronomy --requests 200
+"""
+import argparse
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from astral import Observer
+from astral.moon import moonrise, moonset, phase
+from astral.sun import dawn, dusk, sun
+
+from services.astronomy_tables import PHASE_EVENTS, AstronomyTables, compute_tables
+
+LOCATION = {"latitude": 39.98, "longitude": -0.03, "elevation": 30}
+
+def astral_day(day: date) -> dict:
+    """Lo mismo que una consulta a las tablas, calculado con astral"""
+    observer = Observer(LOCATION["latitude"], LOCATION["longitude"], LOCATION["elevation"])
+    result = sun(observer, date=day)
+    for depression in (12, 18):
+        result[f"dawn_{depression}"] = dawn(observer, day, depression)
+        result[f"dusk_{depression}"] = dusk(observer, day, depression)
+    for name, fn in (("moonrise", moonrise), ("moonset", moonset)):
+        try:
+            result[name] = fn(observer, day)
+        except ValueError:
+            result[name] = None
+    result["phase"] = phase(day)
+    return result
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    today = date.today()
+    days = [today + timedelta(days=k % 300) for k in range(args.requests)]
+    legacy = best_of(lambda: [astral_day(day) for day in days], args.repeat) / args.requests
+    build = best_of(lambda: compute_tables(today.year, LOCATION["latitude"], LOCATION["longitude"], LOCATION["elevation"]), args.repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tables = AstronomyTables(tmp)
+        tables.ensure(LOCATION, today)
+        table_bytes = tables.get_stats()["bytes"]
+        reopen = best_of(lambda: AstronomyTables(tmp).ensure(LOCATION, today), args.repeat)
+
+        def lookup(day: date):
+            tables.day(day)
+            start = time.mktime(day.timetuple())
+            tables.between(start, start + 86400, ("moonrise", "moonset"))
+
+        lookups = best_of(lambda: [lookup(day) for day in days], args.repeat) / args.requests
+        now = time.time()
+        next_event = best_of(lambda: [tables.next_events(now, PHASE_EVENTS, 4) for _ in days], args.repeat) / args.requests
+
+    print(f"{args.requests} consultas de día; tablas del año: {table_bytes / 1024:.0f} KiB")
+    print(f"{'operación':<44} {'tiempo':>12}")
+    for label, value in (
+        ("astral por petición (anterior)", f"{legacy * 1e6:.0f} µs"),
+        ("cálculo vectorizado del año", f"{build * 1000:.1f} ms"),
+        ("apertura de las tablas guardadas", f"{reopen * 1000:.2f} ms"),
+        ("consulta de un día (sol, Luna, fase)", f"{lookups * 1e6:.1f} µs"),
+        ("próximas 4 fases", f"{next_event * 1e6:.1f} µs"),
+    ):
+        print(f"{label:<44} {value:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Benchmark del calendario ICS
+Genera un calendario sintético (eventos sueltos con líneas plegadas y TZID,
+más un 5 % de eventos periódicos con EXDATE) y compara el parseo con
+expresiones regulares anterior, que se repetía en cada petición, con el
+parser en streaming, el índice ordenado, la comprobación de cambios por mtime
+y la carga del calendario ya parseado al arrancar.
+
+Con --remote sirve el calendario desde un servidor HTTP local y comprueba la
+sincronización remota: 304 por ETag y por Last-Modified, cuerpo sin cambios
+en un servidor sin validadores, fuente caída o lenta aislada, cambio de
+contenido y arranque con los validadores guardados.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_calendar --events 50000
+    python -m benchmarks.bench_calendar --events 5000 --remote
+"""
+import argparse
+import asyncio
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import web
+
+from models.config import CalendarConfig, CalendarSource
+from services.calendar_service import CalendarService
+from services.http_client import HttpClient
+from services.ics_parser import EventIndex, ICSCalendar
+
+RULES = (
+    "FREQ=WEEKLY;BYDAY=MO,WE,FR",
+    "FREQ=DAILY;INTERVAL=2;COUNT=200",
+    "FREQ=MONTHLY;BYDAY=-1FR",
+    "FREQ=YEARLY"
+)
+
+def write_calendar(path: Path, events: int, seed: int = 42):
+    rng = random.Random(seed)
+    now = datetime.now()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//bench//ES\r\n")
+        for k in range(events):
+            start = now + timedelta(minutes=rng.randint(-2 * 365 * 24 * 60, 2 * 365 * 24 * 60))
+            end = start + timedelta(minutes=rng.choice((30, 60, 90)))
+            description = f"Descripción larga del evento {k} " * 4
+            f.write("BEGIN:VEVENT\r\n")
+            f.write(f"UID:{k}@bench\r\n")
+            f.write(f"SUMMARY:Evento {k}\r\n")
+            f.write(f"DTSTART;TZID=Europe/Madrid:{start:%Y%m%dT%H%M%S}\r\n")
+            f.write(f"DTEND;TZID=Europe/Madrid:{end:%Y%m%dT%H%M%S}\r\n")
+            # Plegado de líneas a 75 octetos como hacen Google Calendar u Outlook
+            line = f"DESCRIPTION:{description}"
+            f.write(line[:75] + "\r\n" + "".join(f" {line[i:i + 74]}\r\n" for i in range(75, len(line), 74)))
+            if k % 20 == 0:
+                f.write(f"RRULE:{RULES[(k // 20) % len(RULES)]}\r\n")
+                f.write(f"EXDATE;TZID=Europe/Madrid:{start + timedelta(days=7):%Y%m%dT%H%M%S}\r\n")
+            f.write("END:VEVENT\r\n")
+        f.write("END:VCALENDAR\r\n")
+
+def legacy_get_events(ics_file: Path) -> list:
+    """Implementación anterior de get_events: regex sobre el fichero completo en cada petición"""
+    with open(ics_file, "r", encoding="utf-8") as f:
+        content = f.read()
+    parsed = []
+    for event_text in re.findall(r"BEGIN:VEVENT(.*?)END:VEVENT", content, re.DOTALL):
+        event = {}
+        summary_match = re.search(r"SUMMARY:(.*)", event_text)
+        if summary_match:
+            event["summary"] = summary_match.group(1).strip()
+        dtstart_match = re.search(r"DTSTART[^:]*:(.*)", event_text)
+        if dtstart_match:
+            value = dtstart_match.group(1).strip()
+            event["start"] = f"{value[0:4]}-{value[4:6]}-{value[6:8]}T{value[9:11]}:{value[11:13]}:{value[13:15]}"
+        if event.get("summary") and event.get("start"):
+            parsed.append(event)
+    now = datetime.now()
+    future = [e for e in parsed if datetime.fromisoformat(e["start"].replace("Z", "+00:00")) > now]
+    future.sort(key=lambda x: x["start"])
+    return future[:10]
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+async def timed(coro) -> float:
+    t0 = time.perf_counter()
+    await coro
+    return time.perf_counter() - t0
+
+async def local_requests(tmp: str, horizon_days: int) -> dict:
+    """Fichero local a través de get_events: primera petición, fichero sin cambios y arranque"""
+    config = CalendarConfig(ics_filename="bench.ics", horizon_days=horizon_days)
+    service = CalendarService(tmp)
+    first = await timed(service.get_events(config))
+    requests = 1000
+    unchanged = await timed(asyncio.gather(*(service.get_events(config) for _ in range(requests))))
+
+    # Arranque: calendario ya parseado guardado en data/calendars.json
+    restarted = CalendarService(tmp)
+    startup = await timed(restarted.get_events(config))
+    return {
+        "first": first,
+        "unchanged_us": unchanged / requests * 1e6,
+        "startup": startup,
+        "store_mib": service.store_file.stat().st_size / 1024 / 1024,
+        "reparsed": restarted.calendars["file:bench.ics"].parsed
+    }
+
+class StandIn:
+    """Servidor ICS local: con ETag, con Last-Modified, sin validadores, caído y lento"""
+
+    LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+    def __init__(self, content: bytes, slow_seconds: float):
+        self.content = content
+        self.version = 1
+        self.slow_seconds = slow_seconds
+        self.requests = {}
+        self.app = web.Application()
+        for name, handler in (
+            ("etag", self.etag), ("lastmod", self.lastmod), ("plain", self.plain),
+            ("broken", self.broken), ("slow", self.slow)
+        ):
+            self.app.router.add_get(f"/{name}.ics", handler)
+        self.runner = web.AppRunner(self.app)
+        self.base_url = None
+
+    async def start(self):
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def _count(self, request: web.Request, status: int) -> int:
+        key = (request.path, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        return status
+
+    def body(self) -> bytes:
+        # Cada versión añade un evento al final del calendario
+        extra = "".join(
+            f"BEGIN:VEVENT\r\nUID:extra-{k}@bench\r\nSUMMARY:Extra {k}\r\nDTSTART:20991231T100000Z\r\nEND:VEVENT\r\n"
+            for k in range(self.version - 1)
+        ).encode()
+        return self.content.replace(b"END:VCALENDAR", extra + b"END:VCALENDAR")
+
+    async def etag(self, request: web.Request) -> web.Response:
+        etag = f'"v{self.version}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=self._count(request, 304))
+        return web.Response(body=self.body(), status=self._count(request, 200), headers={"ETag": etag})
+
+    async def lastmod(self, request: web.Request) -> web.Response:
+        if request.headers.get("If-Modified-Since") == self.LAST_MODIFIED:
+            return web.Response(status=self._count(request, 304))
+        return web.Response(body=self.content, status=self._count(request, 200), headers={"Last-Modified": self.LAST_MODIFIED})
+
+    async def plain(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.content, status=self._count(request, 200))
+
+    async def broken(self, request: web.Request) -> web.Response:
+        return web.Response(status=self._count(request, 500))
+
+    async def slow(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.slow_seconds)
+        return web.Response(body=self.content, status=self._count(request, 200))
+
+async def remote_sync(tmp: str, content: bytes, horizon_days: int) -> list:
+    """Sincronización remota contra el servidor local: (paso, tiempo, comprobaciones)"""
+    stand_in = StandIn(content, slow_seconds=2.0)
+    await stand_in.start()
+    http = HttpClient()
+    names = ("etag", "lastmod", "plain", "broken", "slow")
+    config = CalendarConfig(
+        sources=[CalendarSource(name=name, url=f"{stand_in.base_url}/{name}.ics") for name in names],
+        source_timeout=0.5,
+        horizon_days=horizon_days
+    )
+    urls = {name: source.url for name, source in zip(names, config.sources)}
+    steps = []
+    try:
+        service = CalendarService(tmp, http_client=http)
+        elapsed = await timed(service.get_events(config))
+        state = {name: service.calendars[url] for name, url in urls.items()}
+        first_events = len(service.index)
+        steps.append(("primera sincronización", elapsed, [
+            ("3 calendarios parseados", all(state[name].parsed == 1 for name in ("etag", "lastmod", "plain"))),
+            ("fuente caída aislada", state["broken"].errors == 1 and state["broken"].calendar is None),
+            ("fuente lenta cortada por source_timeout", state["slow"].last_error == "TimeoutError"),
+        ]))
+
+        elapsed = await timed(service.get_events(config))
+        steps.append(("resincronización sin cambios", elapsed, [
+            ("304 por ETag", state["etag"].not_modified == 1 and stand_in.requests.get(("/etag.ics", 304)) == 1),
+            ("304 por Last-Modified", state["lastmod"].not_modified == 1),
+            ("cuerpo sin cambios sin reparsear", state["plain"].unchanged == 1 and state["plain"].parsed == 1),
+            ("sin reparseos", all(state[name].parsed == 1 for name in ("etag", "lastmod", "plain"))),
+            ("mismos eventos", len(service.index) == first_events),
+        ]))
+
+        stand_in.version = 2
+        elapsed = await timed(service.get_events(config))
+        steps.append(("calendario remoto modificado", elapsed, [
+            ("nuevo ETag reparseado", state["etag"].parsed == 2 and state["etag"].etag == '"v2"'),
+            ("el resto sigue sin reparsear", state["lastmod"].parsed == 1 and state["plain"].parsed == 1),
+        ]))
+
+        restarted = CalendarService(tmp, http_client=http)
+        elapsed = await timed(restarted.get_events(config))
+        state = {name: restarted.calendars[url] for name, url in urls.items()}
+        steps.append(("arranque con validadores guardados", elapsed, [
+            ("304 sin reparsear", state["etag"].not_modified == 1 and state["etag"].parsed == 0),
+            ("caída conserva su error y no su copia", state["broken"].calendar is None),
+            ("mismos eventos que antes del reinicio", len(restarted.index) == len(service.index)),
+        ]))
+    finally:
+        await http.close()
+        await stand_in.stop()
+    return steps
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--horizon-days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--remote", action="store_true", help="sincronización contra un servidor HTTP local")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ics_file = Path(tmp) / "bench.ics"
+        write_calendar(ics_file, args.events)
+        size_mib = ics_file.stat().st_size / 1024 / 1024
+
+        if args.remote:
+            steps = asyncio.run(remote_sync(tmp, ics_file.read_bytes(), args.horizon_days))
+            print(f"{args.events} eventos ({size_mib:.1f} MiB) servidos por HTTP local")
+            failed = 0
+            for label, elapsed, checks in steps:
+                print(f"{label:<44} {elapsed * 1000:>9.1f} ms")
+                for check, ok in checks:
+                    print(f"    {'ok   ' if ok else 'FALLO'} {check}")
+                    failed += not ok
+            sys.exit(1 if failed else 0)
+
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        horizon = today + timedelta(days=args.horizon_days)
+        legacy = best_of(lambda: legacy_get_events(ics_file), args.repeat)
+        parse = best_of(lambda: ICSCalendar.from_file(ics_file), args.repeat)
+        calendar = ICSCalendar.from_file(ics_file)
+        expand = best_of(lambda: calendar.expand(today, horizon), args.repeat)
+        events = calendar.expand(today, horizon)
+        build = best_of(lambda: EventIndex(events), args.repeat)
+        index = EventIndex(events)
+        now = datetime.now()
+        lookups = 10000
+        t0 = time.perf_counter()
+        for _ in range(lookups):
+            index.upcoming(now, 10)
+        lookup_us = (time.perf_counter() - t0) / lookups * 1e6
+
+        service = asyncio.run(local_requests(tmp, args.horizon_days))
+
+    print(f"{args.events} eventos ({size_mib:.1f} MiB), {len(events)} ocurrencias en {args.horizon_days} días")
+    print(f"{'operación':<44} {'tiempo':>12}")
+    for label, value in (
+        ("regex + filtro por petición (anterior)", f"{legacy * 1000:.1f} ms"),
+        ("parseo en streaming (al cambiar el fichero)", f"{parse * 1000:.1f} ms"),
+        ("expansión RRULE/EXDATE (una vez al día)", f"{expand * 1000:.1f} ms"),
+        ("construcción del índice", f"{build * 1000:.1f} ms"),
+        ("próximos 10 eventos (bisect)", f"{lookup_us:.2f} µs"),
+        ("get_events: primera petición", f"{service['first'] * 1000:.1f} ms"),
+        ("get_events: fichero sin cambios", f"{service['unchanged_us']:.2f} µs"),
+        (f"get_events: arranque ({service['store_mib']:.1f} MiB guardados)", f"{service['startup'] * 1000:.1f} ms"),
+    ):
+        print(f"{label:<44} {value:>12}")
+    if service["reparsed"]:
+        print("aviso: el arranque volvió a parsear el ICS")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark de las respuestas de capas geográficas
+Mide latencia p50/p99 y bytes transferidos de /api/ships, /api/flights y
+/api/storms con capas sintéticas (2000 barcos, 500 aviones, 3000 rayos):
+serialización anterior (jsonable_encoder + json) frente a orjson, con y sin
+gzip/brotli, en frío (capa cambiada) y en caliente (mismo ETag), y el
+formato binario columnar (Accept: application/vnd.reloj.layer) de barcos y rayos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_geo_responses --requests 200
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+import main
+from models.config import get_default_config
+from services.geo_response import brotli
+from services.layer_codec import LAYER_MEDIA_TYPE
+
+ROUTES = ("/api/ships", "/api/flights", "/api/storms")
+BINARY_ROUTES = ("/api/ships", "/api/storms")
+
+def seed_layers(ships: int, flights: int, strikes: int):
+    """Rellenar los servicios con datos sintéticos sin conectar a AIS, OpenSky ni MQTT"""
+    rng = random.Random(42)
+    config = get_default_config()
+    config.storm.location = {"lat": 39.5, "lon": 0.2}
+    main.config_service._config = config
+
+    # Mensajes tal como llegan por el WebSocket de AIS Stream, por la misma ruta de ingesta por lotes
+    messages = [json.dumps({
+        "MessageType": "PositionReport",
+        "MetaData": {"MMSI": 224000000 + mmsi, "ShipName": f"VESSEL {mmsi}"},
+        "Message": {"PositionReport": {
+            "UserID": 224000000 + mmsi,
+            "Longitude": rng.uniform(-1.0, 1.5),
+            "Latitude": rng.uniform(38.0, 41.0),
+            "Sog": rng.uniform(0, 20),
+            "Cog": rng.uniform(0, 360),
+            "TrueHeading": rng.randint(0, 359)
+        }}
+    }) for mmsi in range(ships)]
+    batch_size = main.ships_service.batch_size
+    for k in range(0, len(messages), batch_size):
+        main.ships_service._process_batch(messages[k:k + batch_size])
+
+    now = time.time()
+    states = [[
+        f"{k:06x}", f"VLG{k:04d}", "Spain", now, now,
+        rng.uniform(-1.0, 1.5), rng.uniform(38.0, 41.0), rng.uniform(0, 12000),
+        False, rng.uniform(50, 250), rng.uniform(0, 360), 0, None, 0, None, False, 0
+    ] for k in range(flights)]
+    collection = main.flights_service._process_opensky_data({"states": states}, config.flights)
+    main.flights_service._record_changes(collection["features"])
+    collection["cursor"] = main.flights_service.changes.version
+    source = main.scheduler.sources["flights"]
+    source.snapshot = collection
+    source.updated_at = now
+
+    main.storm_service.running = True
+    main.storm_service._apply_config(config.storm)
+    main.storm_service._process_batch([json.dumps({
+        "lat": 39.5 + rng.gauss(0, 0.3),
+        "lon": 0.2 + rng.gauss(0, 0.3),
+        "time": now - rng.uniform(0, 300),
+        "amplitude": rng.uniform(-50, 50),
+        "station_count": rng.randint(3, 20)
+    }).encode() for _ in range(strikes)])
+
+def percentiles(samples: list) -> tuple:
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return p50 * 1000, p99 * 1000
+
+def bench_legacy(client: TestClient, route: str, requests: int) -> tuple:
+    """Serialización anterior: dict -> jsonable_encoder -> json.dumps (solo CPU, sin HTTP)"""
+    content = client.get(route, headers={"Accept-Encoding": "identity"}).json()
+    samples = []
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        body = json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+        samples.append(time.perf_counter() - t0)
+    return percentiles(samples), len(body)
+
+def bench_route(client: TestClient, route: str, encoding: str, requests: int, warm: bool, accept: str = "application/json") -> tuple:
+    samples = []
+    size = 0
+    for _ in range(requests):
+        if not warm:
+            main.geo_encoder.bodies.clear()
+        t0 = time.perf_counter()
+        response = client.get(route, headers={"Accept-Encoding": encoding, "Accept": accept})
+        samples.append(time.perf_counter() - t0)
+        size = int(response.headers["content-length"])
+    return percentiles(samples), size
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--ships", type=int, default=2000)
+    parser.add_argument("--flights", type=int, default=500)
+    parser.add_argument("--strikes", type=int, default=3000)
+    args = parser.parse_args()
+
+    seed_layers(args.ships, args.flights, args.strikes)
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+
+    # Sin "with": no se arranca el lifespan (ni el planificador ni conexiones externas)
+    client = TestClient(main.app)
+    print(f"{'ruta':<12} {'modo':<22} {'p50 (ms)':>9} {'p99 (ms)':>9} {'bytes':>9}")
+    for route in ROUTES:
+        (p50, p99), size = bench_legacy(client, route, args.requests)
+        print(f"{route:<12} {'json (serialización)':<22} {p50:>9.2f} {p99:>9.2f} {size:>9}")
+        for warm in (False, True):
+            for encoding in encodings:
+                (p50, p99), size = bench_route(client, route, encoding, args.requests, warm)
+                mode = f"{encoding} ({'caliente' if warm else 'frío'})"
+                print(f"{route:<12} {mode:<22} {p50:>9.2f} {p99:>9.2f} {size:>9}")
+        if route in BINARY_ROUTES:
+            for encoding in ("identity", "gzip"):
+                (p50, p99), size = bench_route(client, route, encoding, args.requests, False, LAYER_MEDIA_TYPE)
+                mode = f"binario {encoding} (frío)"
+                print(f"{route:<12} {mode:<22} {p50:>9.2f} {p99:>9.2f} {size:>9}")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,139 @@
+"""
+Benchmark de memoria de los barcos en seguimiento
+Mide los bytes por buque del registro anterior (dict nuevo con lista anidada
+por mensaje) frente a VesselRecord con __slots__ más la tabla de datos
+estáticos, y el coste por actualización de posición de cada uno; también el
+total del servicio completo (índice espacial, clusters y caducidad incluidos).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_ship_memory --vessels 5000 --updates 200000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.ships_service import ShipsService
+from services.vessels import VesselRecord, StaticDataTable
+
+def legacy_record(rng: random.Random, mmsi: int, now: float) -> dict:
+    """Registro por mensaje anterior: dict nuevo con la lista de coordenadas"""
+    return {
+        "name": f"VESSEL {mmsi}",
+        "coordinates": [rng.uniform(-1.0, 1.5), rng.uniform(38.0, 41.0)],
+        "sog": rng.uniform(0, 20),
+        "cog": rng.uniform(0, 360),
+        "heading": rng.randint(0, 359),
+        "ts": now
+    }
+
+def measure(build) -> tuple:
+    """Bytes asignados y vivos tras construir una estructura (la estructura se devuelve para mantenerla viva)"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return size, result
+
+def build_legacy(vessels: int) -> dict:
+    rng = random.Random(42)
+    now = time.time()
+    return {str(224000000 + k): legacy_record(rng, k, now) for k in range(vessels)}
+
+def build_compact(vessels: int) -> tuple:
+    rng = random.Random(42)
+    now = time.time()
+    ships = {}
+    static = StaticDataTable(max_entries=vessels)
+    for k in range(vessels):
+        mmsi = str(224000000 + k)
+        ships[mmsi] = VesselRecord(rng.uniform(-1.0, 1.5), rng.uniform(38.0, 41.0),
+                                   rng.uniform(0, 20), rng.uniform(0, 360), rng.randint(0, 359), now)
+        static.note_name(mmsi, f"VESSEL {k}", now)
+    return ships, static
+
+def position_message(rng: random.Random, mmsi: int) -> str:
+    return json.dumps({
+        "MessageType": "PositionReport",
+        "MetaData": {"MMSI": mmsi, "ShipName": f"VESSEL {mmsi}"},
+        "Message": {"PositionReport": {
+            "UserID": mmsi,
+            "Longitude": rng.uniform(-1.0, 1.5),
+            "Latitude": rng.uniform(38.0, 41.0),
+            "Sog": rng.uniform(0, 20),
+            "Cog": rng.uniform(0, 360),
+            "TrueHeading": rng.randint(0, 359)
+        }}
+    })
+
+def build_service(vessels: int) -> ShipsService:
+    rng = random.Random(42)
+    messages = [position_message(rng, 224000000 + k) for k in range(vessels)]
+    service = ShipsService()
+    service.static_data.max_entries = vessels
+    service._process_batch(messages)
+    return service
+
+def bench_updates(vessels: int, updates: int) -> tuple:
+    """µs por actualización de posición: reconstruir el dict frente a actualizar in situ"""
+    rng = random.Random(7)
+    keys = [str(224000000 + rng.randrange(vessels)) for _ in range(updates)]
+    values = [(rng.uniform(-1.0, 1.5), rng.uniform(38.0, 41.0), rng.uniform(0, 20),
+               rng.uniform(0, 360), rng.randint(0, 359)) for _ in range(updates)]
+    now = time.time()
+
+    legacy = build_legacy(vessels)
+    t0 = time.perf_counter()
+    for mmsi, (lon, lat, sog, cog, heading) in zip(keys, values):
+        legacy[mmsi] = {
+            "name": legacy[mmsi]["name"],
+            "coordinates": [lon, lat],
+            "sog": sog,
+            "cog": cog,
+            "heading": heading,
+            "ts": now
+        }
+    legacy_us = (time.perf_counter() - t0) / updates * 1e6
+
+    ships, _ = build_compact(vessels)
+    t0 = time.perf_counter()
+    for mmsi, (lon, lat, sog, cog, heading) in zip(keys, values):
+        ships[mmsi].update(lon, lat, sog, cog, heading, now)
+    compact_us = (time.perf_counter() - t0) / updates * 1e6
+    return legacy_us, compact_us
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vessels", type=int, default=5000)
+    parser.add_argument("--updates", type=int, default=200000)
+    args = parser.parse_args()
+
+    legacy_bytes, _ = measure(lambda: build_legacy(args.vessels))
+    compact_bytes, _ = measure(lambda: build_compact(args.vessels))
+    records_bytes, _ = measure(lambda: build_compact(args.vessels)[0])
+    service_bytes, _ = measure(lambda: build_service(args.vessels))
+
+    print(f"{args.vessels} buques")
+    print(f"{'estructura':<34} {'bytes/buque':>12} {'total (KiB)':>12}")
+    for label, size in (
+        ("dict + lista (anterior)", legacy_bytes),
+        ("VesselRecord + tabla estática", compact_bytes),
+        ("  solo VesselRecord (posición)", records_bytes),
+        ("ShipsService completo", service_bytes),
+    ):
+        print(f"{label:<34} {size / args.vessels:>12.0f} {size / 1024:>12.0f}")
+
+    legacy_us, compact_us = bench_updates(args.vessels, args.updates)
+    print(f"\nactualización de posición ({args.updates} mensajes)")
+    print(f"{'dict nuevo por mensaje':<34} {legacy_us:>9.3f} µs")
+    print(f"{'VesselRecord.update in situ':<34} {compact_us:>9.3f} µs")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,97 @@
+"""
+Benchmark de ingesta de rayos
+Reproduce una tormenta sintética a N rayos/s y compara la lista original
+(reconstruida en cada mensaje) con la ingesta de StormService: mensajes
+encolados con _enqueue (como desde el hilo MQTT) y decodificados por lotes
+con _process_batch en el consumidor del bucle de eventos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_storm_ingest --rate 1000 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.config import StormConfig
+from services.storm_service import StormService
+
+def synthetic_storm(rate: int, seconds: int, start: float):
+    """Rayos alrededor de un núcleo que se desplaza, con timestamps crecientes"""
+    rng = random.Random(42)
+    lat, lon = 39.5, -0.5
+    total = rate * seconds
+    for k in range(total):
+        lat += rng.uniform(-0.001, 0.001)
+        lon += rng.uniform(-0.001, 0.001)
+        yield {
+            "lat": lat + rng.gauss(0, 0.2),
+            "lon": lon + rng.gauss(0, 0.2),
+            "time": start + k / rate,
+            "amplitude": rng.uniform(-50, 50),
+            "station_count": rng.randint(3, 20)
+        }
+
+def legacy_ingest(strikes: list, payload: bytes, now_ms: float) -> list:
+    """Implementación anterior: decodificar, append y reconstrucción completa de la lista"""
+    data = json.loads(payload)
+    strikes.append({
+        "coordinates": [data.get("lon", 0), data.get("lat", 0)],
+        "ts": data.get("time") * 1000,
+        "amplitude": data.get("amplitude", 0),
+        "station_count": data.get("station_count", 0)
+    })
+    return [s for s in strikes if now_ms - s.get("ts", 0) < 600000]
+
+async def service_ingest(service: StormService, messages: list, rate: int) -> float:
+    """Ruta de producción: _enqueue por mensaje y consumidor por lotes (_process_batch)"""
+    service.loop = asyncio.get_running_loop()
+    service.consumer_task = asyncio.create_task(service._consume())
+    t0 = time.perf_counter()
+    # Un segundo de tormenta por bloque: el consumidor vacía la cola entre bloques
+    for k in range(0, len(messages), rate):
+        for payload in messages[k:k + rate]:
+            service._enqueue(payload)
+        while service.inbox or service.wakeup_pending:
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - t0
+    service.consumer_task.cancel()
+    await asyncio.gather(service.consumer_task, return_exceptions=True)
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=1000, help="rayos por segundo")
+    parser.add_argument("--seconds", type=int, default=10, help="duración de la tormenta simulada")
+    parser.add_argument("--skip-legacy", action="store_true", help="no medir la implementación anterior")
+    args = parser.parse_args()
+
+    start = time.time() - args.seconds
+    messages = [json.dumps(data).encode() for data in synthetic_storm(args.rate, args.seconds, start)]
+    total = len(messages)
+    print(f"Tormenta sintética: {total} rayos ({args.rate}/s durante {args.seconds}s)")
+
+    service = StormService()
+    service._apply_config(StormConfig(max_points=3000, ttl_seconds=600, queue_size=max(args.rate, StormConfig().queue_size)))
+    elapsed = asyncio.run(service_ingest(service, messages, args.rate))
+    print(f"Buffer circular: {elapsed * 1000:.1f} ms total, {elapsed / total * 1e6:.2f} µs/rayo, "
+          f"{total / elapsed:,.0f} rayos/s, {len(service.strikes)} retenidos, "
+          f"{service.stats['batches']} lotes, {service.stats['dropped']} descartados")
+
+    if not args.skip_legacy:
+        strikes = []
+        now_ms = time.time() * 1000
+        t0 = time.perf_counter()
+        for payload in messages:
+            strikes = legacy_ingest(strikes, payload, now_ms)
+        elapsed = time.perf_counter() - t0
+        print(f"Lista original:  {elapsed * 1000:.1f} ms total, {elapsed / total * 1e6:.2f} µs/rayo, "
+              f"{total / elapsed:,.0f} rayos/s, {len(strikes)} retenidos")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark del filtro por radio de rayos
+Compara el bucle Python original (distancia plana * 111) con el filtro
+haversine vectorizado con prefiltro por bounding box.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_storm_radius --sizes 3000 30000 300000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.geodesy import radius_filter
+
+CENTER_LAT, CENTER_LON = 39.98, -0.03
+RADIUS_KM = 80
+
+def legacy_filter(strikes: list) -> list:
+    """Implementación anterior de get_storms (solo la parte de filtrado)"""
+    selected = []
+    for strike in strikes:
+        lon, lat = strike["coordinates"]
+        distance_km = ((lat - CENTER_LAT) ** 2 + (lon - CENTER_LON) ** 2) ** 0.5 * 111
+        if distance_km > RADIUS_KM:
+            continue
+        selected.append(strike)
+    return selected
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3000, 30000, 300000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'rayos':>8} {'bucle (ms)':>12} {'numpy (ms)':>12} {'speedup':>8} {'dentro':>8} {'dentro (plano)':>15}")
+    for size in args.sizes:
+        # Tormenta sobre la península: parte de los rayos dentro del radio
+        lats = rng.uniform(36.0, 44.0, size)
+        lons = rng.uniform(-9.0, 4.0, size)
+        strikes = [{"coordinates": [lon, lat]} for lon, lat in zip(lons.tolist(), lats.tolist())]
+
+        legacy = best_of(lambda: legacy_filter(strikes), args.repeat)
+        vectorized = best_of(lambda: radius_filter(CENTER_LAT, CENTER_LON, RADIUS_KM, lats, lons), args.repeat)
+        inside = len(radius_filter(CENTER_LAT, CENTER_LON, RADIUS_KM, lats, lons)[0])
+        inside_flat = len(legacy_filter(strikes))
+        print(f"{size:>8} {legacy * 1000:>12.2f} {vectorized * 1000:>12.2f} {legacy / vectorized:>7.1f}x "
+              f"{inside:>8} {inside_flat:>15}")
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,16 @@ import os
 import json
 import hashlib
 import psutil
-from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Optional
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from typing import List, Optional
+import asyncio
+import time
+from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 import uvicorn
 
@@ -30,8 +33,35 @@ from services.seasonal_service import SeasonalService
 from services.calendar_service import CalendarService
 from services.wifi_service import WifiService
 from services.health_service import HealthService
+from services.http_client import HttpClient
+from services.executor import BlockingExecutor, LoopLagMonitor
+from services.metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from services.scheduler import RefreshScheduler
+from services.stream_hub import LAYERS as STREAM_LAYERS, StreamHub
+from services.layer_versions import parse_cursor, variant_etag
+from services.geo_response import GeoResponseEncoder
+from services.layer_codec import LAYER_MEDIA_TYPE, wants_binary, encode_layer
+from services.vector_tiles import MVT_MEDIA_TYPE, BUFFER, TileCache, encode_tile, tile_bounds, valid_tile
 
-app = FastAPI(title="Pantalla Reloj Dashboard API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque y parada de recursos compartidos"""
+    config = config_service.get_config()
+    await loop_monitor.start()
+    await http_client.start(config.http)
+    _configure_clusters(config.map)
+    scheduler.configure(config.scheduler.jitter, config.scheduler.max_backoff_seconds)
+    await scheduler.start()
+    await ships_service.start(lambda: config_service.get_config().ships)
+    yield
+    await ships_service.stop()
+    await scheduler.stop()
+    await storm_service.stop()
+    await http_client.close()
+    await loop_monitor.stop()
+    executor.shutdown()
+
+app = FastAPI(title="Pantalla Reloj Dashboard API", version="1.0.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -42,21 +72,160 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    """Latencia por plantilla de ruta (/api/tiles/{layer}/... en lugar de cada URL)"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_latency.observe(
+            time.perf_counter() - started,
+            getattr(route, "path", "unmatched"),
+            request.method,
+            str(status)
+        )
+
 # Servicios
-config_service = ConfigService()
-weather_service = WeatherService()
-aemet_service = AemetService()
-ships_service = ShipsService()
-flights_service = FlightsService()
-storm_service = StormService()
-news_service = NewsService()
+metrics = MetricsRegistry()
+route_latency = metrics.histogram(
+    "http_request_duration_seconds",
+    "Duración de las peticiones HTTP por ruta",
+    ("route", "method", "status")
+)
+http_client = HttpClient(metrics)
+executor = BlockingExecutor()
+loop_monitor = LoopLagMonitor()
+stream_hub = StreamHub()
+flights_service = FlightsService(http_client, stream_hub)
+config_service = ConfigService(http_client=http_client, executor=executor, flights_service=flights_service)
+weather_service = WeatherService(http_client)
+aemet_service = AemetService(http_client, executor)
+ships_service = ShipsService(stream_hub)
+storm_service = StormService(stream_hub)
+news_service = NewsService(http_client, executor)
 ephemerides_service = EphemeridesService()
 santoral_service = SantoralService()
-astronomy_service = AstronomyService()
+astronomy_service = AstronomyService(executor=executor)
 seasonal_service = SeasonalService()
-calendar_service = CalendarService()
-wifi_service = WifiService()
-health_service = HealthService()
+calendar_service = CalendarService(executor=executor, http_client=http_client)
+wifi_service = WifiService(executor)
+health_service = HealthService(executor=executor, metrics=metrics)
+scheduler = RefreshScheduler()
+geo_encoder = GeoResponseEncoder()
+tile_cache = TileCache()
+
+# Fuentes refrescadas en segundo plano; las rutas sirven la última instantánea
+EMPTY_COLLECTION = {"type": "FeatureCollection", "features": []}
+scheduler.register(
+    "weather",
+    lambda: weather_service.get_weather(config_service.get_config().weather, refresh=True),
+    lambda: config_service.get_config().scheduler.weather_seconds
+)
+scheduler.register(
+    "aemet",
+    lambda: aemet_service.get_radar_data(config_service.get_config().aemet),
+    lambda: aemet_service.next_refresh_in(
+        config_service.get_config().aemet, config_service.get_config().scheduler.aemet_seconds
+    )
+)
+scheduler.register(
+    "flights",
+    lambda: flights_service.get_flights(config_service.get_config().flights, refresh=True),
+    lambda: flights_service.poll_interval(
+        config_service.get_config().flights, config_service.get_config().scheduler.flights_seconds
+    ),
+    default=EMPTY_COLLECTION
+)
+scheduler.register(
+    "news",
+    lambda: news_service.get_news(config_service.get_config().news, refresh=True),
+    lambda: config_service.get_config().scheduler.news_seconds
+)
+scheduler.register(
+    "astronomy",
+    lambda: astronomy_service.get_astronomy(config_service.get_config().astronomy),
+    lambda: config_service.get_config().scheduler.astronomy_seconds
+)
+scheduler.register(
+    "calendar",
+    lambda: calendar_service.get_events(config_service.get_config().calendar),
+    lambda: config_service.get_config().scheduler.calendar_seconds
+)
+
+health_service.register_stats("event_loop", loop_monitor.get_stats)
+health_service.register_stats("executor", executor.get_stats)
+health_service.register_stats("http", http_client.get_stats)
+health_service.register_stats("scheduler", scheduler.get_stats)
+health_service.register_stats("ais", ships_service.get_stats)
+health_service.register_stats("storm", storm_service.get_stats)
+health_service.register_stats("stream", stream_hub.get_stats)
+health_service.register_stats("news_feeds", news_service.get_stats)
+health_service.register_stats("geo_responses", geo_encoder.get_stats)
+health_service.register_stats("tiles", tile_cache.get_stats)
+health_service.register_stats("opensky", lambda: flights_service.get_stats(config_service.get_config().flights))
+health_service.register_stats("flight_tracks", flights_service.tracks.get_stats)
+health_service.register_stats("aemet_frames", aemet_service.get_stats)
+health_service.register_stats("calendar", calendar_service.get_stats)
+health_service.register_stats("astronomy", astronomy_service.get_stats)
+health_service.register_stats("clusters", lambda: {
+    "ships": ships_service.clusters.get_stats(),
+    "flights": flights_service.clusters.get_stats(),
+    "storms": storm_service.clusters.get_stats()
+})
+health_service.register_stats("cache", lambda: {
+    "weather": weather_service.cache.get_stats(),
+    "aemet": aemet_service.cache.get_stats(),
+    "news": news_service.cache.get_stats(),
+    "flights": flights_service.cache.get_stats()
+})
+
+def _source_status(name: str, enabled: bool = True, count=None) -> dict:
+    """Estado de un servicio refrescado por el planificador"""
+    source = scheduler.sources[name]
+    status = {"status": "stopped"}
+    if not enabled:
+        status["details"] = "deshabilitado"
+    elif source.last_error:
+        status = {"status": "error", "details": source.last_error}
+    elif source.updated_at is not None:
+        status = {"status": "ok"}
+    if source.updated_at is not None:
+        status["last_update_ts"] = source.updated_at
+    if count is not None:
+        status["count"] = count
+    return status
+
+def _ships_status() -> dict:
+    stats = ships_service.get_stats()
+    state = {"connected": "connected", "connecting": "running", "backoff": "error"}.get(stats["state"], "stopped")
+    return {"status": state, "details": stats["state"], "count": stats["vessels"], "last_msg_ts": stats["last_msg_ts"]}
+
+def _storm_status() -> dict:
+    stats = storm_service.get_stats()
+    return {
+        "status": "connected" if storm_service.running else "stopped",
+        "count": stats["store"]["count"],
+        "last_msg_ts": stats["last_msg_ts"]
+    }
+
+health_service.register_service("weather", lambda: _source_status("weather"))
+health_service.register_service("aemet", lambda: _source_status("aemet", bool(config_service.get_config().aemet.api_key)))
+health_service.register_service("news", lambda: _source_status("news"))
+health_service.register_service("ships", _ships_status)
+health_service.register_service("flights", lambda: _source_status(
+    "flights", config_service.get_config().flights.enabled, len(flights_service.features_by_id)
+))
+health_service.register_service("storm", _storm_status)
+
+def _configure_clusters(map_config):
+    """Niveles de agrupación de las capas según el rango de zoom del mapa"""
+    for clusters in (ships_service.clusters, flights_service.clusters, storm_service.clusters):
+        clusters.configure(map_config.zoom_min, map_config.cluster_max_zoom, map_config.cluster_radius_px)
 
 # Montar archivos estáticos del frontend (después de build)
 if Path("frontend/dist").exists():
@@ -75,7 +244,19 @@ async def get_config():
 async def update_config_group(group_name: str, data: dict):
     """Actualizar un grupo de configuración"""
     try:
-        config_service.update_group(group_name, data)
+        await config_service.update_group(group_name, data)
+        config = config_service.get_config()
+        if group_name == "http":
+            await http_client.start(config.http)
+        if group_name == "map":
+            _configure_clusters(config.map)
+        if group_name == "ships":
+            ships_service.reconfigure()
+        if group_name == "scheduler":
+            scheduler.configure(config.scheduler.jitter, config.scheduler.max_backoff_seconds)
+            scheduler.trigger()
+        else:
+            scheduler.trigger(group_name)
         return {"ok": True, "message": f"Configuración de {group_name} guardada correctamente"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -94,47 +275,290 @@ async def health():
     """Health check del sistema"""
     return await health_service.get_health()
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(metrics.render(health_service.collect_stats()), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/api/weather")
 async def get_weather():
     """Obtener datos meteorológicos"""
-    config = config_service.get_config()
-    return await weather_service.get_weather(config.weather)
+    return await scheduler.get_or_refresh("weather")
 
 @app.get("/api/aemet/radar")
 async def get_aemet_radar():
     """Obtener datos del radar AEMET"""
-    config = config_service.get_config()
-    return await aemet_service.get_radar_data(config.aemet)
+    return await scheduler.get_or_refresh("aemet")
+
+@app.get("/api/aemet/frames/{ts}")
+async def get_aemet_frame(ts: int):
+    """Imagen de radar cacheada en disco (inmutable: cada timestamp es un fotograma distinto)"""
+    frame = await aemet_service.get_frame(ts)
+    if frame is None:
+        raise HTTPException(status_code=404, detail="Fotograma no disponible")
+    path, media_type = frame
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/api/aemet/overlays/{ts}")
+async def get_aemet_overlay(request: Request, ts: int, zoom: Optional[float] = None):
+    """Fotograma reproyectado a Web Mercator con fondo transparente (PNG, o WebP si se acepta)"""
+    webp = "image/webp" in request.headers.get("accept", "")
+    overlay = await aemet_service.get_overlay(ts, zoom, webp)
+    if overlay is None:
+        raise HTTPException(status_code=404, detail="Superposición no disponible")
+    content, media_type = overlay
+    return Response(content, media_type=media_type, headers={
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Vary": "Accept"
+    })
+
+async def _layer_response(
+    request: Request,
+    layer: str,
+    etag: str,
+    since: Optional[str],
+    get_changes,
+    get_full,
+    get_columns=None,
+    cursor_of=None
+) -> Response:
+    """Respuesta de capa versionada: 304 si no hay cambios, delta con ?since= o colección completa.
+
+    Si la capa tiene get_columns y el cliente acepta LAYER_MEDIA_TYPE, la
+    colección completa se envía en el formato binario columnar.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    binary = get_columns is not None and wants_binary(request.headers.get("accept"))
+    if get_columns is not None:
+        headers["Vary"] = "Accept, Accept-Encoding"
+        if binary:
+            # Mismo contenido en otro formato: ETag distinto para las cachés intermedias
+            headers["ETag"] = etag = variant_etag(etag, "bin")
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    cursor = parse_cursor(since)
+    if cursor is not None:
+        changes = get_changes(cursor)
+        if changes is not None:
+            return geo_encoder.response(request, {"type": "FeatureCollectionDelta", **changes}, headers)
+    if binary:
+        return await geo_encoder.layer_response(
+            request, f"{layer}.bin", etag, get_columns, headers,
+            serialize=lambda columns: encode_layer(columns, cursor_of()),
+            media_type=LAYER_MEDIA_TYPE
+        )
+    # Cursor ausente, inválido o demasiado antiguo: colección completa (cuerpo compartido por ETag)
+    return await geo_encoder.layer_response(request, layer, etag, get_full, headers)
+
+def _parse_bbox(value: Optional[str]) -> Optional[List[float]]:
+    """bbox "lon_min,lat_min,lon_max,lat_max" de la query (None si falta o no es válido)"""
+    try:
+        bbox = [float(v) for v in value.split(",")] if value else None
+    except ValueError:
+        return None
+    return bbox if bbox and len(bbox) == 4 else None
+
+async def _cluster_response(request: Request, layer: str, etag: str, level: int, bbox: Optional[List[float]], get_clusters) -> Response:
+    """Capa agrupada para un nivel de zoom (ETag propio por nivel y bbox)"""
+    etag = variant_etag(etag, "clusters", level, bbox)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return await geo_encoder.layer_response(request, f"{layer}.clusters", etag, get_clusters, headers)
 
 @app.get("/api/ships")
-async def get_ships():
-    """Obtener datos de barcos (AIS)"""
+async def get_ships(request: Request, since: Optional[str] = None, zoom: Optional[float] = None, bbox: Optional[str] = None):
+    """Obtener datos de barcos (AIS); con ?zoom= por debajo de cluster_max_zoom se agrupan"""
     config = config_service.get_config()
     if not config.ships.enabled:
         return {"type": "FeatureCollection", "features": []}
-    return await ships_service.get_ships(config.ships)
+    level = ships_service.clusters.clusters_zoom(zoom)
+    if level is not None:
+        area = _parse_bbox(bbox)
+        return await _cluster_response(
+            request, "ships", ships_service.get_etag(config.ships), level, area,
+            lambda: ships_service.get_ship_clusters(config.ships, level, area)
+        )
+    return await _layer_response(
+        request,
+        "ships",
+        ships_service.get_etag(config.ships),
+        since,
+        lambda cursor: ships_service.get_changes(config.ships, cursor),
+        lambda: ships_service.get_ships(config.ships),
+        lambda: ships_service.get_ship_columns(config.ships),
+        lambda: ships_service.changes.version
+    )
 
 @app.get("/api/flights")
-async def get_flights():
-    """Obtener datos de aviones"""
+async def get_flights(request: Request, since: Optional[str] = None, zoom: Optional[float] = None, bbox: Optional[str] = None):
+    """Obtener datos de aviones; con ?zoom= por debajo de cluster_max_zoom se agrupan"""
+    config = config_service.get_config()
+    if not config.flights.enabled:
+        return {"type": "FeatureCollection", "features": []}
+    level = flights_service.clusters.clusters_zoom(zoom)
+    if level is not None:
+        area = _parse_bbox(bbox)
+        
+        async def get_clusters():
+            await scheduler.get_or_refresh("flights")
+            return flights_service.get_flight_clusters(config.flights, level, area)
+        
+        return await _cluster_response(request, "flights", flights_service.get_etag(config.flights), level, area, get_clusters)
+    return await _layer_response(
+        request,
+        "flights",
+        flights_service.get_etag(config.flights),
+        since,
+        lambda cursor: flights_service.get_changes(config.flights, cursor),
+        lambda: scheduler.get_or_refresh("flights")
+    )
+
+@app.get("/api/flights/predicted")
+async def get_predicted_flights(request: Request, at: Optional[float] = None):
+    """Aviones con la posición estimada en ?at= (timestamp Unix, por defecto ahora) a partir del último vector de estado"""
     config = config_service.get_config()
     if not config.flights.enabled:
         return {"type": "FeatureCollection", "features": []}
-    return await flights_service.get_flights(config.flights)
+    await scheduler.get_or_refresh("flights")
+    at = at if at is not None else datetime.now().timestamp()
+    return geo_encoder.response(request, flights_service.get_predicted_flights(config.flights, at), {"Cache-Control": "no-store"})
+
+@app.get("/api/flights/{icao24}/track")
+async def get_flight_track(request: Request, icao24: str):
+    """Trayectoria reciente de un avión (LineString con altitud y tiempos)"""
+    track = flights_service.get_track(icao24)
+    if track is None:
+        raise HTTPException(status_code=404, detail=f"Sin trayectoria para {icao24}")
+    return geo_encoder.response(request, track)
 
 @app.get("/api/storms")
-async def get_storms():
-    """Obtener datos de tormentas (rayos)"""
+async def get_storms(request: Request, since: Optional[str] = None, zoom: Optional[float] = None, bbox: Optional[str] = None):
+    """Obtener datos de tormentas (rayos); con ?zoom= por debajo de cluster_max_zoom se agrupan"""
     config = config_service.get_config()
     if not config.storm.enabled:
         return {"type": "FeatureCollection", "features": []}
-    return await storm_service.get_storms(config.storm)
+    level = storm_service.clusters.clusters_zoom(zoom)
+    if level is not None:
+        area = _parse_bbox(bbox)
+        return await _cluster_response(
+            request, "storms", storm_service.get_etag(config.storm), level, area,
+            lambda: storm_service.get_storm_clusters(config.storm, level, area)
+        )
+    return await _layer_response(
+        request,
+        "storms",
+        storm_service.get_etag(config.storm),
+        since,
+        lambda cursor: storm_service.get_changes(config.storm, cursor),
+        lambda: storm_service.get_storms(config.storm),
+        lambda: storm_service.get_storm_columns(config.storm),
+        lambda: storm_service.strikes.total
+    )
+
+@app.get("/api/tiles/{layer}/{z}/{x}/{y}.mvt")
+async def get_tile(request: Request, layer: str, z: int, x: int, y: int):
+    """Tesela vectorial (MVT) de una capa en tiempo real; agrupada por debajo de cluster_max_zoom"""
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tesela fuera de rango")
+    config = config_service.get_config()
+    bbox = tile_bounds(z, x, y, BUFFER)
+    if layer == "ships" and config.ships.enabled:
+        level = ships_service.clusters.clusters_zoom(z)
+        version = ships_service.get_etag(config.ships)
+        get_features = lambda: ships_service.get_tile_features(config.ships, bbox, level)
+    elif layer == "storms" and config.storm.enabled:
+        level = storm_service.clusters.clusters_zoom(z)
+        version = storm_service.get_etag(config.storm)
+        get_features = lambda: storm_service.get_tile_features(config.storm, bbox, level)
+    elif layer == "flights" and config.flights.enabled:
+        level = flights_service.clusters.clusters_zoom(z)
+        await scheduler.get_or_refresh("flights")
+        version = flights_service.get_etag(config.flights)
+
+        async def get_features():
+            return flights_service.get_tile_features(config.flights, bbox, level)
+    elif layer in ("ships", "storms", "flights"):
+        return Response(status_code=204)
+    else:
+        raise HTTPException(status_code=404, detail=f"Capa desconocida: {layer}")
+
+    etag = variant_etag(version, "tile", z, x, y)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    tile = tile_cache.get((layer, z, x, y), version)
+    if tile is None:
+        tile = encode_tile(layer, await get_features(), z, x, y)
+        tile_cache.put((layer, z, x, y), version, tile)
+    if not tile:
+        return Response(status_code=204, headers=headers)
+    return geo_encoder.bytes_response(request, tile, MVT_MEDIA_TYPE, headers)
+
+async def _layer_snapshot(layer: str) -> dict:
+    """FeatureCollection actual de una capa (respetando si está habilitada)"""
+    config = config_service.get_config()
+    if layer == "ships" and config.ships.enabled:
+        return await ships_service.get_ships(config.ships)
+    if layer == "flights" and config.flights.enabled:
+        return await scheduler.get_or_refresh("flights")
+    if layer == "storms" and config.storm.enabled:
+        return await storm_service.get_storms(config.storm)
+    return {"type": "FeatureCollection", "features": []}
+
+@app.websocket("/api/stream")
+async def stream(websocket: WebSocket):
+    """Actualizaciones en tiempo real por capa (barcos, aviones, rayos).
+
+    El cliente se suscribe con {"type": "subscribe", "layers": [...], "bbox": [...]}
+    (o con ?layers=ships,storms&bbox=lon_min,lat_min,lon_max,lat_max) y recibe
+    primero un "snapshot" de cada capa y después solo los cambios.
+    """
+    await websocket.accept()
+    layers = [l for l in websocket.query_params.get("layers", "").split(",") if l]
+    bbox = _parse_bbox(websocket.query_params.get("bbox"))
+    subscriber = stream_hub.subscribe(layers, bbox)
+
+    async def send_snapshots(layer_names):
+        for layer in layer_names:
+            snapshot = await _layer_snapshot(layer)
+            features = [f for f in snapshot["features"] if subscriber.accepts(f)]
+            subscriber.offer({"layer": layer, "op": "snapshot", "features": features})
+
+    async def receive_commands():
+        while True:
+            message = await websocket.receive_json()
+            if message.get("type") == "subscribe":
+                subscriber.update(message.get("layers", []), message.get("bbox"))
+                await send_snapshots(subscriber.layers)
+            elif message.get("type") == "resync":
+                layer = message.get("layer")
+                if not layer:
+                    await send_snapshots(subscriber.layers)
+                elif layer in STREAM_LAYERS:
+                    # Un nombre de capa desconocido no debe cerrar el stream
+                    await send_snapshots([layer])
+
+    async def send_updates():
+        while True:
+            message = await subscriber.queue.get()
+            await websocket.send_json(message)
+
+    await send_snapshots(subscriber.layers)
+    tasks = [asyncio.create_task(receive_commands()), asyncio.create_task(send_updates())]
+    # La desconexión se produce dentro de las tareas y termina en gather
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stream_hub.unsubscribe(subscriber)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 @app.get("/api/news")
 async def get_news():
     """Obtener noticias"""
-    config = config_service.get_config()
-    return await news_service.get_news(config.news)
+    return await scheduler.get_or_refresh("news")
 
 @app.get("/api/ephemerides")
 async def get_ephemerides():
@@ -150,8 +574,15 @@ async def get_santoral():
 @app.get("/api/astronomy")
 async def get_astronomy():
     """Obtener datos astronómicos"""
-    config = config_service.get_config()
-    return await astronomy_service.get_astronomy(config.astronomy)
+    return await scheduler.get_or_refresh("astronomy")
+
+@app.get("/api/astronomy/days/{day}")
+async def get_astronomy_day(day: date):
+    """Datos astronómicos de un día (consulta directa a las tablas anuales precalculadas)"""
+    data = await astronomy_service.get_day_data(config_service.get_config().astronomy, day)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Día fuera de las tablas astronómicas")
+    return data
 
 @app.get("/api/seasonal")
 async def get_seasonal():
@@ -161,8 +592,7 @@ async def get_seasonal():
 @app.get("/api/calendar")
 async def get_calendar():
     """Obtener eventos del calendario"""
-    config = config_service.get_config()
-    return await calendar_service.get_events(config.calendar)
+    return await scheduler.get_or_refresh("calendar")
 
 @app.post("/api/calendar/upload")
 async def upload_calendar(file: UploadFile = File(...)):
@@ -170,6 +600,7 @@ async def upload_calendar(file: UploadFile = File(...)):
     try:
         content = await file.read()
         result = await calendar_service.upload_ics(file.filename, content)
+        scheduler.trigger("calendar")
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
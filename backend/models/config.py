@@ -13,6 +13,9 @@ class MapConfig(BaseModel):
     center: List[float] = [-0.038, 39.986]
     zoom_min: int = 6
     zoom_max: int = 12
+    cluster_max_zoom: int = 10  # por debajo de este zoom las capas se sirven agrupadas
+    cluster_radius_px: int = 60
+    live_layers: Literal["geojson", "tiles"] = "geojson"  # "tiles": barcos/aviones/rayos como teselas MVT
 
 class AemetConfig(BaseModel):
     api_key: str = ""
@@ -20,6 +23,7 @@ class AemetConfig(BaseModel):
     animation_speed: float = 1.0
     frame_count: int = 6
     cache_ttl: int = 600
+    frame_cache_mb: int = 50  # límite de la caché de fotogramas de radar en disco (data/aemet)
 
 class WeatherConfig(BaseModel):
     provider: Literal["Open-Meteo", "OpenWeatherMap"] = "Open-Meteo"
@@ -27,6 +31,7 @@ class WeatherConfig(BaseModel):
     units: Literal["metric", "imperial"] = "metric"
     language: Literal["es", "en"] = "es"
     location: dict = {"latitude": 39.98, "longitude": -0.03}
+    cache_ttl: int = 300
 
 class NewsSource(BaseModel):
     name: str
@@ -34,6 +39,10 @@ class NewsSource(BaseModel):
 
 class NewsConfig(BaseModel):
     sources: List[NewsSource] = [NewsSource(name="El País", url="https://feeds.elpais.com/mrss-s/pages/ep/site/elpais.com/portada")]
+    cache_ttl: int = 600
+    max_items: int = 20
+    max_per_source: int = 5
+    source_timeout: float = 10.0  # una fuente lenta no retrasa al resto
 
 class AstronomyConfig(BaseModel):
     location: dict = {"latitude": 39.98, "longitude": -0.03, "elevation": 30}
@@ -41,8 +50,17 @@ class AstronomyConfig(BaseModel):
 class EphemeridesConfig(BaseModel):
     language: Literal["es", "en"] = "es"
 
+class CalendarSource(BaseModel):
+    name: str
+    url: str  # ICS (https:// o webcal://), p. ej. la dirección secreta de Google Calendar o la exportación CalDAV
+    username: Optional[str] = None
+    password: Optional[str] = None
+
 class CalendarConfig(BaseModel):
     ics_filename: Optional[str] = None
+    sources: List[CalendarSource] = []  # calendarios remotos sincronizados en segundo plano
+    source_timeout: float = 20.0
+    horizon_days: int = 365  # ventana de expansión de eventos periódicos (RRULE)
 
 class StormMQTTConfig(BaseModel):
     host: str = "127.0.0.1"
@@ -59,10 +77,11 @@ class StormConfig(BaseModel):
     max_points: int = 3000
     max_radius_km: int = 80
     location: Optional[dict] = None
+    queue_size: int = 10000
 
 class ShipsSubscription(BaseModel):
     BoundingBoxes: List[List[float]] = [[-1.0, 38.0, 1.5, 41.0]]
-    FilterMessageTypes: List[str] = ["PositionReport"]
+    FilterMessageTypes: List[str] = ["PositionReport", "StandardClassBPositionReport", "ShipStaticData"]
 
 class ShipsConfig(BaseModel):
     enabled: bool = True
@@ -73,6 +92,9 @@ class ShipsConfig(BaseModel):
     ws_url: str = "wss://stream.aisstream.io/v0/stream"
     subscription: ShipsSubscription = ShipsSubscription()
     auth: Optional[dict] = None
+    reconnect_max_seconds: int = 60
+    idle_timeout_seconds: int = 90  # sin mensajes durante este tiempo se reconecta
+    static_ttl_seconds: int = 86400  # nombre, tipo y dimensiones de los buques
 
 class FlightsConfig(BaseModel):
     enabled: bool = True
@@ -81,10 +103,33 @@ class FlightsConfig(BaseModel):
     ttl_seconds: int = 30
     client_id: str = ""
     client_secret: str = ""
+    track_points: int = 20  # posiciones recientes guardadas por avión
+    max_extrapolation_seconds: int = 60  # límite de la estima entre consultas
+    max_features: int = 1000
+    shard_max_area: float = 100.0  # grados²; bbox mayores se piden por teselas en paralelo
+    daily_credits: int = 0  # 0 = cupo de OpenSky según haya credenciales (400 / 4000)
 
 class WifiConfig(BaseModel):
     interface: str = "wlp2s0"
 
+class HttpConfig(BaseModel):
+    connect_timeout: float = 5.0
+    total_timeout: float = 20.0
+    limit: int = 30
+    limit_per_host: int = 6
+    keepalive_timeout: float = 60.0
+    dns_cache_ttl: int = 300
+
+class SchedulerConfig(BaseModel):
+    weather_seconds: int = 300
+    aemet_seconds: int = 600
+    flights_seconds: int = 30  # mínimo; se alarga para no agotar los créditos de OpenSky
+    news_seconds: int = 600
+    astronomy_seconds: int = 3600
+    calendar_seconds: int = 300
+    jitter: float = 0.1
+    max_backoff_seconds: int = 1800
+
 class DebugConfig(BaseModel):
     log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR"] = "INFO"
 
@@ -101,6 +146,8 @@ class AppConfig(BaseModel):
     ships: ShipsConfig = ShipsConfig()
     flights: FlightsConfig = FlightsConfig()
     wifi: WifiConfig = WifiConfig()
+    http: HttpConfig = HttpConfig()
+    scheduler: SchedulerConfig = SchedulerConfig()
     debug: DebugConfig = DebugConfig()
 
 def get_default_config() -> AppConfig:
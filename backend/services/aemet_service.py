@@ -2,14 +2,33 @@
 Servicio de datos AEMET
 Radar de precipitaciones
 """
-import aiohttp
+import hashlib
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from models.config import AemetConfig
+from services.executor import BlockingExecutor
+from services.frame_cache import DiskFrameCache
+from services.http_client import HttpClient
+from services.radar_overlay import RadarOverlays, available as overlays_available, corner_coordinates
+from services.response_cache import ResponseCache
+
+RADAR_URL = "https://opendata.aemet.es/opendata/api/red/radar/nacional"
+FRAME_INTERVAL = 600  # AEMET publica una imagen de radar cada 10 minutos
+PUBLISH_DELAY = 120  # margen hasta que la imagen del intervalo está disponible
+PUBLISH_RETRY = 60  # reintento si la imagen del intervalo todavía no ha cambiado
 
 class AemetService:
-    def __init__(self):
-        self.cache = {}
+    def __init__(self, http_client: HttpClient = None, executor: BlockingExecutor = None, frames_dir: str = "data/aemet"):
+        self.http = http_client or HttpClient()
+        self.executor = executor or BlockingExecutor()
+        self.cache = ResponseCache("aemet")
+        self.frames = DiskFrameCache(frames_dir)
+        self.overlays = RadarOverlays()
+        self.last_digest: Optional[str] = None
+        self.awaiting_publish = False
     
     async def get_radar_data(self, config: AemetConfig) -> Dict:
         """Obtener datos del radar AEMET"""
@@ -26,34 +45,128 @@ class AemetService:
                 })
             return {"frames": frames}
         
-        # Con API key, hacer llamada real a AEMET
-        # La API de AEMET requiere autenticación y tiene un formato específico
-        # Por ahora retornamos un placeholder que indica que se necesita implementar
-        # la integración completa con la API de AEMET
-        
-        url = "https://opendata.aemet.es/opendata/api/radar/nacional"
-        headers = {"api_key": config.api_key}
-        
+        # Una descarga por intervalo de 10 minutos, reutilizada durante cache_ttl;
+        # si la imagen aún no había cambiado se vuelve a pedir
+        slot = self._slot(time.time())
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # Procesar datos de AEMET según su formato
-                        # Esto requiere conocimiento del formato específico de AEMET
-                        frames = self._process_aemet_data(data, config)
-                        return {"frames": frames}
-                    else:
-                        raise Exception(f"Error en AEMET API: {response.status}")
+            await self.cache.get_or_fetch(
+                slot,
+                config.cache_ttl,
+                lambda: self._fetch_frame(config),
+                max_stale=0,
+                refresh=self.awaiting_publish
+            )
         except Exception as e:
             print(f"Error obteniendo datos de AEMET: {e}")
+        
+        frames = self._cached_frames(config)
+        if not frames:
             # Fallback a datos simulados
             return await self._get_fallback_radar(config)
+        return {"frames": frames, "coordinates": corner_coordinates()}
+    
+    async def get_frame(self, ts: int) -> Optional[Tuple[Path, str]]:
+        """Ruta y tipo MIME de un fotograma en la caché de disco"""
+        return await self.executor.run(self.frames.get, ts)
     
-    def _process_aemet_data(self, data: Dict, config: AemetConfig) -> List[Dict]:
-        """Procesar datos de AEMET (implementar según formato real)"""
-        # TODO: Implementar procesamiento real de datos AEMET
-        return []
+    async def get_overlay(self, ts: int, zoom: Optional[float] = None, webp: bool = False) -> Optional[Tuple[bytes, str]]:
+        """Fotograma reproyectado a Web Mercator; se renderiza al pedirlo si no estaba precalculado"""
+        if not overlays_available() or ts not in self.frames:
+            return None
+        if ts not in self.overlays:
+            content = await self.executor.run(self.frames.read, ts)
+            if content is None:
+                return None
+            await self.executor.run(self.overlays.render, ts, content)
+        return self.overlays.get(ts, zoom, webp)
+    
+    def next_refresh_in(self, config: AemetConfig, max_seconds: float) -> float:
+        """Segundos hasta el siguiente fotograma publicado (precarga alineada con la cadencia de AEMET)"""
+        if not config.api_key:
+            return max_seconds
+        if self.awaiting_publish:
+            return min(PUBLISH_RETRY, max_seconds)
+        now = time.time()
+        target = self._slot(now) + FRAME_INTERVAL + PUBLISH_DELAY
+        return min(max(target - now, 1.0), max_seconds)
+    
+    async def _fetch_frame(self, config: AemetConfig) -> Optional[int]:
+        """Resolver la URL de datos de AEMET y guardar la imagen en disco"""
+        session = self.http.get_session()
+        headers = {"api_key": config.api_key}
+        
+        # Paso 1: la API devuelve un JSON con la URL temporal de los datos
+        async with session.get(RADAR_URL, headers=headers, trace_request_ctx={"service": "aemet"}) as response:
+            self.http.raise_for_rate_limit(response, "AEMET")
+            if response.status != 200:
+                raise Exception(f"Error en AEMET API: {response.status}")
+            data = await response.json(content_type=None)
+        if data.get("estado") != 200 or not data.get("datos"):
+            raise Exception(f"Error en AEMET API: {data.get('estado')} {data.get('descripcion', '')}")
+        
+        # Paso 2: descargar la imagen
+        async with session.get(data["datos"], trace_request_ctx={"service": "aemet"}) as response:
+            self.http.raise_for_rate_limit(response, "AEMET")
+            if response.status != 200:
+                raise Exception(f"Error descargando imagen AEMET: {response.status}")
+            content = await response.read()
+            media_type = response.content_type
+            last_modified = response.headers.get("Last-Modified")
+        
+        digest = hashlib.sha1(content).hexdigest()
+        if self.last_digest is None:
+            timestamps = self.frames.timestamps()
+            if timestamps:
+                previous = await self.executor.run(self.frames.read, timestamps[-1])
+                self.last_digest = hashlib.sha1(previous).hexdigest() if previous else None
+        if digest == self.last_digest:
+            # AEMET todavía sirve la imagen del intervalo anterior
+            self.awaiting_publish = True
+            return None
+        
+        ts = self._frame_timestamp(last_modified)
+        await self.executor.run(self.frames.resize, config.frame_cache_mb * 1024 * 1024)
+        await self.executor.run(self.frames.put, ts, content, media_type)
+        self.last_digest = digest
+        self.awaiting_publish = False
+        
+        # Precalcular la superposición para que la animación solo tenga que pintar
+        if overlays_available():
+            self.overlays.max_frames = config.frame_count
+            try:
+                await self.executor.run(self.overlays.render, ts, content)
+            except Exception as e:
+                print(f"Error reproyectando radar AEMET: {e}")
+        return ts
+    
+    def _cached_frames(self, config: AemetConfig) -> List[Dict]:
+        """Últimos frame_count fotogramas de la caché de disco"""
+        frames = []
+        for ts in self.frames.timestamps()[-config.frame_count:]:
+            frame = {"url": f"/api/aemet/frames/{ts}", "timestamp": ts * 1000}
+            if overlays_available():
+                frame["overlay_url"] = f"/api/aemet/overlays/{ts}"
+            frames.append(frame)
+        return frames
+    
+    def _frame_timestamp(self, last_modified: Optional[str]) -> int:
+        """Inicio del intervalo de 10 minutos de la imagen (Last-Modified o, si falta, la hora actual)"""
+        if last_modified:
+            try:
+                return self._slot(parsedate_to_datetime(last_modified).timestamp())
+            except (TypeError, ValueError):
+                pass
+        return self._slot(time.time())
+    
+    @staticmethod
+    def _slot(ts: float) -> int:
+        return int(ts // FRAME_INTERVAL * FRAME_INTERVAL)
+    
+    def get_stats(self) -> Dict:
+        stats = self.frames.get_stats()
+        stats["awaiting_publish"] = self.awaiting_publish
+        stats["overlays"] = self.overlays.get_stats()
+        return stats
     
     async def _get_fallback_radar(self, config: AemetConfig) -> Dict:
         """Datos de radar de fallback"""
@@ -66,4 +179,3 @@ class AemetService:
                 "timestamp": int(timestamp.timestamp() * 1000)
             })
         return {"frames": frames}
-
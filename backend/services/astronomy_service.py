@@ -2,51 +2,100 @@
 Servicio de datos astronómicos
 Cálculo de amanecer, atardecer y fases lunares
 """
-from datetime import datetime, date
-from astral import LocationInfo
-from astral.sun import sun
-from astral.moon import phase
-from typing import Dict
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
 from models.config import AstronomyConfig
+from services.astronomy_tables import PHASE_EVENTS, AstronomyTables
+from services.executor import BlockingExecutor
+
+PHASE_NAMES = {
+    "new_moon": ("Luna Nueva", "new-moon"),
+    "first_quarter": ("Cuarto Creciente", "first-quarter"),
+    "full_moon": ("Luna Llena", "full-moon"),
+    "last_quarter": ("Cuarto Menguante", "third-quarter")
+}
 
 class AstronomyService:
-    def __init__(self):
-        self.cache = {}
+    def __init__(self, data_dir: str = "data", executor: BlockingExecutor = None):
+        self.executor = executor or BlockingExecutor()
+        self.tables = AstronomyTables(Path(data_dir) / "astronomy")
     
     async def get_astronomy(self, config: AstronomyConfig) -> Dict:
         """Obtener datos astronómicos"""
-        lat = config.location["latitude"]
-        lon = config.location["longitude"]
-        elevation = config.location.get("elevation", 0)
-        
-        # Crear ubicación
-        location = LocationInfo(
-            latitude=lat,
-            longitude=lon,
-            elevation=elevation
-        )
-        
         today = date.today()
+        # Las tablas del año solo se calculan (o se abren) al cambiar la ubicación o el año
+        await self._ensure_tables(config)
         
-        # Calcular amanecer y atardecer
-        s = sun(location.observer, date=today)
-        sunrise = s["sunrise"].strftime("%H:%M")
-        sunset = s["sunset"].strftime("%H:%M")
+        data = self.get_day(today)
+        data["next_phases"] = [
+            self._phase_event(ts, kind) for ts, kind in self.tables.next_events(time.time(), PHASE_EVENTS, 4)
+        ]
+        return data
+    
+    async def get_day_data(self, config: AstronomyConfig, day: date) -> Optional[Dict]:
+        """Datos astronómicos de un día del año en curso (None fuera de la tabla)"""
+        await self._ensure_tables(config)
+        if not self.tables.covers(day):
+            return None
+        data = self.get_day(day)
+        data["date"] = day.isoformat()
+        return data
+    
+    async def _ensure_tables(self, config: AstronomyConfig):
+        if not self.tables.is_current(config.location, date.today()):
+            await self.executor.run(self.tables.ensure, config.location, date.today())
+    
+    def get_day(self, day: date) -> Dict:
+        """Sol, Luna y fase de un día por consulta directa a las tablas"""
+        row = self.tables.day(day)
         
-        # Calcular fase lunar
-        moon_phase_num = phase(today)
-        moon_phase_name, moon_phase_icon = self._get_moon_phase(moon_phase_num)
+        # Ortos y ocasos de la Luna dentro del día local
+        start = datetime.combine(day, datetime.min.time())
+        moon = {}
+        end = start + timedelta(days=1)
+        for ts, kind in self.tables.between(start.timestamp(), end.timestamp(), ("moonrise", "moonset")):
+            moon.setdefault(kind, ts)
         
+        moon_phase_name, moon_phase_icon = self._get_moon_phase(row["phase"])
         return {
-            "sunrise": sunrise,
-            "sunset": sunset,
+            "sunrise": self._format_time(row["sunrise"]),
+            "sunset": self._format_time(row["sunset"]),
+            "solar_noon": self._format_time(row["solar_noon"]),
+            "civil_dawn": self._format_time(row["civil_dawn"]),
+            "civil_dusk": self._format_time(row["civil_dusk"]),
+            "nautical_dawn": self._format_time(row["nautical_dawn"]),
+            "nautical_dusk": self._format_time(row["nautical_dusk"]),
+            "astronomical_dawn": self._format_time(row["astronomical_dawn"]),
+            "astronomical_dusk": self._format_time(row["astronomical_dusk"]),
+            "moonrise": self._format_time(moon.get("moonrise")),
+            "moonset": self._format_time(moon.get("moonset")),
+            "moon_illumination": round(row["illumination"] * 100),
             "moon_phase": moon_phase_name,
             "moon_phase_icon": moon_phase_icon
         }
     
+    def _phase_event(self, ts: int, kind: str) -> Dict:
+        name, icon = PHASE_NAMES[kind]
+        return {
+            "phase": kind,
+            "name": name,
+            "icon": icon,
+            "date": datetime.fromtimestamp(ts).isoformat(timespec="minutes")
+        }
+    
+    @staticmethod
+    def _format_time(ts: Optional[int]) -> Optional[str]:
+        """Hora local HH:MM (None si ese día no hay evento)"""
+        return datetime.fromtimestamp(ts).strftime("%H:%M") if ts is not None else None
+    
+    def get_stats(self) -> Dict:
+        return self.tables.get_stats()
+    
     def _get_moon_phase(self, phase_num: float) -> tuple:
         """Obtener nombre e icono de la fase lunar"""
-        # phase_num: 0.0 = luna nueva, 0.25 = cuarto creciente, 0.5 = luna llena, 0.75 = cuarto menguante
+        # phase_num (fracción del ciclo sinódico): 0.0 = luna nueva, 0.25 = cuarto creciente, 0.5 = luna llena, 0.75 = cuarto menguante
         
         if phase_num < 0.03 or phase_num > 0.97:
             return ("Luna Nueva", "new-moon")
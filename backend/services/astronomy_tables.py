@@ -0,0 +1,331 @@
+"""
+Tablas astronómicas anuales
+Sol (NOAA) y Luna de todo un año calculados con NumPy de una vez y guardados en tablas mapeadas en memoria
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+TABLE_VERSION = 1
+MISSING = np.iinfo(np.int64).min  # sin evento ese día (sol de medianoche o noche polar)
+MARGIN_DAYS = 45  # días del año siguiente: el "próximo evento" sigue resolviéndose en diciembre
+MOON_STEP = 600  # muestreo de la altura de la Luna en segundos
+EARTH_RADIUS = 6356900.0  # m, para la depresión del horizonte por altitud (como astral)
+UNIX_EPOCH_JD = 2440587.5
+J2000 = 2451545.0
+
+# Eventos solares: (nombre, distancia cenital en grados, -1 mañana / +1 tarde)
+SUN_EVENTS = (
+    ("astronomical_dawn", 108.0, -1),
+    ("nautical_dawn", 102.0, -1),
+    ("civil_dawn", 96.0, -1),
+    ("sunrise", 90.833, -1),
+    ("sunset", 90.833, 1),
+    ("civil_dusk", 96.0, 1),
+    ("nautical_dusk", 102.0, 1),
+    ("astronomical_dusk", 108.0, 1),
+)
+PHASE_EVENTS = ("new_moon", "first_quarter", "full_moon", "last_quarter")
+EVENT_KINDS = tuple(name for name, _, _ in SUN_EVENTS) + ("solar_noon", "moonrise", "moonset") + PHASE_EVENTS
+KIND_CODES = {name: code for code, name in enumerate(EVENT_KINDS)}
+
+# Una fila por día (instantes en segundos Unix UTC) y una tabla de eventos ordenada por instante
+DAY_DTYPE = np.dtype(
+    [(name, "<i8") for name, _, _ in SUN_EVENTS] + [("solar_noon", "<i8"), ("illumination", "<f4"), ("phase", "<f4")]
+)
+EVENT_DTYPE = np.dtype([("ts", "<i8"), ("kind", "u1")])
+
+def horizon_dip(elevation: float) -> float:
+    """Grados que baja el horizonte visto desde una altitud en metros"""
+    return float(np.degrees(np.arccos(EARTH_RADIUS / (EARTH_RADIUS + max(elevation, 0.0)))))
+
+def sun_position(jd: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Declinación (rad), ecuación del tiempo (min), longitud aparente (grados) y oblicuidad (rad).
+
+    Son las fórmulas de la hoja de cálculo de NOAA (Meeus), evaluadas para
+    todo el vector de fechas julianas a la vez.
+    """
+    t = (jd - J2000) / 36525.0
+    l0 = np.radians((280.46646 + t * (36000.76983 + t * 0.0003032)) % 360)
+    m = np.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    center = (
+        np.sin(m) * (1.914602 - t * (0.004817 + 0.000014 * t))
+        + np.sin(2 * m) * (0.019993 - 0.000101 * t)
+        + np.sin(3 * m) * 0.000289
+    )
+    omega = np.radians(125.04 - 1934.136 * t)
+    apparent = np.degrees(l0) + center - 0.00569 - 0.00478 * np.sin(omega)
+    obliquity = 23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    epsilon = np.radians(obliquity + 0.00256 * np.cos(omega))
+    declination = np.arcsin(np.sin(epsilon) * np.sin(np.radians(apparent)))
+    y = np.tan(epsilon / 2) ** 2
+    eqtime = 4 * np.degrees(
+        y * np.sin(2 * l0) - 2 * e * np.sin(m) + 4 * e * y * np.sin(m) * np.cos(2 * l0)
+        - 0.5 * y * y * np.sin(4 * l0) - 1.25 * e * e * np.sin(2 * m)
+    )
+    return declination, eqtime, apparent % 360, epsilon
+
+def moon_position(jd: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Longitud y latitud eclípticas (grados) y paralaje horizontal (grados) de la Luna.
+
+    Términos principales de Meeus, cap. 47: unas centésimas de grado,
+    suficiente para orto y ocaso al minuto y fases a unos minutos.
+    """
+    t = (jd - J2000) / 36525.0
+    lp = 218.3164477 + 481267.88123421 * t
+    d = np.radians(297.8501921 + 445267.1114034 * t)
+    m = np.radians(357.5291092 + 35999.0502909 * t)
+    mp = np.radians(134.9633964 + 477198.8675055 * t)
+    f = np.radians(93.2720950 + 483202.0175233 * t)
+    e = 1 - 0.002516 * t
+    longitude = (
+        lp
+        + 6.288774 * np.sin(mp) + 1.274027 * np.sin(2 * d - mp) + 0.658314 * np.sin(2 * d)
+        + 0.213618 * np.sin(2 * mp) - 0.185116 * e * np.sin(m) - 0.114332 * np.sin(2 * f)
+        + 0.058793 * np.sin(2 * d - 2 * mp) + 0.057066 * e * np.sin(2 * d - m - mp)
+        + 0.053322 * np.sin(2 * d + mp) + 0.045758 * e * np.sin(2 * d - m)
+        - 0.040923 * e * np.sin(m - mp) - 0.034720 * np.sin(d) - 0.030383 * e * np.sin(m + mp)
+        + 0.015327 * np.sin(2 * d - 2 * f) - 0.012528 * np.sin(mp + 2 * f) + 0.010980 * np.sin(mp - 2 * f)
+    )
+    latitude = (
+        5.128122 * np.sin(f) + 0.280602 * np.sin(mp + f) + 0.277693 * np.sin(mp - f)
+        + 0.173237 * np.sin(2 * d - f) + 0.055413 * np.sin(2 * d - mp + f) + 0.046271 * np.sin(2 * d - mp - f)
+        + 0.032573 * np.sin(2 * d + f) + 0.017198 * np.sin(2 * mp + f)
+    )
+    distance = (
+        385000.56 - 20905.355 * np.cos(mp) - 3699.111 * np.cos(2 * d - mp)
+        - 2955.968 * np.cos(2 * d) - 569.925 * np.cos(2 * mp) + 48.888 * e * np.cos(m)
+    )
+    parallax = np.degrees(np.arcsin(6378.14 / distance))
+    return longitude % 360, latitude, parallax
+
+def sun_days(day_numbers: np.ndarray, latitude: float, longitude: float, elevation: float = 0.0) -> Dict[str, np.ndarray]:
+    """Mediodía, orto, ocaso y crepúsculos (segundos Unix) de cada día Unix del vector"""
+    jd0 = UNIX_EPOCH_JD + day_numbers.astype(np.float64)
+    phi = np.radians(latitude)
+
+    # Mediodía solar con una iteración sobre la ecuación del tiempo
+    noon = 720 - 4 * longitude - sun_position(jd0 + 0.5 - longitude / 360)[1]
+    noon = 720 - 4 * longitude - sun_position(jd0 + noon / 1440)[1]
+    result = {"solar_noon": day_numbers * 86400 + np.round(noon * 60).astype(np.int64)}
+
+    dip = horizon_dip(elevation)
+    for name, zenith, sign in SUN_EVENTS:
+        if name in ("sunrise", "sunset"):
+            zenith += dip
+        minutes = noon
+        for _ in range(2):
+            declination, eqtime = sun_position(jd0 + minutes / 1440)[:2]
+            cos_ha = (np.cos(np.radians(zenith)) - np.sin(phi) * np.sin(declination)) / (np.cos(phi) * np.cos(declination))
+            hour_angle = np.degrees(np.arccos(np.clip(cos_ha, -1, 1)))
+            minutes = 720 - 4 * (longitude - sign * hour_angle) - eqtime
+        seconds = day_numbers * 86400 + np.round(minutes * 60).astype(np.int64)
+        result[name] = np.where(np.abs(cos_ha) > 1, MISSING, seconds)
+    return result
+
+def moon_altitude(ts: np.ndarray, latitude: float, longitude: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Altura geocéntrica de la Luna (grados) y paralaje para cada instante Unix"""
+    jd = UNIX_EPOCH_JD + ts / 86400.0
+    lam, beta, parallax = moon_position(jd)
+    epsilon = sun_position(jd)[3]
+    lam, beta = np.radians(lam), np.radians(beta)
+    right_ascension = np.arctan2(np.sin(lam) * np.cos(epsilon) - np.tan(beta) * np.sin(epsilon), np.cos(lam))
+    declination = np.arcsin(np.sin(beta) * np.cos(epsilon) + np.cos(beta) * np.sin(epsilon) * np.sin(lam))
+    sidereal = np.radians((280.46061837 + 360.98564736629 * (jd - J2000) + longitude) % 360)
+    phi = np.radians(latitude)
+    altitude = np.arcsin(
+        np.sin(phi) * np.sin(declination) + np.cos(phi) * np.cos(declination) * np.cos(sidereal - right_ascension)
+    )
+    return np.degrees(altitude), parallax
+
+def elongation(jd: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Edad de la Luna en grados (0 nueva, 180 llena) y fracción iluminada"""
+    lam, beta = moon_position(jd)[:2]
+    sun_lam = sun_position(jd)[2]
+    age = (lam - sun_lam) % 360
+    cos_psi = np.cos(np.radians(beta)) * np.cos(np.radians(lam - sun_lam))
+    return age, (1 - cos_psi) / 2
+
+def crossings(ts: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Instantes (interpolados) en que values cambia de signo y si es de negativo a positivo"""
+    negative = values < 0
+    idx = np.flatnonzero(negative[:-1] != negative[1:])
+    v0, v1 = values[idx], values[idx + 1]
+    return ts[idx] + (ts[idx + 1] - ts[idx]) * v0 / (v0 - v1), negative[idx]
+
+def moon_events(start: int, end: int, latitude: float, longitude: float, elevation: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Ortos, ocasos y cambios de fase de la Luna entre dos instantes Unix (muestreo cada MOON_STEP s)"""
+    ts = np.arange(start, end + MOON_STEP, MOON_STEP, dtype=np.float64)
+    altitude, parallax = moon_altitude(ts, latitude, longitude)
+    # Centro de la Luna en el horizonte: refracción, semidiámetro y paralaje (Meeus, cap. 15)
+    horizon = 0.7275 * parallax - 0.5667 - horizon_dip(elevation)
+    rise_set, rising = crossings(ts, altitude - horizon)
+    kinds = np.where(rising, KIND_CODES["moonrise"], KIND_CODES["moonset"])
+
+    # Fases: la edad desenrollada cruza un múltiplo de 90 grados
+    age = np.degrees(np.unwrap(np.radians(elongation(UNIX_EPOCH_JD + ts / 86400.0)[0])))
+    quarter = np.floor(age / 90).astype(np.int64)
+    idx = np.flatnonzero(quarter[1:] > quarter[:-1])
+    target = quarter[idx + 1] * 90.0
+    phases = ts[idx] + MOON_STEP * (target - age[idx]) / (age[idx + 1] - age[idx])
+    phase_kinds = KIND_CODES["new_moon"] + quarter[idx + 1] % 4
+
+    return np.concatenate([rise_set, phases]), np.concatenate([kinds, phase_kinds])
+
+def compute_tables(year: int, latitude: float, longitude: float, elevation: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Tabla diaria y tabla de eventos del año (más MARGIN_DAYS del siguiente)"""
+    first = (date(year, 1, 1) - date(1970, 1, 1)).days
+    count = (date(year + 1, 1, 1) - date(year, 1, 1)).days + MARGIN_DAYS
+    day_numbers = first + np.arange(count, dtype=np.int64)
+
+    days = np.zeros(count, dtype=DAY_DTYPE)
+    sun = sun_days(day_numbers, latitude, longitude, elevation)
+    for name, values in sun.items():
+        days[name] = values
+    age, illumination = elongation(UNIX_EPOCH_JD + sun["solar_noon"] / 86400.0)
+    days["illumination"] = illumination
+    days["phase"] = age / 360
+
+    times = [values[values != MISSING] for values in sun.values()]
+    kinds = [np.full(len(values), KIND_CODES[name], dtype=np.uint8) for name, values in zip(sun, times)]
+    moon_ts, moon_kinds = moon_events(first * 86400, (first + count) * 86400, latitude, longitude, elevation)
+    times.append(np.round(moon_ts).astype(np.int64))
+    kinds.append(moon_kinds.astype(np.uint8))
+
+    events = np.zeros(sum(len(values) for values in times), dtype=EVENT_DTYPE)
+    events["ts"] = np.concatenate(times)
+    events["kind"] = np.concatenate(kinds)
+    events.sort(order="ts", kind="stable")
+    return days, events
+
+class AstronomyTables:
+    """Tablas del año en curso para una ubicación, en <directorio>/<año>-<clave>-{days,events}.npy.
+
+    Los ficheros se abren mapeados en memoria: reiniciar no recalcula nada
+    y las consultas son indexación directa (día) o bisección (eventos).
+    Solo se recalculan al cambiar la ubicación o el año.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.key: Optional[Tuple[int, str]] = None
+        self.first_day: Optional[date] = None
+        self.days: Optional[np.ndarray] = None
+        self.events: Optional[np.ndarray] = None
+        self.lock = threading.Lock()
+        self.stats = {"builds": 0, "build_ms": 0.0, "loads": 0, "lookups": 0}
+
+    @staticmethod
+    def location_key(location: Dict) -> str:
+        values = [float(location.get(name, 0) or 0) for name in ("latitude", "longitude", "elevation")]
+        return hashlib.sha1(json.dumps([TABLE_VERSION] + values).encode()).hexdigest()[:12]
+
+    def is_current(self, location: Dict, day: date) -> bool:
+        return self.key == (day.year, self.location_key(location))
+
+    def ensure(self, location: Dict, day: date):
+        """Cargar o calcular las tablas que cubren el año de day (se ejecuta en el pool de hilos)"""
+        key = (day.year, self.location_key(location))
+        if key == self.key:
+            return
+        with self.lock:
+            if key == self.key:
+                return
+            prefix = f"{key[0]}-{key[1]}"
+            days_file = self.directory / f"{prefix}-days.npy"
+            events_file = self.directory / f"{prefix}-events.npy"
+            if not (days_file.exists() and events_file.exists()):
+                self._build(location, day.year, days_file, events_file)
+            else:
+                self.stats["loads"] += 1
+            events = np.load(events_file, mmap_mode="r")
+            self.days = np.load(days_file, mmap_mode="r")
+            self.events = events
+            self.first_day = date(day.year, 1, 1)
+            self.key = key
+            self._remove_stale(prefix)
+
+    def _build(self, location: Dict, year: int, days_file: Path, events_file: Path):
+        started = time.perf_counter()
+        days, events = compute_tables(
+            year,
+            float(location["latitude"]),
+            float(location["longitude"]),
+            float(location.get("elevation", 0) or 0)
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Escritura atómica; la tabla diaria va la última y marca el par como completo
+        for path, table in ((events_file, events), (days_file, days)):
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, table)
+            os.replace(tmp_path, path)
+        self.stats["builds"] += 1
+        self.stats["build_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _remove_stale(self, prefix: str):
+        for path in self.directory.glob("*.npy"):
+            if not path.name.startswith(prefix + "-"):
+                try:
+                    path.unlink()
+                except OSError as e:
+                    print(f"Error eliminando tabla astronómica {path.name}: {e}")
+
+    def covers(self, day: date) -> bool:
+        return self.days is not None and 0 <= (day - self.first_day).days < len(self.days)
+
+    def day(self, day: date) -> Optional[Dict]:
+        """Fila del día: instantes Unix del sol (None si no hay evento), iluminación y fase lunar (0-1)"""
+        days = self.days
+        if days is None or not self.covers(day):
+            return None
+        self.stats["lookups"] += 1
+        row = dict(zip(DAY_DTYPE.names, days[(day - self.first_day).days].item()))
+        for name in DAY_DTYPE.names[:-2]:
+            if row[name] == MISSING:
+                row[name] = None
+        return row
+
+    def between(self, start: float, end: float, kinds: Optional[Iterable[str]] = None) -> List[Tuple[int, str]]:
+        """Eventos en [start, end) como (instante Unix, tipo)"""
+        events = self.events
+        if events is None:
+            return []
+        self.stats["lookups"] += 1
+        ts = events["ts"]
+        window = events[np.searchsorted(ts, start):np.searchsorted(ts, end)].tolist()
+        codes = {KIND_CODES[kind] for kind in kinds} if kinds is not None else None
+        return [(ts, EVENT_KINDS[kind]) for ts, kind in window if codes is None or kind in codes]
+
+    def next_events(self, after: float, kinds: Iterable[str], limit: int = 1) -> List[Tuple[int, str]]:
+        """Próximos eventos de los tipos indicados a partir de after"""
+        events = self.events
+        if events is None:
+            return []
+        self.stats["lookups"] += 1
+        wanted = np.zeros(len(EVENT_KINDS), dtype=bool)
+        wanted[[KIND_CODES[kind] for kind in kinds]] = True
+        found = []
+        # Por bloques: los eventos buscados suelen estar a pocas filas
+        for offset in range(np.searchsorted(events["ts"], after, side="right"), len(events), 512):
+            block = events[offset:offset + 512]
+            for ts, kind in block[wanted[block["kind"]]][:limit - len(found)].tolist():
+                found.append((ts, EVENT_KINDS[kind]))
+            if len(found) >= limit:
+                break
+        return found
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["year"] = self.key[0] if self.key else None
+        stats["days"] = len(self.days) if self.days is not None else 0
+        stats["events"] = len(self.events) if self.events is not None else 0
+        stats["bytes"] = (self.days.nbytes + self.events.nbytes) if self.days is not None else 0
+        return stats
@@ -1,52 +1,124 @@
 """
 Servicio de calendario
-Parseo de archivos ICS
+Parseo de archivos ICS y sincronización de calendarios remotos
 """
+import asyncio
+import hashlib
+import json
 import os
-import re
+import time
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, List
-from models.config import CalendarConfig
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+from models.config import CalendarConfig, CalendarSource
+from services.executor import BlockingExecutor
+from services.http_client import HttpClient
+from services.ics_parser import EventIndex, ICSCalendar
+
+# orjson es opcional: decodifica el almacén de calendarios bastante más rápido
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_HORIZON_DAYS = 365
+STORE_VERSION = 2
+
+class CalendarState:
+    """Calendario ya parseado de una fuente (fichero subido o URL) y sus validadores HTTP"""
+    def __init__(self, key: str, name: Optional[str] = None):
+        self.key = key
+        self.name = name
+        self.calendar: Optional[ICSCalendar] = None
+        self.digest: Optional[str] = None
+        self.file_state: Optional[List[int]] = None
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.fetched_at: Optional[float] = None
+        self.not_modified = 0
+        self.unchanged = 0
+        self.parsed = 0
+        self.parse_ms = 0.0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+    
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "digest": self.digest,
+            "file_state": self.file_state,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "events": self.calendar.to_columns() if self.calendar else None
+        }
+    
+    @classmethod
+    def from_dict(cls, key: str, data: Dict) -> "CalendarState":
+        state = cls(key, data.get("name"))
+        state.digest = data.get("digest")
+        state.file_state = data.get("file_state")
+        state.etag = data.get("etag")
+        state.last_modified = data.get("last_modified")
+        # Fuentes que nunca se llegaron a descargar siguen sin calendario
+        state.calendar = ICSCalendar.from_columns(data["events"]) if state.digest else None
+        return state
 
 class CalendarService:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", executor: BlockingExecutor = None, http_client: HttpClient = None):
         self.data_dir = Path(data_dir)
+        self.executor = executor or BlockingExecutor()
+        self.http = http_client or HttpClient()
         self.data_dir.mkdir(exist_ok=True)
+        self.store_file = self.data_dir / "calendars.json"
+        self.calendars: Dict[str, CalendarState] = {}  # "file:<nombre>" o URL -> estado
+        self.local_key: Optional[str] = None  # fichero de calendar.ics_filename
+        self.remote_keys: List[str] = []
+        self.loaded = False
+        self.dirty = False
+        self.generation = 0  # aumenta con cada calendario parseado o eliminado
+        self.expansion: Optional[Tuple] = None
         self.events = []
-        self.load_events()
+        self.index = EventIndex([])
+        self.stats = {"expansions": 0, "expand_ms": 0.0, "saves": 0, "errors": 0}
     
     async def get_events(self, config: CalendarConfig) -> List[Dict]:
         """Obtener eventos del calendario"""
+        await self._ensure_loaded()
+        # El calendario local es siempre el configurado: si se quita o cambia
+        # ics_filename, el anterior se descarta en _rebuild
+        self.local_key = f"file:{config.ics_filename}" if config.ics_filename else None
         if config.ics_filename:
             ics_file = self.data_dir / config.ics_filename
             if ics_file.exists():
-                self.load_ics(ics_file)
+                # Solo se vuelve a parsear si el fichero cambió
+                try:
+                    await self.executor.run(self._load_file, ics_file)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"Error cargando ICS: {e}")
         
-        # Filtrar eventos futuros y ordenar
-        now = datetime.now()
-        future_events = [
-            event for event in self.events
-            if datetime.fromisoformat(event["start"].replace("Z", "+00:00")) > now
-        ]
-        future_events.sort(key=lambda x: x["start"])
+        # Calendarios remotos en paralelo, con petición condicional
+        await asyncio.gather(*(self._sync_source(source, config.source_timeout) for source in config.sources))
+        self.remote_keys = [source.url for source in config.sources]
         
-        return future_events[:10]  # Máximo 10 eventos
+        await self.executor.run(self._rebuild, config.horizon_days)
+        return self.index.upcoming(datetime.now(), 10)  # Máximo 10 eventos
     
     async def upload_ics(self, filename: str, content: bytes) -> Dict:
         """Subir archivo ICS"""
         try:
+            await self._ensure_loaded()
             # Guardar archivo
             ics_file = self.data_dir / filename
-            with open(ics_file, "wb") as f:
-                f.write(content)
+            await self.executor.run(ics_file.write_bytes, content)
             
-            # Parsear y cargar eventos
-            self.load_ics(ics_file)
+            # Parsear (los eventos se despliegan en el siguiente refresco)
+            state = await self.executor.run(self._load_file, ics_file)
             
             return {
                 "ok": True,
-                "message": f"Calendario '{filename}' cargado con {len(self.events)} eventos."
+                "message": f"Calendario '{filename}' cargado con {len(state.calendar)} eventos."
             }
         except Exception as e:
             return {
@@ -54,75 +126,189 @@ class CalendarService:
                 "message": f"Error al procesar archivo: {str(e)}"
             }
     
-    def load_ics(self, ics_file: Path):
-        """Cargar eventos desde archivo ICS"""
-        self.events = []
+    def _load_file(self, ics_file: Path) -> CalendarState:
+        """Parsear un fichero ICS si cambió su mtime/tamaño y además su contenido (se ejecuta en el pool de hilos)"""
+        key = f"file:{ics_file.name}"
+        state = self.calendars.get(key) or CalendarState(key)
+        stat = ics_file.stat()
+        file_state = [stat.st_mtime_ns, stat.st_size]
+        if state.calendar is None or state.file_state != file_state:
+            digest = hashlib.sha1()
+            with open(ics_file, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            if state.calendar is None or digest.hexdigest() != state.digest:
+                self._parse(state, lambda: ICSCalendar.from_file(ics_file))
+                state.digest = digest.hexdigest()
+            state.file_state = file_state
+            self.dirty = True
+        self.calendars[key] = state
+        return state
+    
+    async def _sync_source(self, source: CalendarSource, timeout: float):
+        """Sincronizar un calendario remoto; si falla se mantiene la última copia"""
+        state = self.calendars.get(source.url)
+        if state is None:
+            state = self.calendars[source.url] = CalendarState(source.url, source.name)
+        if state.name != source.name:
+            state.name = source.name
+            self.generation += 1
+            self.dirty = True
+        try:
+            # El límite de tiempo cubre solo la descarga: un parseo cancelado
+            # seguiría ejecutándose en el pool y modificaría el estado a destiempo
+            downloaded = await asyncio.wait_for(self._download(source, state), timeout=timeout)
+            if downloaded is not None:
+                await self._update_calendar(state, *downloaded)
+            state.fetched_at = time.time()
+            state.last_error = None
+        except Exception as e:
+            state.errors += 1
+            state.last_error = str(e) or type(e).__name__
+            print(f"Error sincronizando calendario {source.name}: {state.last_error}")
+    
+    async def _download(self, source: CalendarSource, state: CalendarState) -> Optional[Tuple[bytes, Optional[str], Optional[str]]]:
+        """Descargar un ICS con petición condicional (ETag / Last-Modified); None si no ha cambiado (304)"""
+        headers = {}
+        if state.calendar is not None:
+            if state.etag:
+                headers["If-None-Match"] = state.etag
+            if state.last_modified:
+                headers["If-Modified-Since"] = state.last_modified
+        url = "https://" + source.url[len("webcal://"):] if source.url.startswith("webcal://") else source.url
+        auth = aiohttp.BasicAuth(source.username, source.password or "") if source.username else None
         
+        session = self.http.get_session()
+        async with session.get(url, headers=headers, auth=auth, trace_request_ctx={"service": "ics"}) as response:
+            self.http.raise_for_rate_limit(response, source.name)
+            if response.status == 304:
+                state.not_modified += 1
+                return None
+            if response.status != 200:
+                raise Exception(f"Error obteniendo calendario: {response.status}")
+            content = await response.read()
+            return content, response.headers.get("ETag"), response.headers.get("Last-Modified")
+    
+    async def _update_calendar(self, state: CalendarState, content: bytes, etag: Optional[str], last_modified: Optional[str]):
+        """Parsear el ICS descargado salvo que el contenido sea idéntico, y guardar sus validadores"""
+        # Servidores sin validadores: si el contenido no ha cambiado no se vuelve a parsear
+        digest = hashlib.sha1(content).hexdigest()
+        if digest == state.digest and state.calendar is not None:
+            state.unchanged += 1
+        else:
+            text = content.decode("utf-8", errors="replace")
+            await self.executor.run(self._parse, state, lambda: ICSCalendar.from_lines(text.splitlines()))
+            state.digest = digest
+        if (etag, last_modified) != (state.etag, state.last_modified):
+            state.etag = etag
+            state.last_modified = last_modified
+            self.dirty = True
+    
+    def _parse(self, state: CalendarState, build):
+        started = time.perf_counter()
+        state.calendar = build()
+        state.parse_ms = round((time.perf_counter() - started) * 1000, 2)
+        state.parsed += 1
+        self.generation += 1
+        self.dirty = True
+    
+    def _rebuild(self, horizon_days: int):
+        """Desplegar repeticiones de todos los calendarios en un único índice (se ejecuta en el pool de hilos)"""
+        keys = ([self.local_key] if self.local_key else []) + self.remote_keys
+        for key in list(self.calendars):
+            if key not in keys:
+                del self.calendars[key]
+                self.generation += 1
+                self.dirty = True
         try:
-            with open(ics_file, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            # Parsear ICS (simplificado)
-            # Buscar eventos
-            event_pattern = r"BEGIN:VEVENT(.*?)END:VEVENT"
-            events = re.findall(event_pattern, content, re.DOTALL)
-            
-            for event_text in events:
-                event = {}
-                
-                # Extraer campos
-                summary_match = re.search(r"SUMMARY:(.*)", event_text)
-                if summary_match:
-                    event["summary"] = summary_match.group(1).strip()
-                
-                dtstart_match = re.search(r"DTSTART[^:]*:(.*)", event_text)
-                if dtstart_match:
-                    event["start"] = self._parse_ical_date(dtstart_match.group(1).strip())
-                
-                dtend_match = re.search(r"DTEND[^:]*:(.*)", event_text)
-                if dtend_match:
-                    event["end"] = self._parse_ical_date(dtend_match.group(1).strip())
-                
-                if event.get("summary") and event.get("start"):
-                    self.events.append(event)
-            
-            # Guardar eventos parseados
-            self.save_events()
+            # Sin calendarios configurados se mantienen los eventos de events.json
+            # (versiones anteriores) hasta la primera expansión
+            expansion = (date.today(), horizon_days, tuple(keys), self.generation)
+            if (keys or self.expansion is not None) and expansion != self.expansion:
+                started = time.perf_counter()
+                # Desde hoy hasta el horizonte; índice nuevo asignado al final:
+                # get_events nunca ve una carga a medias
+                window_start = datetime.combine(expansion[0], datetime.min.time())
+                window_end = window_start + timedelta(days=horizon_days)
+                events = []
+                for key in keys:
+                    state = self.calendars.get(key)
+                    if state is not None and state.calendar is not None:
+                        name = state.name if key != self.local_key else None
+                        events.extend(state.calendar.expand(window_start, window_end, name))
+                self.index = EventIndex(events)
+                self.events = self.index.events
+                self.expansion = expansion
+                self.stats["expansions"] += 1
+                self.stats["expand_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            if self.dirty:
+                self.save_events()
         except Exception as e:
-            print(f"Error cargando ICS: {e}")
+            self.stats["errors"] += 1
+            print(f"Error desplegando calendarios: {e}")
     
-    def _parse_ical_date(self, date_str: str) -> str:
-        """Parsear fecha iCalendar"""
-        # Formato: 20240804T160000Z o 20240804T160000
-        if len(date_str) >= 15:
-            year = date_str[0:4]
-            month = date_str[4:6]
-            day = date_str[6:8]
-            hour = date_str[9:11] if len(date_str) > 9 else "00"
-            minute = date_str[11:13] if len(date_str) > 11 else "00"
-            second = date_str[13:15] if len(date_str) > 13 else "00"
-            return f"{year}-{month}-{day}T{hour}:{minute}:{second}"
-        return date_str
+    async def _ensure_loaded(self):
+        if not self.loaded:
+            self.loaded = True
+            await self.executor.run(self.load_events)
     
     def load_events(self):
-        """Cargar eventos guardados"""
-        events_file = self.data_dir / "events.json"
-        if events_file.exists():
-            try:
-                import json
+        """Cargar calendarios guardados (ya parseados: el arranque no vuelve a leer los ICS)"""
+        try:
+            if self.store_file.exists():
+                content = self.store_file.read_bytes()
+                store = orjson.loads(content) if orjson is not None else json.loads(content)
+                if store.get("version") == STORE_VERSION:
+                    self.calendars = {
+                        key: CalendarState.from_dict(key, data) for key, data in store["calendars"].items()
+                    }
+                    self.local_key = store.get("local_key")
+                    return
+            
+            # Formato anterior: lista de eventos ya desplegados
+            events_file = self.data_dir / "events.json"
+            if events_file.exists():
                 with open(events_file, "r", encoding="utf-8") as f:
-                    self.events = json.load(f)
-            except Exception as e:
-                print(f"Error cargando eventos: {e}")
-                self.events = []
+                    self.index = EventIndex(json.load(f))
+                self.events = self.index.events
+        except Exception as e:
+            print(f"Error cargando eventos: {e}")
     
     def save_events(self):
-        """Guardar eventos"""
-        events_file = self.data_dir / "events.json"
+        """Guardar calendarios parseados y validadores HTTP (escritura atómica)"""
+        store = {
+            "version": STORE_VERSION,
+            "local_key": self.local_key,
+            "calendars": {key: state.to_dict() for key, state in list(self.calendars.items())}
+        }
+        tmp_file = self.store_file.with_suffix(".json.tmp")
         try:
-            import json
-            with open(events_file, "w", encoding="utf-8") as f:
-                json.dump(self.events, f, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                content = orjson.dumps(store)
+            else:
+                content = json.dumps(store, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            tmp_file.write_bytes(content)
+            os.replace(tmp_file, self.store_file)
+            self.dirty = False
+            self.stats["saves"] += 1
         except Exception as e:
             print(f"Error guardando eventos: {e}")
-
+    
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["events"] = len(self.index)
+        now = time.time()
+        stats["calendars"] = {
+            key: {
+                "events": len(state.calendar) if state.calendar else 0,
+                "age_s": round(now - state.fetched_at, 1) if state.fetched_at else None,
+                "not_modified": state.not_modified,
+                "unchanged": state.unchanged,
+                "parsed": state.parsed,
+                "parse_ms": state.parse_ms,
+                "errors": state.errors,
+                "last_error": state.last_error
+            }
+            for key, state in list(self.calendars.items())
+        }
+        return stats
@@ -0,0 +1,178 @@
+"""
+Agrupación por zoom de capas de puntos
+Rejilla jerárquica en píxeles Web Mercator mantenida de forma incremental
+"""
+import math
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+Cell = Tuple[int, int]
+
+TILE_SIZE = 256
+
+def mercator(lon: float, lat: float) -> Tuple[float, float]:
+    """Coordenadas Web Mercator normalizadas a [0, 1)"""
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = (lon + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+def clip_bbox(bbox: Optional[List[float]], limit: List[float]) -> List[float]:
+    """Intersección de un bbox pedido con el bbox de la capa"""
+    if not bbox:
+        return list(limit)
+    return [max(bbox[0], limit[0]), max(bbox[1], limit[1]), min(bbox[2], limit[2]), min(bbox[3], limit[3])]
+
+class ZoomClusters:
+    """Agregados (nº de puntos y suma de lon/lat) por celda para cada zoom agrupado.
+
+    Cada celda mide radius_px píxeles de pantalla en su zoom, así que una
+    consulta devuelve como mucho un elemento por celda visible
+    independientemente del tráfico. Insertar, mover o eliminar un punto
+    solo actualiza una celda por nivel; los niveles son zoom_min..zoom_max-1
+    (desde zoom_max se sirven los puntos sin agrupar).
+    """
+
+    def __init__(self, zoom_min: int = 6, zoom_max: int = 10, radius_px: int = 60):
+        self.zoom_min = zoom_min
+        self.zoom_max = zoom_max
+        self.radius_px = radius_px
+        self.levels: Dict[int, Dict[Cell, list]] = {}  # zoom -> celda -> [n, suma lon, suma lat, claves]
+        self.positions: Dict[Hashable, Tuple[float, float, Tuple[Cell, ...]]] = {}
+        self._reset_levels()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.positions
+
+    def configure(self, zoom_min: int, zoom_max: int, radius_px: int):
+        """Cambiar niveles o radio; reconstruye los agregados si cambian"""
+        if (zoom_min, zoom_max, radius_px) == (self.zoom_min, self.zoom_max, self.radius_px):
+            return
+        self.zoom_min, self.zoom_max, self.radius_px = zoom_min, zoom_max, radius_px
+        positions = [(key, lon, lat) for key, (lon, lat, _) in self.positions.items()]
+        self.positions = {}
+        self._reset_levels()
+        for key, lon, lat in positions:
+            self.upsert(key, lon, lat)
+
+    def clusters_zoom(self, zoom: Optional[float]) -> Optional[int]:
+        """Nivel agrupado para un zoom de mapa (None si se deben servir puntos sueltos)"""
+        if zoom is None:
+            return None
+        level = max(int(math.floor(zoom)), self.zoom_min)
+        return level if level < self.zoom_max else None
+
+    def upsert(self, key: Hashable, lon: float, lat: float):
+        """Insertar o mover un punto"""
+        cells = self._cells(lon, lat)
+        previous = self.positions.get(key)
+        for k, zoom in enumerate(self.levels):
+            level = self.levels[zoom]
+            if previous is not None:
+                old_lon, old_lat, old_cells = previous
+                if old_cells[k] == cells[k]:
+                    entry = level[cells[k]]
+                    entry[1] += lon - old_lon
+                    entry[2] += lat - old_lat
+                    continue
+                self._discard(level, old_cells[k], key, old_lon, old_lat)
+            entry = level.get(cells[k])
+            if entry is None:
+                level[cells[k]] = [1, lon, lat, {key}]
+            else:
+                entry[0] += 1
+                entry[1] += lon
+                entry[2] += lat
+                entry[3].add(key)
+        self.positions[key] = (lon, lat, cells)
+
+    def remove(self, key: Hashable):
+        """Eliminar un punto"""
+        previous = self.positions.pop(key, None)
+        if previous is None:
+            return
+        lon, lat, cells = previous
+        for k, zoom in enumerate(self.levels):
+            self._discard(self.levels[zoom], cells[k], key, lon, lat)
+
+    def query(self, zoom: int, bbox: List[float], point_feature: Callable[[Hashable], Optional[Dict]]) -> List[Dict]:
+        """Clusters (y puntos aislados vía point_feature) con centroide dentro del bbox"""
+        level = self.levels.get(zoom)
+        if level is None:
+            return []
+        lon_min, lat_min, lon_max, lat_max = bbox
+        scale = self._scale(zoom)
+        x_min, y_max = mercator(lon_min, lat_min)
+        x_max, y_min = mercator(lon_max, lat_max)
+        cx_min, cx_max = math.floor(x_min * scale), math.floor(x_max * scale)
+        cy_min, cy_max = math.floor(y_min * scale), math.floor(y_max * scale)
+
+        span = (cx_max - cx_min + 1) * (cy_max - cy_min + 1)
+        if span > len(level):
+            cells = [cell for cell in level if cx_min <= cell[0] <= cx_max and cy_min <= cell[1] <= cy_max]
+        else:
+            cells = [
+                (cx, cy) for cx in range(cx_min, cx_max + 1) for cy in range(cy_min, cy_max + 1)
+                if (cx, cy) in level
+            ]
+
+        features = []
+        for cell in cells:
+            count, sum_lon, sum_lat, keys = level[cell]
+            lon, lat = sum_lon / count, sum_lat / count
+            if not (lon_min <= lon <= lon_max and lat_min <= lat <= lat_max):
+                continue
+            if count == 1:
+                feature = point_feature(next(iter(keys)))
+                if feature is not None:
+                    features.append(feature)
+                continue
+            features.append({
+                "type": "Feature",
+                "id": f"cluster-{zoom}-{cell[0]}-{cell[1]}",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [round(lon, 5), round(lat, 5)]
+                },
+                "properties": {
+                    "cluster": True,
+                    "point_count": count
+                }
+            })
+        return features
+
+    def get_stats(self) -> Dict:
+        return {
+            "points": len(self.positions),
+            "levels": {zoom: len(level) for zoom, level in self.levels.items()}
+        }
+
+    def _reset_levels(self):
+        self.levels = {zoom: {} for zoom in range(self.zoom_min, self.zoom_max)}
+
+    def _scale(self, zoom: int) -> float:
+        return TILE_SIZE * (1 << zoom) / self.radius_px
+
+    def _cells(self, lon: float, lat: float) -> Tuple[Cell, ...]:
+        x, y = mercator(lon, lat)
+        cells = []
+        for zoom in self.levels:
+            scale = self._scale(zoom)
+            cells.append((math.floor(x * scale), math.floor(y * scale)))
+        return tuple(cells)
+
+    @staticmethod
+    def _discard(level: Dict[Cell, list], cell: Cell, key: Hashable, lon: float, lat: float):
+        entry = level.get(cell)
+        if entry is None or key not in entry[3]:
+            return
+        entry[3].discard(key)
+        if not entry[3]:
+            del level[cell]
+            return
+        entry[0] -= 1
+        entry[1] -= lon
+        entry[2] -= lat
@@ -18,11 +18,22 @@ from services.storm_service import StormService
 from services.news_service import NewsService
 from services.astronomy_service import AstronomyService
 from services.ephemerides_service import EphemeridesService
+from services.http_client import HttpClient
+from services.executor import BlockingExecutor
 
 
 class ConfigService:
-    def __init__(self, config_file: str = "config.json"):
+    def __init__(
+        self,
+        config_file: str = "config.json",
+        http_client: HttpClient = None,
+        executor: BlockingExecutor = None,
+        flights_service: FlightsService = None
+    ):
         self.config_file = Path(config_file)
+        self.http_client = http_client or HttpClient()
+        self.executor = executor or BlockingExecutor()
+        self.flights_service = flights_service
         self._config: AppConfig = None
         self.load_config()
 
@@ -43,9 +54,19 @@ class ConfigService:
 
     def save_config(self):
         """Guardar configuración en archivo"""
+        self._write_config(self._config.model_dump())
+
+    async def save_config_async(self):
+        """Guardar configuración sin bloquear el bucle de eventos"""
+        await self.executor.run(self._write_config, self._config.model_dump())
+
+    def _write_config(self, data: Dict[str, Any]):
+        """Escribir el JSON en un fichero temporal y reemplazar (nunca queda a medias)"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self._config.model_dump(), f, indent=2, ensure_ascii=False)
+            tmp_file = self.config_file.with_name(self.config_file.name + ".tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, self.config_file)
         except Exception as e:
             print(f"Error guardando configuración: {e}")
 
@@ -57,7 +78,7 @@ class ConfigService:
         """Obtener configuración como diccionario (para JSON)"""
         return self._config.model_dump()
 
-    def update_group(self, group_name: str, data: Dict[str, Any]):
+    async def update_group(self, group_name: str, data: Dict[str, Any]):
         """Actualizar un grupo de configuración"""
         if not hasattr(self._config, group_name):
             raise ValueError(f"Grupo de configuración '{group_name}' no existe")
@@ -71,7 +92,7 @@ class ConfigService:
         new_group_config = group_class(**updated_data)
         setattr(self._config, group_name, new_group_config)
 
-        self.save_config()
+        await self.save_config_async()
 
     async def test_group(self, group_name: str) -> Dict[str, Any]:
         """Probar configuración de un grupo con llamadas reales"""
@@ -79,14 +100,14 @@ class ConfigService:
         
         try:
             if group_name == "weather":
-                service = WeatherService()
+                service = WeatherService(self.http_client)
                 result = await service.get_weather(config.weather)
                 if result and result.get('current'):
                     return {"ok": True, "message": f"API de tiempo OK. Temp: {result['current']['temperature']:.1f}°C"}
                 return {"ok": False, "message": "Respuesta de API de tiempo inesperada."}
 
             elif group_name == "aemet":
-                service = AemetService()
+                service = AemetService(self.http_client)
                 result = await service.get_radar_data(config.aemet)
                 if result and result.get('url'):
                     return {"ok": True, "message": "API de AEMET OK. URL obtenida."}
@@ -96,15 +117,17 @@ class ConfigService:
                 if not config.ships.enabled:
                     return {"ok": True, "message": "Servicio deshabilitado."}
                 service = ShipsService()
-                result = await service.get_ships(config.ships)
-                if result and isinstance(result.get('features'), list):
-                    return {"ok": True, "message": f"API de barcos OK. {len(result['features'])} barcos encontrados."}
-                return {"ok": False, "message": "Respuesta de API de barcos inesperada."}
+                received = await service.test_connection(config.ships, timeout=10)
+                if received:
+                    return {"ok": True, "message": f"API de barcos OK. {received} mensajes AIS recibidos en 10 s."}
+                return {"ok": False, "message": "Conectado a AIS Stream pero sin mensajes en 10 s."}
 
             elif group_name == "flights":
                 if not config.flights.enabled:
                     return {"ok": True, "message": "Servicio deshabilitado."}
-                service = FlightsService()
+                # El servicio en uso: los créditos de OpenSky de la prueba cuentan en su
+                # presupuesto y, si hay una respuesta reciente en caché, no se gastan
+                service = self.flights_service or FlightsService(self.http_client)
                 result = await service.get_flights(config.flights)
                 if result and isinstance(result.get('features'), list):
                     return {"ok": True, "message": f"API de vuelos OK. {len(result['features'])} vuelos encontrados."}
@@ -121,7 +144,7 @@ class ConfigService:
             elif group_name == "news":
                 if not config.news.enabled:
                     return {"ok": True, "message": "Servicio deshabilitado."}
-                service = NewsService()
+                service = NewsService(self.http_client)
                 result = await service.get_news(config.news)
                 if result and isinstance(result, list):
                     return {"ok": True, "message": f"API de noticias OK. {len(result)} noticias obtenidas."}
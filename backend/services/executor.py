@@ -0,0 +1,132 @@
+"""
+Ejecución de trabajo bloqueante fuera del bucle de eventos
+Pool de hilos acotado compartido, subprocesos asíncronos y monitor de latencia del bucle
+"""
+import asyncio
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+class BlockingExecutor:
+    """Pool de hilos para E/S de ficheros, psutil o parseo, y subprocesos sin bloquear el bucle"""
+
+    def __init__(self, max_workers: int = 4, max_processes: int = 2):
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blocking")
+        self.processes = asyncio.Semaphore(max_processes)
+        self.active = 0
+        self.stats = {
+            "calls": 0,
+            "errors": 0,
+            "max_queue_ms": 0.0,
+            "max_run_ms": 0.0,
+            "subprocesses": 0,
+            "subprocess_timeouts": 0
+        }
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecutar func(*args, **kwargs) en el pool y esperar el resultado"""
+        submitted = time.perf_counter()
+        self.stats["calls"] += 1
+
+        def call():
+            started = time.perf_counter()
+            self.stats["max_queue_ms"] = max(self.stats["max_queue_ms"], round((started - submitted) * 1000, 2))
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.stats["max_run_ms"] = max(self.stats["max_run_ms"], round((time.perf_counter() - started) * 1000, 2))
+
+        self.active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, call)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.active -= 1
+
+    async def run_process(self, args: List[str], timeout: float) -> subprocess.CompletedProcess:
+        """Equivalente asíncrono de subprocess.run(args, capture_output=True, text=True, timeout=timeout)"""
+        async with self.processes:
+            self.stats["subprocesses"] += 1
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.stats["subprocess_timeouts"] += 1
+                process.kill()
+                await process.wait()
+                raise subprocess.TimeoutExpired(args, timeout)
+            return subprocess.CompletedProcess(
+                args,
+                process.returncode,
+                stdout.decode("utf-8", errors="replace"),
+                stderr.decode("utf-8", errors="replace")
+            )
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["workers"] = self.max_workers
+        stats["active"] = self.active
+        return stats
+
+class LoopLagMonitor:
+    """Mide cuánto se retrasa el bucle de eventos respecto a un temporizador periódico.
+
+    Cada interval segundos se compara la hora real de despertar con la
+    esperada; la diferencia es el tiempo que el bucle estuvo ocupado sin
+    atender otras tareas (rayos, WebSocket, rutas).
+    """
+
+    def __init__(self, interval: float = 0.25, stall_threshold: float = 0.1, window: int = 240):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.samples: deque = deque(maxlen=window)
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {
+            "max_ms": 0.0,
+            "stalls": 0,
+            "stalled_ms": 0.0
+        }
+
+    async def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            self.samples.append(lag)
+            self.stats["max_ms"] = max(self.stats["max_ms"], round(lag * 1000, 2))
+            if lag >= self.stall_threshold:
+                self.stats["stalls"] += 1
+                self.stats["stalled_ms"] = round(self.stats["stalled_ms"] + lag * 1000, 2)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        samples = sorted(self.samples)
+        if samples:
+            stats["last_ms"] = round(self.samples[-1] * 1000, 2)
+            stats["p50_ms"] = round(samples[len(samples) // 2] * 1000, 2)
+            stats["p99_ms"] = round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 2)
+        stats["running"] = self.task is not None and not self.task.done()
+        return stats
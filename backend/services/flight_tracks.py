@@ -0,0 +1,115 @@
+"""
+Historial de trayectorias de aviones
+Buffer circular de posiciones por icao24 con memoria acotada y estima por navegación a la estima
+"""
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from services.geodesy import destination
+
+# (ts, lon, lat, alt, velocity, true_track, vertical_rate)
+Sample = Tuple[float, float, float, float, float, float, float]
+
+class FlightTracks:
+    """Últimas max_points posiciones de cada avión.
+
+    OpenSky devuelve solo el último vector de estado; aquí se conserva la
+    trayectoria reciente para dibujar estelas y, con el último vector, estimar
+    la posición en cualquier instante entre consultas. La memoria queda
+    acotada por max_points por avión, max_aircraft aviones y ttl_seconds
+    desde la última posición.
+    """
+
+    def __init__(self, max_points: int = 20, ttl_seconds: float = 600, max_aircraft: int = 5000):
+        self.max_points = max_points
+        self.ttl_seconds = ttl_seconds
+        self.max_aircraft = max_aircraft
+        self.tracks: "OrderedDict[str, deque]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def configure(self, max_points: int):
+        """Cambiar la longitud de las trayectorias conservando las últimas posiciones"""
+        if max_points == self.max_points:
+            return
+        self.max_points = max_points
+        for icao24, track in self.tracks.items():
+            self.tracks[icao24] = deque(track, maxlen=max_points)
+
+    def record(self, icao24: str, sample: Sample):
+        """Añadir una posición (se ignora si OpenSky repite la misma time_position)"""
+        track = self.tracks.get(icao24)
+        if track is None:
+            track = self.tracks[icao24] = deque(maxlen=self.max_points)
+        elif track[-1][0] >= sample[0]:
+            return
+        track.append(sample)
+        self.tracks.move_to_end(icao24)
+
+    def expire(self, now: float):
+        """Eliminar aviones sin posición reciente y los más antiguos por encima del límite"""
+        tracks = self.tracks
+        cutoff = now - self.ttl_seconds
+        while tracks and (len(tracks) > self.max_aircraft or next(iter(tracks.values()))[-1][0] < cutoff):
+            tracks.popitem(last=False)
+
+    def track(self, icao24: str) -> Optional[Dict]:
+        """Trayectoria reciente como LineString GeoJSON (None si no hay historial)"""
+        track = self.tracks.get(icao24)
+        if not track:
+            return None
+        return {
+            "type": "Feature",
+            "id": icao24,
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[lon, lat, alt] for _, lon, lat, alt, _, _, _ in track]
+            },
+            "properties": {
+                "icao24": icao24,
+                "times": [ts for ts, *_ in track]
+            }
+        }
+
+    def predict(self, icao24s: Iterable[str], at: float, max_seconds: float) -> Dict[str, Tuple[float, float, float, float]]:
+        """Posición estimada (lon, lat, alt, segundos extrapolados) de cada avión en el instante at.
+
+        Se parte del último vector de estado y se avanza por la ortodrómica
+        según velocity (m/s) y true_track, y en altura según vertical_rate;
+        la extrapolación se limita a max_seconds para no inventar trayectorias.
+        """
+        latest = [(icao24, self.tracks[icao24][-1]) for icao24 in icao24s if icao24 in self.tracks]
+        if not latest:
+            return {}
+        samples = np.array([sample for _, sample in latest], dtype=np.float64)
+        ts, lons, lats, alts, velocity, heading, vertical_rate = samples.T
+        dt = np.clip(at - ts, 0.0, max_seconds)
+        new_lats, new_lons = destination(lats, lons, heading, velocity * dt / 1000.0)
+        new_alts = np.maximum(alts + vertical_rate * dt, 0.0)
+        return {
+            icao24: (float(new_lons[k]), float(new_lats[k]), float(new_alts[k]), float(dt[k]))
+            for k, (icao24, _) in enumerate(latest)
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            "aircraft": len(self.tracks),
+            "points": sum(len(track) for track in self.tracks.values())
+        }
+
+def track_sample(state: List, now: float) -> Optional[Sample]:
+    """Muestra de trayectoria a partir de un vector de estado de OpenSky"""
+    lon, lat = state[5], state[6]
+    if lon is None or lat is None:
+        return None
+    # time_position es el instante de la posición; last_contact si no viene
+    ts = state[3] or state[4] or now
+    return (
+        float(ts), float(lon), float(lat),
+        float(state[7] or state[13] or 0),  # baro_altitude o geo_altitude
+        float(state[9] or 0),  # velocity (m/s)
+        float(state[10] or 0),  # true_track (grados)
+        0.0 if state[8] else float(state[11] or 0)  # vertical_rate (m/s), nula en tierra
+    )
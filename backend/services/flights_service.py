@@ -2,54 +2,208 @@
 Servicio de datos de aviones
 Integración con OpenSky Network
 """
+import asyncio
 import aiohttp
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional
 from models.config import FlightsConfig
+from services.http_client import HttpClient, RateLimitedError
+from services.response_cache import ResponseCache
+from services.stream_hub import StreamHub
+from services.layer_versions import LayerChangeLog, make_etag
+from services.clustering import ZoomClusters, clip_bbox
+from services.flight_tracks import FlightTracks, track_sample
+from services.opensky_budget import (
+    ANONYMOUS_DAILY_CREDITS, AUTHENTICATED_DAILY_CREDITS, CreditBudget, credit_cost, split_bbox
+)
 
 class FlightsService:
-    def __init__(self):
-        self.cache = {}
-        self.cache_ttl = 30  # 30 segundos
+    def __init__(self, http_client: HttpClient = None, stream_hub: StreamHub = None):
+        self.http = http_client or HttpClient()
+        self.hub = stream_hub
+        self.changes = LayerChangeLog()
+        self.features_by_id: Dict[str, Dict] = {}
+        self.clusters = ZoomClusters()
+        self.tracks = FlightTracks(FlightsConfig().track_points)
+        self.cache = ResponseCache("flights")
+        self.budget = CreditBudget()
+        self.truncated = 0
     
-    async def get_flights(self, config: FlightsConfig) -> Dict:
-        """Obtener datos de aviones"""
+    async def get_flights(self, config: FlightsConfig, refresh: bool = False) -> Dict:
+        """Obtener datos de aviones (cacheados por bounding box)"""
         if not config.enabled:
             return {"type": "FeatureCollection", "features": []}
         
+        # Los errores se propagan: el planificador conserva la última instantánea,
+        # aplica backoff y el health check muestra el fallo
+        key = tuple(config.bbox)
+        return await self.cache.get_or_fetch(key, config.ttl_seconds, lambda: self._fetch_flights(config), refresh=refresh)
+    
+    async def _fetch_flights(self, config: FlightsConfig) -> Dict:
+        """Obtener datos de aviones de OpenSky (en paralelo por teselas si el bbox es grande)"""
+        # Si hay credenciales, usarlas
+        auth = None
+        if config.client_id and config.client_secret:
+            auth = aiohttp.BasicAuth(config.client_id, config.client_secret)
+        
+        shards = split_bbox(config.bbox, config.shard_max_area)
+        responses = await asyncio.gather(*(self._fetch_states(shard, auth) for shard in shards), return_exceptions=True)
+        self.budget.polls += 1
+        errors = [response for response in responses if isinstance(response, BaseException)]
+        if errors:
+            # Sin todas las teselas se darían por desaparecidos aviones que siguen ahí
+            raise next((e for e in errors if isinstance(e, RateLimitedError)), errors[0])
+        
+        # Las teselas comparten bordes: un avión puede venir en dos respuestas
+        states = {}
+        for data in responses:
+            for state in data.get("states") or []:
+                if state:
+                    states[state[0]] = state
+        
+        result = self._process_opensky_data({"states": list(states.values())}, config)
+        self._record_changes(result["features"])
+        result["cursor"] = self.changes.version
+        if self.hub:
+            self.hub.publish("flights", "snapshot", result["features"])
+        return result
+    
+    async def _fetch_states(self, bbox: List[float], auth: Optional[aiohttp.BasicAuth]) -> Dict:
+        """Consulta /states/all de un bbox, anotando los créditos restantes"""
         # OpenSky Network API
         url = "https://opensky-network.org/api/states/all"
         params = {
-            "lamin": config.bbox[1],
-            "lamax": config.bbox[3],
-            "lomin": config.bbox[0],
-            "lomax": config.bbox[2]
+            "lamin": bbox[1],
+            "lamax": bbox[3],
+            "lomin": bbox[0],
+            "lomax": bbox[2]
         }
         
-        # Si hay credenciales, usarlas
-        auth = None
+        session = self.http.get_session()
+        async with session.get(url, params=params, auth=auth, trace_request_ctx={"service": "opensky"}) as response:
+            if response.status == 429:
+                self.budget.exhausted()
+            self.http.raise_for_rate_limit(response, "OpenSky")
+            self.budget.record(response.headers.get("X-Rate-Limit-Remaining"), credit_cost(bbox))
+            if response.status == 200:
+                return await response.json()
+            else:
+                raise Exception(f"Error en OpenSky: {response.status}")
+    
+    def poll_interval(self, config: FlightsConfig, min_seconds: float) -> float:
+        """Intervalo de refresco que hace durar los créditos de OpenSky hasta la renovación diaria"""
+        return self.budget.poll_interval(self._cost_per_poll(config), self._daily_credits(config), min_seconds)
+    
+    def get_stats(self, config: FlightsConfig) -> Dict:
+        """Créditos de OpenSky, cadencia efectiva y aviones descartados por el límite"""
+        stats = self.budget.get_stats()
+        stats["daily_credits"] = self._daily_credits(config)
+        stats["cost_per_poll"] = self._cost_per_poll(config)
+        stats["shards"] = len(split_bbox(config.bbox, config.shard_max_area))
+        stats["aircraft"] = len(self.features_by_id)
+        stats["max_features"] = config.max_features
+        stats["truncated"] = self.truncated
+        return stats
+    
+    @staticmethod
+    def _cost_per_poll(config: FlightsConfig) -> int:
+        return sum(credit_cost(shard) for shard in split_bbox(config.bbox, config.shard_max_area))
+    
+    @staticmethod
+    def _daily_credits(config: FlightsConfig) -> int:
+        if config.daily_credits:
+            return config.daily_credits
         if config.client_id and config.client_secret:
-            auth = aiohttp.BasicAuth(config.client_id, config.client_secret)
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, auth=auth) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return self._process_opensky_data(data, config)
-                    else:
-                        raise Exception(f"Error en OpenSky: {response.status}")
-        except Exception as e:
-            print(f"Error obteniendo datos de aviones: {e}")
-            return {"type": "FeatureCollection", "features": []}
+            return AUTHENTICATED_DAILY_CREDITS
+        return ANONYMOUS_DAILY_CREDITS
+    
+    def get_flight_clusters(self, config: FlightsConfig, zoom: int, bbox: List[float] = None) -> Dict:
+        """Aviones de la última consulta agrupados para un nivel de zoom"""
+        features = self.clusters.query(zoom, clip_bbox(bbox, config.bbox), self.features_by_id.get)
+        return {"type": "FeatureCollection", "features": features, "cursor": self.changes.version, "zoom": zoom}
+    
+    def get_tile_features(self, config: FlightsConfig, bbox: List[float], level: Optional[int] = None) -> List[Dict]:
+        """Aviones de una tesela: agrupados si level no es None"""
+        if level is not None:
+            return self.get_flight_clusters(config, level, bbox)["features"]
+        lon_min, lat_min, lon_max, lat_max = clip_bbox(bbox, config.bbox)
+        return [
+            feature for feature in self.features_by_id.values()
+            if lon_min <= feature["geometry"]["coordinates"][0] <= lon_max
+            and lat_min <= feature["geometry"]["coordinates"][1] <= lat_max
+        ]
+    
+    def get_predicted_flights(self, config: FlightsConfig, at: float) -> Dict:
+        """Aviones de la última consulta con la posición estimada en el instante at"""
+        positions = self.tracks.predict(self.features_by_id.keys(), at, config.max_extrapolation_seconds)
+        features = []
+        for icao24, feature in self.features_by_id.items():
+            position = positions.get(icao24)
+            if position is None:
+                features.append(feature)
+                continue
+            lon, lat, alt, extrapolated = position
+            properties = dict(feature["properties"])
+            properties.update(lon=lon, lat=lat, alt=alt, extrapolated_seconds=round(extrapolated, 1))
+            features.append({
+                "type": "Feature",
+                "id": icao24,
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [lon, lat]
+                },
+                "properties": properties
+            })
+        return {"type": "FeatureCollection", "features": features, "at": at}
+    
+    def get_track(self, icao24: str) -> Optional[Dict]:
+        """Trayectoria reciente de un avión"""
+        return self.tracks.track(icao24.lower())
+    
+    def get_etag(self, config: FlightsConfig) -> str:
+        """ETag de la capa: cambia cuando una consulta trae aviones nuevos, movidos o desaparecidos"""
+        return make_etag("flights", self.changes.version, tuple(config.bbox))
+    
+    def get_changes(self, config: FlightsConfig, cursor: int) -> Optional[Dict]:
+        """Aviones añadidos, movidos y desaparecidos desde cursor (None si hay que pedir todo)"""
+        changes = self.changes.since(cursor)
+        if changes is None:
+            return None
+        return {
+            "cursor": self.changes.version,
+            "added": [self.features_by_id[icao24] for icao24 in changes["added"]],
+            "moved": [self.features_by_id[icao24] for icao24 in changes["moved"]],
+            "expired": changes["expired"]
+        }
+    
+    def _record_changes(self, features: list):
+        """Comparar la nueva consulta con la anterior y registrar las diferencias"""
+        previous = self.features_by_id
+        current = {feature["id"]: feature for feature in features}
+        for icao24, feature in current.items():
+            old = previous.get(icao24)
+            lon, lat = feature["geometry"]["coordinates"]
+            if old is None:
+                self.changes.record("add", icao24)
+                self.clusters.upsert(icao24, lon, lat)
+            elif old["geometry"]["coordinates"] != feature["geometry"]["coordinates"]:
+                self.changes.record("move", icao24)
+                self.clusters.upsert(icao24, lon, lat)
+        for icao24 in previous.keys() - current.keys():
+            self.changes.record("expire", icao24)
+            self.clusters.remove(icao24)
+        self.features_by_id = current
     
     def _process_opensky_data(self, data: Dict, config: FlightsConfig) -> Dict:
         """Procesar datos de OpenSky"""
         features = []
         now = datetime.now().timestamp()
+        self.tracks.configure(config.track_points)
+        
+        self.truncated = 0
         
         if "states" in data:
-            for state in data["states"]:
+            for k, state in enumerate(data["states"]):
                 if not state or len(state) < 17:
                     continue
                 
@@ -70,6 +224,7 @@ class FlightsService:
                 if lon and lat:
                     features.append({
                         "type": "Feature",
+                        "id": icao24,
                         "geometry": {
                             "type": "Point",
                             "coordinates": [lon, lat]
@@ -86,9 +241,14 @@ class FlightsService:
                             "ts": now
                         }
                     })
+                    sample = track_sample(state, now)
+                    if sample is not None:
+                        self.tracks.record(icao24, sample)
                 
-                if len(features) >= 1000:  # Limitar resultados
+                if len(features) >= config.max_features:  # Limitar resultados
+                    self.truncated = len(data["states"]) - k - 1
                     break
         
+        self.tracks.expire(now)
         return {"type": "FeatureCollection", "features": features}
 
@@ -0,0 +1,109 @@
+"""
+Caché en disco de imágenes de radar
+Fotogramas por timestamp con desalojo LRU acotado por tamaño total
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+EXTENSIONS = {"image/gif": "gif", "image/png": "png", "image/jpeg": "jpg"}
+MEDIA_TYPES = {ext: media_type for media_type, ext in EXTENSIONS.items()}
+
+class DiskFrameCache:
+    """Fotogramas guardados como <directorio>/<ts>.<ext>.
+
+    El índice en memoria (timestamp -> fichero y tamaño) se reconstruye al
+    arrancar a partir del directorio, en orden de último acceso (mtime). Los
+    métodos hacen E/S de disco: se llaman desde el pool de hilos, y el índice
+    se protege con un lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[int, Tuple[Path, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self.lock = threading.Lock()
+        self._load_index()
+
+    def __contains__(self, ts: int) -> bool:
+        return ts in self.entries
+
+    def timestamps(self) -> List[int]:
+        with self.lock:
+            return sorted(self.entries)
+
+    def get(self, ts: int) -> Optional[Tuple[Path, str]]:
+        """Ruta y tipo MIME de un fotograma (None si no está)"""
+        with self.lock:
+            entry = self.entries.get(ts)
+            if entry is None or not entry[0].exists():
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(ts)
+            os.utime(entry[0])
+            self.stats["hits"] += 1
+        return entry[0], MEDIA_TYPES.get(entry[0].suffix[1:], "application/octet-stream")
+
+    def read(self, ts: int) -> Optional[bytes]:
+        entry = self.entries.get(ts)
+        return entry[0].read_bytes() if entry and entry[0].exists() else None
+
+    def put(self, ts: int, content: bytes, media_type: str):
+        """Guardar un fotograma (escritura atómica) y desalojar los menos usados si se supera max_bytes"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{ts}.{EXTENSIONS.get(media_type, 'bin')}"
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_bytes(content)
+        with self.lock:
+            self._remove(ts)
+            os.replace(tmp_path, path)
+            self.entries[ts] = (path, len(content))
+            self.total_bytes += len(content)
+            self.stats["stored"] += 1
+            self._evict()
+
+    def resize(self, max_bytes: int):
+        """Cambiar el límite de tamaño y desalojar lo que sobre"""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _remove(self, ts: int):
+        entry = self.entries.pop(ts, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry[1]
+        try:
+            entry[0].unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self.entries and self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.stats["evicted"] += 1
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["frames"] = len(self.entries)
+        stats["bytes"] = self.total_bytes
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+    def _load_index(self):
+        if not self.directory.exists():
+            return
+        found = []
+        for path in self.directory.iterdir():
+            stem, _, ext = path.name.partition(".")
+            if not stem.isdigit() or ext not in MEDIA_TYPES:
+                continue
+            stat = path.stat()
+            found.append((stat.st_mtime, int(stem), path, stat.st_size))
+        for _, ts, path, size in sorted(found):
+            self.entries[ts] = (path, size)
+            self.total_bytes += size
@@ -0,0 +1,127 @@
+"""
+Serialización rápida de capas geográficas
+Codifica FeatureCollections con orjson y comprime con gzip/brotli según Accept-Encoding
+"""
+import gzip
+import json
+from typing import Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+
+# orjson y brotli son opcionales: sin ellos se usa json estándar y solo gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def dumps(content) -> bytes:
+    """Serializar a JSON compacto en bytes"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Elegir la mejor codificación aceptada por el cliente ("br", "gzip" o None)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(token.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+class GeoResponseEncoder:
+    """Codifica respuestas de capa y guarda el último cuerpo por capa indexado por ETag.
+
+    Varios clientes pidiendo la misma versión de una capa comparten el mismo
+    cuerpo ya serializado y comprimido en cada codificación.
+    """
+
+    def __init__(self, min_size: int = 1024, gzip_level: int = 5, brotli_quality: int = 4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.bodies: Dict[str, Tuple[str, Dict]] = {}  # capa -> (etag, {codificación: (cuerpo, codificación usada)})
+        self.stats = {"responses": 0, "cache_hits": 0, "raw_bytes": 0, "sent_bytes": 0}
+
+    def compress(self, body: bytes, encoding: Optional[str]) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        if encoding == "gzip":
+            return gzip.compress(body, compresslevel=self.gzip_level)
+        return body
+
+    def encode(self, content, encoding: Optional[str], serialize=dumps) -> Tuple[bytes, Optional[str]]:
+        """Serializar y comprimir (sin comprimir cuerpos pequeños)"""
+        raw = serialize(content)
+        self.stats["raw_bytes"] += len(raw)
+        if len(raw) < self.min_size:
+            return raw, None
+        return self.compress(raw, encoding), encoding
+
+    def response(self, request: Request, content, headers: Dict[str, str] = None) -> Response:
+        """Respuesta codificada según Accept-Encoding"""
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        body, encoding = self.encode(content, encoding)
+        return self._build(body, encoding, headers)
+
+    def bytes_response(self, request: Request, body: bytes, media_type: str, headers: Dict[str, str] = None) -> Response:
+        """Respuesta binaria ya serializada (p. ej. teselas), comprimida según Accept-Encoding"""
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        body, encoding = self.encode(body, encoding, serialize=bytes)
+        return self._build(body, encoding, headers, media_type)
+
+    async def layer_response(
+        self,
+        request: Request,
+        layer: str,
+        etag: str,
+        get_content,
+        headers: Dict[str, str] = None,
+        serialize=dumps,
+        media_type: str = "application/json"
+    ) -> Response:
+        """Respuesta de capa completa: solo construye y serializa si cambió el ETag.
+
+        layer identifica la entrada de la caché: cada formato de una capa usa la suya.
+        """
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        key = encoding or "identity"
+        cached = self.bodies.get(layer)
+        if cached is None or cached[0] != etag:
+            cached = (etag, {})
+            self.bodies[layer] = cached
+        elif key in cached[1]:
+            self.stats["cache_hits"] += 1
+            body, used = cached[1][key]
+            return self._build(body, used, headers, media_type)
+
+        content = await get_content()
+        body, used = self.encode(content, encoding, serialize)
+        if self.bodies.get(layer) is cached:
+            cached[1][key] = (body, used)
+        return self._build(body, used, headers, media_type)
+
+    def _build(self, body: bytes, encoding: Optional[str], headers: Dict[str, str] = None, media_type: str = "application/json") -> Response:
+        headers = dict(headers or {})
+        headers.setdefault("Vary", "Accept-Encoding")
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        self.stats["responses"] += 1
+        self.stats["sent_bytes"] += len(body)
+        return Response(body, media_type=media_type, headers=headers)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["orjson"] = orjson is not None
+        stats["brotli"] = brotli is not None
+        return stats
@@ -0,0 +1,65 @@
+"""
+Cálculos geodésicos vectorizados
+Distancia ortodrómica (haversine) y rumbo inicial sobre arrays NumPy
+"""
+import math
+from typing import Tuple
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distancia en km desde (lat, lon) a cada punto"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons - lon)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def bearing_deg(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Rumbo inicial en grados (0 = norte, sentido horario) desde (lat, lon) a cada punto"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dlambda = np.radians(lons - lon)
+    y = np.sin(dlambda) * np.cos(phi2)
+    x = math.cos(phi1) * np.sin(phi2) - math.sin(phi1) * np.cos(phi2) * np.cos(dlambda)
+    return (np.degrees(np.arctan2(y, x)) + 360.0) % 360.0
+
+def radius_filter(
+    lat: float,
+    lon: float,
+    radius_km: float,
+    lats: np.ndarray,
+    lons: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Índices de los puntos dentro del radio, con su distancia y rumbo.
+
+    Un prefiltro por bounding box descarta la mayoría de puntos con
+    comparaciones baratas antes de aplicar la fórmula de haversine.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(dlat / cos_lat, 180.0)
+    candidates = np.flatnonzero(
+        (np.abs(lats - lat) <= dlat) &
+        (np.abs((lons - lon + 180.0) % 360.0 - 180.0) <= dlon)
+    )
+
+    cand_lats = lats[candidates]
+    cand_lons = lons[candidates]
+    distances = haversine_km(lat, lon, cand_lats, cand_lons)
+    inside = distances <= radius_km
+    idx = candidates[inside]
+    return idx, distances[inside], bearing_deg(lat, lon, cand_lats[inside], cand_lons[inside])
+
+def destination(lats: np.ndarray, lons: np.ndarray, bearings: np.ndarray, distances_km: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Punto alcanzado desde cada (lat, lon) siguiendo su rumbo inicial (grados) una distancia en km"""
+    phi1 = np.radians(lats)
+    theta = np.radians(bearings)
+    delta = distances_km / EARTH_RADIUS_KM
+    sin_phi2 = np.sin(phi1) * np.cos(delta) + np.cos(phi1) * np.sin(delta) * np.cos(theta)
+    phi2 = np.arcsin(np.clip(sin_phi2, -1.0, 1.0))
+    dlambda = np.arctan2(np.sin(theta) * np.sin(delta) * np.cos(phi1), np.cos(delta) - np.sin(phi1) * sin_phi2)
+    return np.degrees(phi2), (np.degrees(np.radians(lons) + dlambda) + 540.0) % 360.0 - 180.0
@@ -7,17 +7,41 @@ import hashlib
 import json
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict
+from services.executor import BlockingExecutor
+from services.metrics import MetricsRegistry
 
 class HealthService:
-    def __init__(self, config_file: str = "config.json"):
+    def __init__(self, config_file: str = "config.json", executor: BlockingExecutor = None, metrics: MetricsRegistry = None):
         self.config_file = Path(config_file)
+        self.executor = executor or BlockingExecutor()
+        self.metrics = metrics or MetricsRegistry()
         self.start_time = datetime.now()
+        self.stats_providers: Dict[str, Callable[[], Dict]] = {}
+        self.service_providers: Dict[str, Callable[[], Dict]] = {}
+
+    def register_stats(self, name: str, provider: Callable[[], Dict]):
+        """Registrar una fuente de métricas para incluir en el health check"""
+        self.stats_providers[name] = provider
+    
+    def register_service(self, name: str, provider: Callable[[], Dict]):
+        """Registrar el estado de un servicio ({"status": ..., "count": ..., ...})"""
+        self.service_providers[name] = provider
+    
+    def collect_stats(self) -> Dict:
+        """Métricas de todos los componentes registrados"""
+        stats = {}
+        for name, provider in self.stats_providers.items():
+            try:
+                stats[name] = provider()
+            except Exception as e:
+                stats[name] = {"error": str(e)}
+        return stats
     
     async def get_health(self) -> Dict:
         """Obtener estado de salud del sistema"""
-        # CPU y memoria
-        cpu_percent = psutil.cpu_percent(interval=0.1)
+        # CPU y memoria (cpu_percent espera 0,1 s: fuera del bucle de eventos)
+        cpu_percent = await self.executor.run(psutil.cpu_percent, interval=0.1)
         memory = psutil.virtual_memory()
         memory_percent = memory.percent
         
@@ -26,15 +50,18 @@ class HealthService:
         uptime_str = self._format_uptime(uptime_delta)
         
         # Checksum de configuración
-        config_checksum = self._get_config_checksum()
+        config_checksum = await self.executor.run(self._get_config_checksum)
         
         # Servicios
-        services = {
-            "aemet": {"status": "ok"},
-            "ships": {"status": "stopped", "count": 0},
-            "flights": {"status": "stopped", "count": 0},
-            "storm": {"status": "stopped", "count": 0}
-        }
+        services = {}
+        for name, provider in self.service_providers.items():
+            try:
+                services[name] = provider()
+            except Exception as e:
+                services[name] = {"status": "error", "details": str(e)}
+        
+        # Latencia por ruta y por proveedor
+        latency = {name: histogram.summary() for name, histogram in self.metrics.histograms.items()}
         
         return {
             "status": "ok",
@@ -43,7 +70,9 @@ class HealthService:
             "uptime": uptime_str,
             "config_source": "config.json",
             "config_checksum": config_checksum,
-            "services": services
+            "services": services,
+            "latency": latency,
+            "stats": self.collect_stats()
         }
     
     def _get_config_checksum(self) -> str:
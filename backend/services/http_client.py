@@ -0,0 +1,147 @@
+"""
+Cliente HTTP compartido
+Sesión aiohttp única con pool de conexiones, keep-alive y caché DNS
+"""
+import time
+import aiohttp
+from typing import Dict, Optional
+from models.config import HttpConfig
+from services.metrics import MetricsRegistry
+
+class RateLimitedError(Exception):
+    """El proveedor ha respondido 429; reintentar tras retry_after segundos"""
+    def __init__(self, message: str, retry_after: float = 60.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class HttpClient:
+    def __init__(self, metrics: MetricsRegistry = None):
+        self.config = HttpConfig()
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Tiempo hasta la respuesta por proveedor: session.get(..., trace_request_ctx={"service": "opensky"})
+        self.upstream_latency = (metrics or MetricsRegistry()).histogram(
+            "upstream_request_duration_seconds",
+            "Tiempo hasta las cabeceras de respuesta de las APIs externas",
+            ("service", "status")
+        )
+        self.stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "connections_queued": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+            "errors": 0,
+            "hosts": {}
+        }
+
+    async def start(self, config: HttpConfig):
+        """Crear la sesión compartida (arranque de la aplicación)"""
+        await self.close()
+        self.config = config
+        self.session = self._create_session()
+
+    async def close(self):
+        """Cerrar la sesión y liberar el pool (parada de la aplicación)"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Obtener la sesión compartida, creándola si aún no existe"""
+        if self.session is None or self.session.closed:
+            self.session = self._create_session()
+        return self.session
+
+    @staticmethod
+    def raise_for_rate_limit(response: aiohttp.ClientResponse, provider: str):
+        """Lanzar RateLimitedError si el proveedor limita las peticiones"""
+        if response.status != 429:
+            return
+        retry_after = 60.0
+        for header in ("Retry-After", "X-Rate-Limit-Retry-After-Seconds"):
+            value = response.headers.get(header)
+            if value:
+                try:
+                    retry_after = float(value)
+                    break
+                except ValueError:
+                    pass
+        raise RateLimitedError(f"{provider}: límite de peticiones alcanzado", retry_after)
+
+    def get_stats(self) -> Dict:
+        """Métricas del pool de conexiones"""
+        created = self.stats["connections_created"]
+        reused = self.stats["connections_reused"]
+        total = created + reused
+        stats = dict(self.stats)
+        stats["hosts"] = dict(self.stats["hosts"])
+        stats["reuse_ratio"] = round(reused / total, 3) if total else 0.0
+        stats["open"] = self.session is not None and not self.session.closed
+        return stats
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Crear sesión con connector persistente y trazas para métricas"""
+        connector = aiohttp.TCPConnector(
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            ttl_dns_cache=self.config.dns_cache_ttl,
+            keepalive_timeout=self.config.keepalive_timeout
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.config.total_timeout,
+            connect=self.config.connect_timeout
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[self._create_trace_config()]
+        )
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        """Registrar callbacks de trazas de aiohttp"""
+        trace_config = aiohttp.TraceConfig()
+
+        def service_of(ctx, params) -> str:
+            request_ctx = ctx.trace_request_ctx
+            if isinstance(request_ctx, dict) and request_ctx.get("service"):
+                return request_ctx["service"]
+            return params.url.host or ""
+
+        async def on_request_start(session, ctx, params):
+            self.stats["requests"] += 1
+            host = params.url.host or ""
+            self.stats["hosts"][host] = self.stats["hosts"].get(host, 0) + 1
+            ctx.started = time.perf_counter()
+
+        async def on_request_end(session, ctx, params):
+            self.upstream_latency.observe(time.perf_counter() - ctx.started, service_of(ctx, params), str(params.response.status))
+
+        async def on_request_exception(session, ctx, params):
+            self.stats["errors"] += 1
+            self.upstream_latency.observe(time.perf_counter() - ctx.started, service_of(ctx, params), "error")
+
+        async def on_connection_create_end(session, ctx, params):
+            self.stats["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.stats["connections_reused"] += 1
+
+        async def on_connection_queued_start(session, ctx, params):
+            self.stats["connections_queued"] += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.stats["dns_cache_hits"] += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self.stats["dns_cache_misses"] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_connection_queued_start.append(on_connection_queued_start)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
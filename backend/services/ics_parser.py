@@ -0,0 +1,507 @@
+"""
+Parser de calendarios iCalendar (ICS)
+Lectura en streaming con líneas plegadas, expansión de RRULE/EXDATE en una ventana e índice ordenado por inicio
+"""
+import bisect
+import calendar
+import re
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+SUPPORTED_RULE_PARTS = {"FREQ", "INTERVAL", "COUNT", "UNTIL", "BYDAY", "BYMONTHDAY", "BYMONTH", "WKST"}
+PROPERTIES = {"UID", "SUMMARY", "LOCATION", "DTSTART", "DTEND", "DURATION", "STATUS",
+              "RRULE", "EXDATE", "RDATE", "RECURRENCE-ID"}
+EVENT_COLUMNS = ("uid", "summary", "location", "start", "zone", "all_day", "duration", "cancelled")  # almacén por columnas
+MAX_PERIODS = 50000  # tope de periodos recorridos por regla (COUNT enorme o reglas mal formadas)
+
+_DURATION = re.compile(r"([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+_BYDAY = re.compile(r"([+-]?\d+)?(MO|TU|WE|TH|FR|SA|SU)$")
+
+def unfold_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Líneas lógicas: las que empiezan por espacio o tabulador continúan la anterior (RFC 5545, 3.1)"""
+    parts: List[str] = []
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if parts and line[:1] in (" ", "\t"):
+            parts.append(line[1:])
+            continue
+        if parts:
+            yield parts[0] if len(parts) == 1 else "".join(parts)
+        parts = [line] if line else []
+    if parts:
+        yield "".join(parts)
+
+def parse_line(line: str) -> Tuple[str, Dict[str, str], str]:
+    """NOMBRE;PARAM=valor:valor -> (nombre, parámetros, valor); los ':' entre comillas no separan"""
+    colon = line.find(":")
+    semicolon = line.find(";")
+    if semicolon == -1 or semicolon > colon:
+        return line[:colon].upper() if colon != -1 else line.upper(), {}, line[colon + 1:] if colon != -1 else ""
+    if '"' in line:
+        quoted = False
+        split = len(line)
+        for k, char in enumerate(line):
+            if char == '"':
+                quoted = not quoted
+            elif char == ":" and not quoted:
+                split = k
+                break
+        head, value = line[:split], line[split + 1:]
+    else:
+        head, _, value = line.partition(":")
+    name, *params = head.split(";")
+    return name.upper(), {key.upper(): val.strip('"') for key, _, val in (p.partition("=") for p in params)}, value
+
+def unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return (value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",")
+            .replace("\\;", ";").replace("\\\\", "\\"))
+
+def iter_components(lines: Iterable[str]) -> Iterator[Dict[str, List[Tuple[Dict[str, str], str]]]]:
+    """VEVENTs como dict propiedad -> [(parámetros, valor)] con las propiedades de PROPERTIES.
+
+    Se ignoran los componentes anidados (VALARM) y las propiedades que no
+    se muestran (DESCRIPTION, ATTENDEE...), que son la mayor parte del fichero.
+    """
+    event = None
+    depth = 0
+    for line in unfold_lines(lines):
+        # Nombre sin parsear parámetros: descartar pronto las propiedades que no interesan
+        end = len(line)
+        for separator in (":", ";"):
+            found = line.find(separator, 0, end)
+            if found != -1:
+                end = found
+        name = line[:end].upper()
+        if name not in PROPERTIES and name not in ("BEGIN", "END"):
+            continue
+        name, params, value = parse_line(line)
+        if name == "BEGIN":
+            if event is not None:
+                depth += 1
+            elif value.upper() == "VEVENT":
+                event = {}
+                depth = 0
+        elif name == "END":
+            if event is not None:
+                if depth:
+                    depth -= 1
+                elif value.upper() == "VEVENT":
+                    yield event
+                    event = None
+        elif event is not None and not depth and name in PROPERTIES:
+            event.setdefault(name, []).append((params, value))
+
+@lru_cache(maxsize=64)
+def get_zone(tzid: str) -> Optional[tzinfo]:
+    """Zona horaria IANA (los TZID desconocidos, p. ej. de Outlook, se tratan como hora local)"""
+    try:
+        return ZoneInfo(tzid.strip().lstrip("/"))
+    except Exception:
+        return None
+
+def parse_datetime(value: str, params: Dict[str, str]) -> Tuple[datetime, Optional[tzinfo], bool]:
+    """Hora de pared, zona (None = hora local) y si es de día completo"""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime(int(value[0:4]), int(value[4:6]), int(value[6:8])), None, True
+    wall = datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                    int(value[9:11]), int(value[11:13]), int(value[13:15] or 0))
+    if value.endswith("Z"):
+        return wall, timezone.utc, False
+    tzid = params.get("TZID")
+    return wall, get_zone(tzid) if tzid else None, False
+
+def _convert(wall: datetime, zone: tzinfo) -> datetime:
+    return wall.replace(tzinfo=zone).astimezone().replace(tzinfo=None)
+
+_day_offsets: Dict[Tuple[tzinfo, date], Optional[timedelta]] = {}
+
+def to_local(wall: datetime, zone: Optional[tzinfo]) -> datetime:
+    """Hora de pared de una zona -> hora local del sistema (naive, como datetime.now()).
+
+    La conversión con zoneinfo es cara; la diferencia entre ambas zonas se
+    guarda por día y solo se calcula hora a hora los días con cambio de hora.
+    """
+    if zone is None:
+        return wall
+    key = (zone, wall.date())
+    delta = _day_offsets.get(key, False)
+    if delta is False:
+        if len(_day_offsets) > 100000:
+            _day_offsets.clear()
+        midnight = datetime.combine(key[1], datetime.min.time())
+        last = midnight + timedelta(hours=23, minutes=59)
+        delta = _convert(midnight, zone) - midnight
+        if _convert(last, zone) - last != delta:
+            delta = None
+        _day_offsets[key] = delta
+    return _convert(wall, zone) if delta is None else wall + delta
+
+def zone_name(zone: Optional[tzinfo]) -> Optional[str]:
+    if zone is None:
+        return None
+    return "UTC" if zone is timezone.utc else getattr(zone, "key", None)
+
+def to_wall(local: datetime, zone: Optional[tzinfo]) -> datetime:
+    """Inversa de to_local"""
+    if zone is None:
+        return local
+    return local.astimezone(zone).replace(tzinfo=None)
+
+def parse_duration(value: str) -> Optional[timedelta]:
+    match = _DURATION.match(value.strip())
+    if not match:
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    delta = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                      minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -delta if sign == "-" else delta
+
+def parse_rrule(value: str) -> Dict[str, str]:
+    return {key.upper(): val for key, _, val in (part.partition("=") for part in value.split(";")) if val}
+
+def _month_days(year: int, month: int, bymonthday: List[int], byday: List[Tuple[Optional[int], int]], default_day: int) -> List[int]:
+    """Días del mes que cumplen BYMONTHDAY/BYDAY (con ordinal: 2MO, -1FR)"""
+    days_in_month = calendar.monthrange(year, month)[1]
+    by_monthday = None
+    if bymonthday:
+        by_monthday = {d if d > 0 else days_in_month + d + 1 for d in bymonthday}
+        by_monthday = {d for d in by_monthday if 1 <= d <= days_in_month}
+    by_weekday = None
+    if byday:
+        by_weekday = set()
+        first_weekday = date(year, month, 1).weekday()
+        for ordinal, weekday in byday:
+            days = list(range((weekday - first_weekday) % 7 + 1, days_in_month + 1, 7))
+            if ordinal is None:
+                by_weekday.update(days)
+            elif -len(days) <= (ordinal - 1 if ordinal > 0 else ordinal) < len(days):
+                by_weekday.add(days[ordinal - 1 if ordinal > 0 else ordinal])
+    if by_monthday is None and by_weekday is None:
+        return [default_day] if default_day <= days_in_month else []
+    if by_monthday is None:
+        return sorted(by_weekday)
+    if by_weekday is None:
+        return sorted(by_monthday)
+    return sorted(by_monthday & by_weekday)
+
+def _year_weekdays(year: int, byday: List[Tuple[Optional[int], int]]) -> List[date]:
+    """BYDAY de una regla YEARLY sin BYMONTH: ordinales relativos al año"""
+    first = date(year, 1, 1)
+    total = 366 if calendar.isleap(year) else 365
+    result = set()
+    for ordinal, weekday in byday:
+        days = [first + timedelta(days=k) for k in range((weekday - first.weekday()) % 7, total, 7)]
+        if ordinal is None:
+            result.update(days)
+        elif -len(days) <= (ordinal - 1 if ordinal > 0 else ordinal) < len(days):
+            result.add(days[ordinal - 1 if ordinal > 0 else ordinal])
+    return sorted(result)
+
+def rule_occurrences(start: datetime, rule: Dict[str, str], until: Optional[datetime], window_start: datetime, window_end: datetime) -> Iterator[datetime]:
+    """Ocurrencias de una RRULE (horas de pared de la zona del evento) hasta window_end.
+
+    Sin COUNT se salta directamente al periodo que contiene window_start;
+    con COUNT hay que recorrer desde DTSTART para contar bien.
+    """
+    freq = rule.get("FREQ", "")
+    interval = max(int(rule.get("INTERVAL", "1") or 1), 1)
+    count = int(rule["COUNT"]) if rule.get("COUNT") else None
+    byday = []
+    for item in filter(None, rule.get("BYDAY", "").split(",")):
+        match = _BYDAY.match(item.strip().upper())
+        if match:
+            byday.append((int(match.group(1)) if match.group(1) else None, WEEKDAYS[match.group(2)]))
+    bymonthday = [int(d) for d in filter(None, rule.get("BYMONTHDAY", "").split(","))]
+    bymonth = [int(m) for m in filter(None, rule.get("BYMONTH", "").split(","))]
+    weekdays = {weekday for _, weekday in byday}
+    clock = start.time()
+
+    first_period = 0
+    if count is None and window_start > start:
+        if freq == "DAILY":
+            elapsed = (window_start.date() - start.date()).days
+        elif freq == "WEEKLY":
+            elapsed = (window_start.date() - start.date()).days // 7
+        elif freq == "MONTHLY":
+            elapsed = (window_start.year - start.year) * 12 + window_start.month - start.month
+        else:
+            elapsed = window_start.year - start.year
+        first_period = max(elapsed // interval - 1, 0)
+
+    emitted = 0
+    week_start = start.date() - timedelta(days=start.weekday())
+    for period in range(first_period, first_period + MAX_PERIODS):
+        step = period * interval
+        if freq == "DAILY":
+            day = start.date() + timedelta(days=step)
+            candidates = [day]
+            if (bymonth and day.month not in bymonth) or (weekdays and day.weekday() not in weekdays) \
+                    or (bymonthday and day.day not in _month_days(day.year, day.month, bymonthday, [], day.day)):
+                candidates = []
+            period_start = day
+        elif freq == "WEEKLY":
+            period_start = week_start + timedelta(weeks=step)
+            days = sorted(weekdays) if weekdays else [start.weekday()]
+            candidates = [period_start + timedelta(days=d) for d in days]
+            candidates = [d for d in candidates if not bymonth or d.month in bymonth]
+        elif freq == "MONTHLY":
+            month_index = start.month - 1 + step
+            year, month = start.year + month_index // 12, month_index % 12 + 1
+            period_start = date(year, month, 1)
+            candidates = [] if bymonth and month not in bymonth else \
+                [date(year, month, d) for d in _month_days(year, month, bymonthday, byday, start.day)]
+        elif freq == "YEARLY":
+            year = start.year + step
+            period_start = date(year, 1, 1)
+            if byday and not bymonth and not bymonthday:
+                candidates = _year_weekdays(year, byday)
+            else:
+                candidates = [date(year, month, d) for month in (bymonth or [start.month])
+                              for d in _month_days(year, month, bymonthday, byday, start.day)]
+        else:
+            return
+
+        if datetime.combine(period_start, clock) > window_end or (until and datetime.combine(period_start, clock) > until):
+            return
+        for day in candidates:
+            occurrence = datetime.combine(day, clock)
+            if occurrence < start:
+                continue
+            if (until and occurrence > until) or occurrence > window_end:
+                return
+            emitted += 1
+            if count is not None and emitted > count:
+                return
+            yield occurrence
+
+class EventSpec:
+    """VEVENT ya interpretado: inicio en hora de pared de su zona, duración y regla de repetición"""
+
+    __slots__ = ("uid", "summary", "location", "start", "zone", "local_start", "all_day", "duration",
+                 "rule", "until", "exdates", "exdays", "rdates", "recurrence_id", "cancelled")
+
+    @classmethod
+    def from_component(cls, component: Dict[str, List[Tuple[Dict[str, str], str]]]) -> Optional["EventSpec"]:
+        def first(name: str) -> Optional[Tuple[Dict[str, str], str]]:
+            return component[name][0] if name in component else None
+
+        dtstart = first("DTSTART")
+        summary = first("SUMMARY")
+        if not dtstart or not summary:
+            return None
+        spec = cls()
+        spec.uid = (first("UID") or ({}, ""))[1]
+        spec.summary = unescape(summary[1]).strip()
+        location = first("LOCATION")
+        spec.location = unescape(location[1]).strip() if location else None
+        spec.start, spec.zone, spec.all_day = parse_datetime(dtstart[1], dtstart[0])
+        spec.local_start = to_local(spec.start, spec.zone)
+        spec.cancelled = (first("STATUS") or ({}, ""))[1].upper() == "CANCELLED"
+
+        dtend = first("DTEND")
+        duration = first("DURATION")
+        spec.duration = None
+        if dtend:
+            end, end_zone, _ = parse_datetime(dtend[1], dtend[0])
+            spec.duration = to_local(end, end_zone) - spec.local_start
+        elif duration:
+            spec.duration = parse_duration(duration[1])
+        if spec.duration is None:
+            spec.duration = timedelta(days=1) if spec.all_day else timedelta(0)
+
+        spec.rule = None
+        spec.until = None
+        rrule = first("RRULE")
+        if rrule:
+            rule = parse_rrule(rrule[1])
+            # Partes no soportadas (BYSETPOS, BYWEEKNO...): mejor solo la primera ocurrencia que fechas falsas
+            if set(rule) <= SUPPORTED_RULE_PARTS:
+                spec.rule = rule
+                if rule.get("UNTIL"):
+                    until, until_zone, until_all_day = parse_datetime(rule["UNTIL"], {})
+                    until = until + timedelta(days=1, seconds=-1) if until_all_day else until
+                    spec.until = to_wall(to_local(until, until_zone), spec.zone)
+
+        spec.exdates: Set[datetime] = set()
+        spec.exdays: Set[date] = set()
+        for params, value in component.get("EXDATE", []):
+            for item in value.split(","):
+                wall, zone, all_day = parse_datetime(item, params)
+                if all_day:
+                    spec.exdays.add(wall.date())
+                else:
+                    spec.exdates.add(to_wall(to_local(wall, zone), spec.zone))
+        spec.rdates: List[datetime] = []
+        for params, value in component.get("RDATE", []):
+            if params.get("VALUE") != "PERIOD":
+                for item in value.split(","):
+                    wall, zone, _ = parse_datetime(item, params)
+                    spec.rdates.append(to_wall(to_local(wall, zone), spec.zone))
+
+        recurrence_id = first("RECURRENCE-ID")
+        spec.recurrence_id = None
+        if recurrence_id:
+            wall, zone, _ = parse_datetime(recurrence_id[1], recurrence_id[0])
+            spec.recurrence_id = to_local(wall, zone)
+        return spec
+
+    def occurrences(self, window_start: datetime, window_end: datetime) -> Iterator[datetime]:
+        """Inicios (hora local) que terminan después de window_start y empiezan antes de window_end"""
+        if self.rule is None and not self.rdates:
+            if self.local_start + self.duration >= window_start and self.local_start <= window_end:
+                yield self.local_start
+            return
+        wall_start = to_wall(window_start - self.duration, self.zone)
+        wall_end = to_wall(window_end, self.zone)
+        if self.rule is None:
+            starts = [self.start]
+        else:
+            starts = rule_occurrences(self.start, self.rule, self.until, wall_start, wall_end)
+        if self.rdates:
+            starts = sorted(set(starts).union(self.rdates))
+        for wall in starts:
+            if wall in self.exdates or wall.date() in self.exdays:
+                continue
+            local = to_local(wall, self.zone)
+            if local + self.duration >= window_start and local <= window_end:
+                yield local
+
+    def to_row(self) -> tuple:
+        """Campos que tiene todo evento, una columna cada uno en el calendario guardado (JSON)"""
+        return (
+            self.uid, self.summary, self.location, self.start.isoformat(), zone_name(self.zone),
+            int(self.all_day), self.duration.total_seconds(), int(self.cancelled)
+        )
+
+    def to_extra(self) -> Optional[list]:
+        """Repetición y excepciones; None en los eventos simples, que son la gran mayoría"""
+        if self.rule is None and not self.exdates and not self.exdays and not self.rdates and self.recurrence_id is None:
+            return None
+        iso = datetime.isoformat
+        return [
+            self.rule, iso(self.until) if self.until else None,
+            [iso(d) for d in sorted(self.exdates)], [d.isoformat() for d in sorted(self.exdays)],
+            [iso(d) for d in self.rdates], iso(self.recurrence_id) if self.recurrence_id else None
+        ]
+
+    @classmethod
+    def from_row(cls, row: tuple, extra: Optional[list] = None) -> "EventSpec":
+        uid, summary, location, start, zone, all_day, duration, cancelled = row
+        spec = cls()
+        spec.uid, spec.summary, spec.location = uid, summary, location
+        spec.start = datetime.fromisoformat(start)
+        spec.zone = get_zone(zone) if zone else None
+        spec.local_start = to_local(spec.start, spec.zone)
+        spec.all_day = bool(all_day)
+        spec.duration = timedelta(seconds=duration)
+        spec.cancelled = bool(cancelled)
+        if extra is None:
+            # Solo se leen: los eventos simples comparten contenedores vacíos inmutables
+            spec.rule = spec.until = spec.recurrence_id = None
+            spec.exdates = spec.exdays = frozenset()
+            spec.rdates = ()
+            return spec
+        rule, until, exdates, exdays, rdates, recurrence_id = extra
+        spec.rule = rule
+        spec.until = datetime.fromisoformat(until) if until else None
+        spec.exdates = set(map(datetime.fromisoformat, exdates))
+        spec.exdays = set(map(date.fromisoformat, exdays))
+        spec.rdates = list(map(datetime.fromisoformat, rdates))
+        spec.recurrence_id = datetime.fromisoformat(recurrence_id) if recurrence_id else None
+        return spec
+
+    def to_event(self, start: datetime, calendar_name: Optional[str] = None) -> Dict:
+        event = {
+            "summary": self.summary,
+            "start": start.isoformat(timespec="seconds"),
+            "end": (start + self.duration).isoformat(timespec="seconds")
+        }
+        if self.all_day:
+            event["all_day"] = True
+        if self.location:
+            event["location"] = self.location
+        if calendar_name:
+            event["calendar"] = calendar_name
+        return event
+
+class ICSCalendar:
+    """Eventos de un fichero ICS; se puede volver a expandir al avanzar la ventana sin releer el fichero"""
+
+    def __init__(self, specs: List[EventSpec]):
+        self.specs = [spec for spec in specs if spec.recurrence_id is None]
+        # Ocurrencias modificadas o canceladas (RECURRENCE-ID) de eventos periódicos
+        self.overrides: Dict[Tuple[str, datetime], EventSpec] = {
+            (spec.uid, spec.recurrence_id): spec for spec in specs if spec.recurrence_id is not None
+        }
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "ICSCalendar":
+        specs = []
+        for component in iter_components(lines):
+            try:
+                spec = EventSpec.from_component(component)
+            except (ValueError, IndexError) as e:
+                print(f"Error en evento ICS: {e}")
+                continue
+            if spec is not None:
+                specs.append(spec)
+        return cls(specs)
+
+    @classmethod
+    def from_file(cls, path) -> "ICSCalendar":
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return cls.from_lines(f)
+
+    def __len__(self) -> int:
+        return len(self.specs) + len(self.overrides)
+
+    def to_columns(self) -> Dict[str, Any]:
+        """Calendario ya parseado por columnas: unas pocas listas largas en lugar de una por evento"""
+        specs = self.specs + list(self.overrides.values())
+        rows = [spec.to_row() for spec in specs]
+        columns = {name: list(column) for name, column in zip(EVENT_COLUMNS, zip(*rows))} if rows else {name: [] for name in EVENT_COLUMNS}
+        # Claves de texto: así quedan tras el viaje por JSON
+        columns["extra"] = {str(k): extra for k, spec in enumerate(specs) if (extra := spec.to_extra()) is not None}
+        return columns
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any]) -> "ICSCalendar":
+        extras = columns["extra"]
+        rows = zip(*(columns[name] for name in EVENT_COLUMNS))
+        return cls([EventSpec.from_row(row, extras.get(str(k))) for k, row in enumerate(rows)])
+
+    def expand(self, window_start: datetime, window_end: datetime, calendar_name: Optional[str] = None) -> List[Dict]:
+        """Eventos (con repeticiones desplegadas) que se solapan con la ventana"""
+        events = []
+        for spec in self.specs:
+            if spec.cancelled:
+                continue
+            for start in spec.occurrences(window_start, window_end):
+                if spec.rule is not None and (spec.uid, start) in self.overrides:
+                    continue
+                events.append(spec.to_event(start, calendar_name))
+        for spec in self.overrides.values():
+            if not spec.cancelled:
+                events.extend(spec.to_event(start, calendar_name) for start in spec.occurrences(window_start, window_end))
+        return events
+
+class EventIndex:
+    """Eventos ordenados por inicio; las consultas de próximos eventos son una búsqueda binaria"""
+
+    def __init__(self, events: List[Dict]):
+        self.events = sorted(events, key=lambda event: event["start"])
+        self.starts = [event["start"] for event in self.events]
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def upcoming(self, now: datetime, limit: int = 10) -> List[Dict]:
+        """Los limit primeros eventos que empiezan después de now (ISO local, comparable como texto)"""
+        first = bisect.bisect_right(self.starts, now.isoformat(timespec="seconds"))
+        return self.events[first:first + limit]
@@ -0,0 +1,54 @@
+"""
+Formato binario columnar para capas densas
+Codifica columnas Float32/Int32 directamente desde los almacenes de los servicios
+"""
+import struct
+from typing import Dict, Tuple
+import numpy as np
+
+LAYER_MEDIA_TYPE = "application/vnd.reloj.layer"
+FORMAT_VERSION = 1
+
+# Cabecera (little-endian, 24 bytes): magic, versión, nº columnas, reservado,
+# nº elementos, cursor de la capa y timestamp base (epoch ms) de las columnas "t"
+HEADER = struct.Struct("<4sBBHIId")
+# Directorio, 12 bytes por columna: nombre (8 bytes ASCII) y tipo
+COLUMN = struct.Struct("<8sc3x")
+
+# Tipos de columna: f=float32, i=int32, u=uint32, t=timestamp (int32 ms desde la base),
+# s=cadenas (uint32 longitud en bytes + UTF-8 separado por "\n", con relleno a 4 bytes)
+DTYPES = {b"f": "<f4", b"i": "<i4", b"u": "<u4", b"t": "<i4"}
+
+def wants_binary(accept: str) -> bool:
+    """¿Pide el cliente el formato binario en la cabecera Accept?"""
+    return LAYER_MEDIA_TYPE in (accept or "")
+
+def encode_layer(columns: Dict[str, Tuple[str, object]], cursor: int = 0) -> bytes:
+    """Codificar {nombre: (tipo, valores)}; todas las columnas deben tener la misma longitud"""
+    count = 0
+    for kind, values in columns.values():
+        count = len(values)
+        break
+
+    base_ts = 0.0
+    for kind, values in columns.values():
+        if kind == "t" and count:
+            base_ts = float(np.min(values))
+
+    parts = [HEADER.pack(b"RLYR", FORMAT_VERSION, len(columns), 0, count, cursor & 0xFFFFFFFF, base_ts)]
+    for name, (kind, _) in columns.items():
+        parts.append(COLUMN.pack(name.encode("ascii"), kind.encode("ascii")))
+
+    for name, (kind, values) in columns.items():
+        if len(values) != count:
+            raise ValueError(f"La columna {name} tiene {len(values)} valores, se esperaban {count}")
+        if kind == "s":
+            blob = "\n".join(str(v).replace("\n", " ") for v in values).encode("utf-8")
+            parts.append(struct.pack("<I", len(blob)))
+            parts.append(blob + b"\0" * (-len(blob) % 4))
+        elif kind == "t":
+            offsets = np.asarray(values, dtype=np.float64) - base_ts
+            parts.append(np.rint(offsets).astype("<i4").tobytes())
+        else:
+            parts.append(np.asarray(values).astype(DTYPES[kind.encode("ascii")]).tobytes())
+    return b"".join(parts)
@@ -0,0 +1,79 @@
+"""
+Versionado de capas en tiempo real
+Registro de cambios acotado para ETag y consultas incrementales (?since=cursor)
+"""
+import zlib
+from collections import deque
+from itertools import islice
+from typing import Dict, Hashable, Optional
+
+class LayerChangeLog:
+    """Registro de cambios por elemento con versión creciente.
+
+    Cada cambio ("add", "move" o "expire") incrementa la versión de la
+    capa. since(cursor) resume los cambios posteriores a un cursor en
+    added / moved / expired; si el cursor es más antiguo que el registro
+    conservado devuelve None y el cliente debe pedir la capa completa.
+    """
+
+    def __init__(self, max_changes: int = 50000):
+        self.version = 0
+        self.changes = deque(maxlen=max_changes)  # (versión, op, clave)
+
+    def record(self, op: str, key: Hashable):
+        self.version += 1
+        self.changes.append((self.version, op, key))
+
+    def reset(self):
+        """Invalidar todos los cursores (p. ej. al cambiar la configuración)"""
+        self.version += 1
+        self.changes.clear()
+
+    @property
+    def floor(self) -> int:
+        """Cursor más antiguo que aún se puede resolver"""
+        return self.changes[0][0] - 1 if self.changes else self.version
+
+    def since(self, cursor: int) -> Optional[Dict[str, list]]:
+        """Cambios netos desde cursor: {"added": [...], "moved": [...], "expired": [...]}"""
+        if cursor > self.version or cursor < self.floor:
+            return None
+
+        first_op: Dict[Hashable, str] = {}
+        last_op: Dict[Hashable, str] = {}
+        start = cursor - self.floor
+        for _, op, key in islice(self.changes, start, None):
+            first_op.setdefault(key, op)
+            last_op[key] = op
+
+        result = {"added": [], "moved": [], "expired": []}
+        for key, op in last_op.items():
+            existed = first_op[key] != "add"
+            if op == "expire":
+                if existed:
+                    result["expired"].append(key)
+            elif existed:
+                result["moved"].append(key)
+            else:
+                result["added"].append(key)
+        return result
+
+    def get_stats(self) -> Dict:
+        return {"version": self.version, "changes": len(self.changes), "floor": self.floor}
+
+def parse_cursor(value: Optional[str]) -> Optional[int]:
+    """Convertir el parámetro ?since= en entero (None si no es válido)"""
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+def make_etag(layer: str, version, *parts) -> str:
+    """ETag débil: versión de la capa + huella de los parámetros que filtran la respuesta"""
+    fingerprint = zlib.crc32(repr(parts).encode()) & 0xFFFFFFFF
+    return f'W/"{layer}-{version}-{fingerprint:08x}"'
+
+def variant_etag(etag: str, *parts) -> str:
+    """ETag de otra representación de la misma versión (formato, zoom, bbox...)"""
+    fingerprint = zlib.crc32(repr(parts).encode()) & 0xFFFFFFFF
+    return f'{etag[:-1]}-{fingerprint:08x}"'
@@ -0,0 +1,145 @@
+"""
+Métricas de la aplicación
+Histogramas de latencia por ruta y por proveedor, y exportación en formato de texto de Prometheus
+"""
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+PREFIX = "reloj"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NAME_INVALID = re.compile(r"[^a-zA-Z0-9_]")
+_IDENTIFIER = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Histograma acumulativo con etiquetas (una serie por combinación de valores)"""
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], list] = {}  # etiquetas -> [cuentas por bucket, suma, total]
+
+    def observe(self, value: float, *label_values: str):
+        entry = self.series.get(label_values)
+        if entry is None:
+            entry = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        counts = entry[0]
+        for k, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[k] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def quantile(self, label_values: Tuple[str, ...], q: float) -> Optional[float]:
+        """Cuantil estimado por interpolación lineal dentro del bucket"""
+        entry = self.series.get(label_values)
+        if not entry or not entry[2]:
+            return None
+        counts, _, total = entry
+        target = q * total
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if seen + count >= target and count:
+                return lower + (bound - lower) * (target - seen) / count
+            seen += count
+            lower = bound
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, Dict]:
+        """Resumen por serie para /api/health: número de muestras, media y p50/p95 en ms"""
+        result = {}
+        for label_values, (_, total_sum, total) in sorted(self.series.items()):
+            key = " ".join(label_values)
+            result[key] = {
+                "count": total,
+                "avg_ms": round(total_sum / total * 1000, 2) if total else None,
+                "p50_ms": round(self.quantile(label_values, 0.5) * 1000, 2),
+                "p95_ms": round(self.quantile(label_values, 0.95) * 1000, 2)
+            }
+        return result
+
+    def render(self) -> List[str]:
+        name = f"{PREFIX}_{self.name}"
+        lines = [f"# HELP {name} {self.description}", f"# TYPE {name} histogram"]
+        for label_values, (counts, total_sum, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_labels(self.labels, label_values, le)} {total}")
+            lines.append(f"{name}_sum{_labels(self.labels, label_values)} {_number(total_sum)}")
+            lines.append(f"{name}_count{_labels(self.labels, label_values)} {total}")
+        return lines
+
+class MetricsRegistry:
+    """Histogramas propios y métricas derivadas de los get_stats() registrados en el health check.
+
+    Las estadísticas de cada componente (cachés, ingesta AIS/MQTT, colas,
+    planificador, bucle de eventos...) se exportan como gauges aplanando sus
+    valores numéricos: {"storm": {"queue_depth": 3}} -> reloj_storm_queue_depth 3.
+    Las claves que no son identificadores (hosts, URLs) pasan a la etiqueta "key".
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str, description: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(name, description, labels, buckets)
+        return histogram
+
+    def render(self, stats: Dict[str, Dict] = None) -> str:
+        """Texto de exposición de Prometheus: histogramas y gauges a partir de stats"""
+        lines: List[str] = []
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+
+        gauges: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], float]]] = {}
+        for name, component in (stats or {}).items():
+            self._flatten(component, [name], (), gauges)
+        for name, samples in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_text = "{" + ",".join(f'{key}="{_escape(val)}"' for key, val in labels) + "}" if labels else ""
+                lines.append(f"{name}{label_text} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _flatten(self, value, path: List[str], labels: Tuple[Tuple[str, str], ...], gauges: Dict):
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            if isinstance(value, float) and math.isnan(value):
+                return
+            name = _NAME_INVALID.sub("_", "_".join([PREFIX] + path))
+            gauges.setdefault(name, []).append((labels, value))
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                key = str(key)
+                if _IDENTIFIER.match(key):
+                    self._flatten(item, path + [key], labels, gauges)
+                else:
+                    label = "key" if not labels else f"key{len(labels) + 1}"
+                    self._flatten(item, path, labels + ((label, key),), gauges)
@@ -2,50 +2,143 @@
 Servicio de noticias
 Parseo de feeds RSS
 """
+import asyncio
+import calendar
+import hashlib
+import time
 import feedparser
-import aiohttp
-from typing import List, Dict
-from models.config import NewsConfig
+from typing import List, Dict, Optional, Tuple
+from models.config import NewsConfig, NewsSource
+from services.http_client import HttpClient
+from services.response_cache import ResponseCache
+from services.executor import BlockingExecutor
 
-class NewsService:
+def parse_feed(content: bytes, limit: int) -> List[Dict]:
+    """Parsear un feed y extraer sus entradas (se ejecuta fuera del bucle de eventos)"""
+    feed = feedparser.parse(content)
+    news = []
+    for entry in feed.entries[:limit]:
+        published = entry.get("published_parsed") or entry.get("updated_parsed")
+        news.append({
+            "title": entry.get("title", ""),
+            "link": entry.get("link", ""),
+            "published": entry.get("published") or entry.get("updated", ""),
+            # *_parsed viene en UTC
+            "published_ts": calendar.timegm(published) if published else None
+        })
+    return news
+
+class FeedState:
+    """Validadores HTTP y últimas entradas parseadas de una fuente"""
     def __init__(self):
-        self.cache = {}
-        self.cache_ttl = 600  # 10 minutos
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.digest: Optional[str] = None
+        self.limit = 0
+        self.entries: List[Dict] = []
+        self.fetched_at: Optional[float] = None
+        self.not_modified = 0
+        self.unchanged = 0
+        self.parsed = 0
+        self.parse_ms = 0.0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+class NewsService:
+    def __init__(self, http_client: HttpClient = None, executor: BlockingExecutor = None):
+        self.http = http_client or HttpClient()
+        self.executor = executor or BlockingExecutor()
+        self.cache = ResponseCache("news")
+        self.feeds: Dict[str, FeedState] = {}
+    
+    async def get_news(self, config: NewsConfig, refresh: bool = False) -> List[Dict]:
+        """Obtener noticias (cacheadas por lista de fuentes)"""
+        key = tuple((source.name, source.url) for source in config.sources)
+        return await self.cache.get_or_fetch(key, config.cache_ttl, lambda: self._fetch_news(config), refresh=refresh)
     
-    async def get_news(self, config: NewsConfig) -> List[Dict]:
-        """Obtener noticias de los feeds RSS"""
-        all_news = []
+    async def _fetch_news(self, config: NewsConfig) -> List[Dict]:
+        """Obtener noticias de los feeds RSS (todas las fuentes en paralelo)"""
+        urls = {source.url for source in config.sources}
+        for url in list(self.feeds):
+            if url not in urls:
+                del self.feeds[url]
         
-        for source in config.sources:
-            try:
-                news = await self._fetch_feed(source.url)
-                for item in news:
-                    all_news.append({
-                        "title": item.get("title", ""),
-                        "source": source.name
-                    })
-            except Exception as e:
-                print(f"Error obteniendo noticias de {source.name}: {e}")
+        results = await asyncio.gather(*(self._fetch_source(source, config) for source in config.sources))
+        all_news = [item for news in results for item in news]
         
-        # Ordenar por fecha (si está disponible) y limitar
-        return all_news[:20]  # Máximo 20 noticias
+        # Ordenar por fecha (las entradas sin fecha al final) y limitar
+        all_news.sort(key=lambda item: item["published_ts"] or 0, reverse=True)
+        return all_news[:config.max_items]
     
-    async def _fetch_feed(self, url: str) -> List[Dict]:
-        """Obtener feed RSS"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    feed = feedparser.parse(content)
-                    
-                    news = []
-                    for entry in feed.entries[:5]:  # Máximo 5 por feed
-                        news.append({
-                            "title": entry.get("title", ""),
-                            "link": entry.get("link", ""),
-                            "published": entry.get("published", "")
-                        })
-                    return news
-                else:
-                    raise Exception(f"Error obteniendo feed: {response.status}")
-
+    async def _fetch_source(self, source: NewsSource, config: NewsConfig) -> List[Dict]:
+        """Entradas de una fuente; si falla se reutilizan las últimas obtenidas"""
+        state = self.feeds.setdefault(source.url, FeedState())
+        try:
+            # El límite de tiempo cubre solo la descarga: un parseo en el executor no se cancela
+            downloaded = await asyncio.wait_for(
+                self._download_feed(source.url, state, config.max_per_source),
+                timeout=config.source_timeout
+            )
+            if downloaded is not None:
+                await self._update_feed(state, config.max_per_source, *downloaded)
+            state.fetched_at = time.time()
+            news = state.entries
+            state.last_error = None
+        except Exception as e:
+            state.errors += 1
+            state.last_error = str(e) or type(e).__name__
+            print(f"Error obteniendo noticias de {source.name}: {state.last_error}")
+            news = state.entries
+        return [{**item, "source": source.name} for item in news]
+    
+    async def _download_feed(self, url: str, state: FeedState, limit: int) -> Optional[Tuple[bytes, Optional[str], Optional[str]]]:
+        """Descargar un feed RSS con petición condicional (ETag / Last-Modified); None si no ha cambiado (304)"""
+        headers = {}
+        if state.limit == limit:
+            if state.etag:
+                headers["If-None-Match"] = state.etag
+            if state.last_modified:
+                headers["If-Modified-Since"] = state.last_modified
+        
+        session = self.http.get_session()
+        async with session.get(url, headers=headers, trace_request_ctx={"service": "rss"}) as response:
+            if response.status == 304:
+                state.not_modified += 1
+                return None
+            if response.status != 200:
+                raise Exception(f"Error obteniendo feed: {response.status}")
+            content = await response.read()
+            return content, response.headers.get("ETag"), response.headers.get("Last-Modified")
+    
+    async def _update_feed(self, state: FeedState, limit: int, content: bytes, etag: Optional[str], last_modified: Optional[str]):
+        """Parsear el feed descargado salvo que el contenido sea idéntico, y guardar sus validadores"""
+        # Servidores sin validadores: si el contenido no ha cambiado no se vuelve a parsear
+        digest = hashlib.sha1(content).hexdigest()
+        if digest == state.digest and state.limit == limit:
+            state.unchanged += 1
+        else:
+            started = time.perf_counter()
+            state.entries = await self.executor.run(parse_feed, content, limit)
+            state.parse_ms = round((time.perf_counter() - started) * 1000, 2)
+            state.parsed += 1
+            state.digest = digest
+            state.limit = limit
+        state.etag = etag
+        state.last_modified = last_modified
+    
+    def get_stats(self) -> Dict:
+        """Estado de cada fuente: respuestas 304, feeds sin cambios, parseos y errores"""
+        now = time.time()
+        return {
+            url: {
+                "entries": len(state.entries),
+                "age_s": round(now - state.fetched_at, 1) if state.fetched_at else None,
+                "not_modified": state.not_modified,
+                "unchanged": state.unchanged,
+                "parsed": state.parsed,
+                "parse_ms": state.parse_ms,
+                "errors": state.errors,
+                "last_error": state.last_error
+            }
+            for url, state in self.feeds.items()
+        }
@@ -0,0 +1,112 @@
+"""
+Presupuesto de créditos de OpenSky
+Coste por consulta según el área, reparto del bbox en teselas e intervalo de sondeo adaptativo
+"""
+import math
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Créditos diarios de /api/states/all (documentación de la API REST de OpenSky)
+ANONYMOUS_DAILY_CREDITS = 400
+AUTHENTICATED_DAILY_CREDITS = 4000
+
+def bbox_area(bbox: List[float]) -> float:
+    """Área del bbox en grados cuadrados"""
+    return max(bbox[2] - bbox[0], 0.0) * max(bbox[3] - bbox[1], 0.0)
+
+def credit_cost(bbox: List[float]) -> int:
+    """Créditos que cuesta una consulta /states/all de este bbox"""
+    area = bbox_area(bbox)
+    if area <= 25:
+        return 1
+    if area <= 100:
+        return 2
+    if area <= 400:
+        return 3
+    return 4
+
+def split_bbox(bbox: List[float], max_area: float) -> List[List[float]]:
+    """Dividir el bbox en una rejilla de teselas de como mucho max_area grados cuadrados.
+
+    Cada tesela es una consulta independiente (se piden en paralelo y las
+    respuestas son más pequeñas), pero cuesta al menos un crédito: repartir
+    un área grande gasta más créditos por ciclo que pedirla entera, y el
+    intervalo adaptativo lo tiene en cuenta.
+    """
+    area = bbox_area(bbox)
+    if max_area <= 0 or area <= max_area:
+        return [list(bbox)]
+    width, height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    shards = math.ceil(area / max_area)
+    nx = max(1, min(shards, math.ceil(math.sqrt(shards * width / height))))
+    ny = math.ceil(shards / nx)
+    while (width / nx) * (height / ny) > max_area:
+        ny += 1
+    return [
+        [bbox[0] + width * i / nx, bbox[1] + height * j / ny,
+         bbox[0] + width * (i + 1) / nx, bbox[1] + height * (j + 1) / ny]
+        for j in range(ny) for i in range(nx)
+    ]
+
+def seconds_until_reset(now: float) -> float:
+    """Segundos hasta la renovación diaria de créditos (medianoche UTC)"""
+    today = datetime.fromtimestamp(now, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(today.timestamp() + 86400 - now, 1.0)
+
+class CreditBudget:
+    """Créditos restantes según X-Rate-Limit-Remaining y cadencia que los hace durar hasta la renovación"""
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.updated_at: Optional[float] = None
+        self.spent_today = 0
+        self.polls = 0
+        self.interval = 0.0
+
+    def record(self, remaining: Optional[str], cost: int, now: float = None):
+        """Anotar una consulta y el valor de X-Rate-Limit-Remaining de su respuesta"""
+        now = now or time.time()
+        if self.updated_at is not None and seconds_until_reset(self.updated_at) < now - self.updated_at:
+            self.spent_today = 0  # ha pasado la medianoche UTC
+        self.spent_today += cost
+        if remaining is not None:
+            try:
+                self.remaining = int(remaining)
+            except ValueError:
+                pass
+        self.updated_at = now
+
+    def exhausted(self, now: float = None):
+        """El proveedor ha respondido 429: no quedan créditos hasta la renovación"""
+        self.remaining = 0
+        self.updated_at = now or time.time()
+
+    def current_remaining(self, now: float) -> Optional[int]:
+        """Créditos restantes conocidos (None si el dato es de antes de la última renovación)"""
+        if self.updated_at is None or seconds_until_reset(self.updated_at) < now - self.updated_at:
+            return None
+        return self.remaining
+
+    def poll_interval(self, cost: int, daily_credits: int, min_seconds: float, now: float = None) -> float:
+        """Intervalo entre ciclos para no agotar los créditos antes de la renovación"""
+        now = now or time.time()
+        remaining = self.current_remaining(now)
+        if remaining is None:
+            # Sin cabeceras todavía: repartir el cupo diario de forma uniforme
+            interval = 86400 * cost / max(daily_credits, 1)
+        else:
+            interval = seconds_until_reset(now) * cost / max(remaining, 1)
+        self.interval = max(float(min_seconds), interval)
+        return self.interval
+
+    def get_stats(self, now: float = None) -> Dict:
+        now = now or time.time()
+        return {
+            "remaining_credits": self.current_remaining(now),
+            "spent_today": self.spent_today,
+            "polls": self.polls,
+            "interval_s": round(self.interval, 1),
+            "refreshes_per_hour": round(3600 / self.interval, 1) if self.interval else None,
+            "reset_in_s": round(seconds_until_reset(now))
+        }
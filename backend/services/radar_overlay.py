@@ -0,0 +1,148 @@
+"""
+Superposiciones de radar para el mapa
+Cada fotograma se decodifica una vez, se reproyecta a Web Mercator con fondo transparente y se guarda ya codificado por nivel de zoom
+"""
+import io
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Pillow es opcional: sin él se sirven las imágenes originales de AEMET
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+RADAR_BOUNDS = (-9.5, 35.0, 4.5, 44.0)  # oeste, sur, este, norte de la composición nacional
+OVERLAY_LEVELS = (1, 2, 4)  # factores de reducción precalculados
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+def available() -> bool:
+    return Image is not None
+
+def corner_coordinates(bounds: Tuple[float, float, float, float] = RADAR_BOUNDS) -> List[List[float]]:
+    """Esquinas en el orden de las fuentes de imagen de MapLibre: NO, NE, SE, SO"""
+    west, south, east, north = bounds
+    return [[west, north], [east, north], [east, south], [west, south]]
+
+def mercator_rows(height_in: int, height_out: int, bounds: Tuple[float, float, float, float]) -> np.ndarray:
+    """Fila de la imagen original (lineal en latitud) para cada fila de salida (lineal en Web Mercator)"""
+    _, south, _, north = bounds
+    y_north = math.log(math.tan(math.pi / 4 + math.radians(north) / 2))
+    y_south = math.log(math.tan(math.pi / 4 + math.radians(south) / 2))
+    y = y_north - (np.arange(height_out) + 0.5) / height_out * (y_north - y_south)
+    lats = np.degrees(2 * np.arctan(np.exp(y)) - math.pi / 2)
+    rows = (north - lats) / (north - south) * height_in
+    return np.clip(rows.astype(np.intp), 0, height_in - 1)
+
+def to_rgba(image: "Image.Image") -> np.ndarray:
+    """Píxeles RGBA con el fondo (color de transparencia o color más frecuente) transparente"""
+    if image.mode == "P":
+        indices = np.asarray(image)
+        palette = np.zeros((256, 4), dtype=np.uint8)
+        colors = np.array(image.getpalette() or [], dtype=np.uint8).reshape(-1, 3)[:256]
+        palette[:len(colors), :3] = colors
+        palette[:, 3] = 255
+        transparency = image.info.get("transparency")
+        if isinstance(transparency, int):
+            palette[transparency, 3] = 0
+        palette[np.bincount(indices.ravel(), minlength=256).argmax(), 3] = 0
+        return palette[indices]
+
+    rgba = np.array(image.convert("RGBA"))
+    packed = rgba[..., 0].astype(np.uint32) << 16 | rgba[..., 1].astype(np.uint32) << 8 | rgba[..., 2]
+    values, counts = np.unique(packed, return_counts=True)
+    rgba[packed == values[counts.argmax()], 3] = 0
+    return rgba
+
+def render_levels(
+    content: bytes,
+    bounds: Tuple[float, float, float, float] = RADAR_BOUNDS,
+    levels: Tuple[int, ...] = OVERLAY_LEVELS,
+    formats: Tuple[str, ...] = ("png",)
+) -> Tuple[int, Dict[Tuple[int, str], bytes]]:
+    """Ancho original y bytes codificados por (nivel, formato).
+
+    El muestreo es por vecino más próximo: la imagen es de paleta y no
+    se deben mezclar colores de la escala de reflectividad.
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        image.seek(0)
+        rgba = to_rgba(image)
+    height, width = rgba.shape[:2]
+
+    encoded = {}
+    for level in levels:
+        out_width, out_height = max(width // level, 1), max(height // level, 1)
+        rows = mercator_rows(height, out_height, bounds)
+        cols = np.minimum(((np.arange(out_width) + 0.5) * width / out_width).astype(np.intp), width - 1)
+        overlay = Image.fromarray(rgba[rows[:, None], cols[None, :]], "RGBA")
+        for fmt in formats:
+            buffer = io.BytesIO()
+            if fmt == "webp":
+                overlay.save(buffer, "WEBP", lossless=True)
+            else:
+                overlay.save(buffer, "PNG")
+            encoded[(level, fmt)] = buffer.getvalue()
+    return width, encoded
+
+class RadarOverlays:
+    """Superposiciones codificadas de los últimos max_frames fotogramas (se renderizan en el pool de hilos)"""
+
+    def __init__(self, max_frames: int = 6, bounds: Tuple[float, float, float, float] = RADAR_BOUNDS):
+        self.max_frames = max_frames
+        self.bounds = bounds
+        self.formats = ("png", "webp") if available() and features.check("webp") else ("png",)
+        self.frames: "OrderedDict[int, Tuple[int, Dict[Tuple[int, str], bytes]]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"renders": 0, "render_ms": 0.0, "hits": 0, "misses": 0, "errors": 0}
+
+    def __contains__(self, ts: int) -> bool:
+        return ts in self.frames
+
+    def render(self, ts: int, content: bytes):
+        """Decodificar y reproyectar un fotograma, guardando todos los niveles y formatos"""
+        started = time.perf_counter()
+        try:
+            result = render_levels(content, self.bounds, OVERLAY_LEVELS, self.formats)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.stats["renders"] += 1
+        self.stats["render_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        with self.lock:
+            self.frames[ts] = result
+            self.frames.move_to_end(ts)
+            while len(self.frames) > max(self.max_frames, 1):
+                self.frames.popitem(last=False)
+
+    def get(self, ts: int, zoom: Optional[float] = None, webp: bool = False) -> Optional[Tuple[bytes, str]]:
+        """Bytes y tipo MIME del nivel adecuado para el zoom (resolución completa sin zoom)"""
+        with self.lock:
+            entry = self.frames.get(ts)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.frames.move_to_end(ts)
+        width, encoded = entry
+        fmt = "webp" if webp and "webp" in self.formats else "png"
+        self.stats["hits"] += 1
+        return encoded[(self.level_for_zoom(width, zoom), fmt)], MEDIA_TYPES[fmt]
+
+    def level_for_zoom(self, width: int, zoom: Optional[float]) -> int:
+        """Mayor reducción que sigue cubriendo los píxeles en pantalla de la imagen a ese zoom"""
+        if zoom is None:
+            return OVERLAY_LEVELS[0]
+        west, _, east, _ = self.bounds
+        screen_width = 256 * 2 ** zoom * (east - west) / 360
+        return max((level for level in OVERLAY_LEVELS if width / level >= screen_width), default=OVERLAY_LEVELS[0])
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["frames"] = len(self.frames)
+        stats["bytes"] = sum(len(data) for _, encoded in list(self.frames.values()) for data in encoded.values())
+        stats["enabled"] = available()
+        return stats
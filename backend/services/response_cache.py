@@ -0,0 +1,113 @@
+"""
+Caché de respuestas asíncrona
+TTL, agrupación de peticiones concurrentes y stale-while-revalidate
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class ResponseCache:
+    def __init__(self, name: str, max_entries: int = 32):
+        self.name = name
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # clave -> (valor, guardado_en)
+        self.pending: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "errors": 0
+        }
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        ttl: float,
+        fetcher: Callable[[], Awaitable[Any]],
+        max_stale: Optional[float] = None,
+        refresh: bool = False
+    ) -> Any:
+        """Obtener valor cacheado o pedirlo al proveedor.
+
+        Dentro del TTL se devuelve la copia en caché. Entre el TTL y
+        TTL + max_stale se devuelve la copia caducada y se refresca en
+        segundo plano. Fuera de esa ventana se espera al proveedor; las
+        peticiones concurrentes para la misma clave comparten una sola
+        llamada. Con refresh=True se ignora la copia en caché.
+        """
+        if max_stale is None:
+            max_stale = ttl
+
+        entry = self.entries.get(key)
+        if entry is not None and not refresh:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < ttl:
+                self.stats["hits"] += 1
+                self.entries.move_to_end(key)
+                return value
+            if age < ttl + max_stale:
+                self.stats["stale_hits"] += 1
+                self._start_fetch(key, fetcher)
+                return value
+
+        self.stats["misses"] += 1
+        try:
+            return await asyncio.shield(self._start_fetch(key, fetcher))
+        except Exception:
+            # Si el proveedor falla, mejor un dato antiguo que ninguno
+            if entry is not None and not refresh:
+                return entry[0]
+            raise
+
+    def invalidate(self, key: Hashable = None):
+        """Invalidar una clave o toda la caché"""
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        """Contadores de aciertos, fallos y datos caducados servidos"""
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 3) if lookups else 0.0
+        stats["entries"] = len(self.entries)
+        stats["pending"] = len(self.pending)
+        now = time.monotonic()
+        stats["oldest_age_s"] = round(max((now - stored_at for _, stored_at in self.entries.values()), default=0.0), 1)
+        return stats
+
+    def _start_fetch(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Lanzar (o reutilizar) la petición en curso para una clave"""
+        task = self.pending.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return task
+
+        task = asyncio.create_task(self._fetch(key, fetcher))
+        # Los refrescos en segundo plano pueden fallar sin nadie esperando
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self.pending[key] = task
+        return task
+
+    async def _fetch(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]]) -> Any:
+        """Pedir el valor al proveedor y guardarlo"""
+        try:
+            value = await fetcher()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Error refrescando caché {self.name}: {e}")
+            raise
+        finally:
+            self.pending.pop(key, None)
+
+        self.stats["refreshes"] += 1
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
@@ -0,0 +1,159 @@
+"""
+Planificador de refresco en segundo plano
+Actualiza cada fuente de datos con su propia cadencia y guarda la última instantánea
+"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from services.http_client import RateLimitedError
+
+class DataSource:
+    def __init__(
+        self,
+        name: str,
+        fetch: Callable[[], Awaitable[Any]],
+        interval: Callable[[], float],
+        default: Any = None
+    ):
+        self.name = name
+        self.fetch = fetch
+        self.interval = interval
+        self.default = default
+        self.snapshot: Any = None
+        self.updated_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.failures = 0
+        self.refreshes = 0
+        self.rate_limited = 0
+        self.next_run: Optional[float] = None
+        self.inflight: Optional[asyncio.Task] = None
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+class RefreshScheduler:
+    def __init__(self, jitter: float = 0.1, max_backoff: float = 1800):
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.sources: Dict[str, DataSource] = {}
+        self.running = False
+
+    def configure(self, jitter: float, max_backoff: float):
+        """Actualizar jitter y backoff máximo desde la configuración"""
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+
+    def register(
+        self,
+        name: str,
+        fetch: Callable[[], Awaitable[Any]],
+        interval: Callable[[], float],
+        default: Any = None
+    ):
+        """Registrar una fuente; interval se evalúa en cada ciclo para seguir la configuración"""
+        self.sources[name] = DataSource(name, fetch, interval, default)
+
+    async def start(self):
+        """Arrancar un bucle de refresco por fuente"""
+        self.running = True
+        for source in self.sources.values():
+            if source.task is None or source.task.done():
+                source.task = asyncio.create_task(self._run(source))
+
+    async def stop(self):
+        """Detener todos los bucles de refresco"""
+        self.running = False
+        tasks = [source.task for source in self.sources.values() if source.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for source in self.sources.values():
+            source.task = None
+
+    def get(self, name: str) -> Any:
+        """Última instantánea de una fuente (None si aún no hay datos)"""
+        return self.sources[name].snapshot
+
+    async def get_or_refresh(self, name: str) -> Any:
+        """Instantánea actual o, si todavía no existe, esperar al primer refresco"""
+        source = self.sources[name]
+        if source.updated_at is not None:
+            return source.snapshot
+        try:
+            return await self.refresh(name)
+        except Exception:
+            if source.default is not None:
+                return source.default
+            raise
+
+    async def refresh(self, name: str) -> Any:
+        """Refrescar una fuente ahora, reutilizando el refresco en curso si lo hay"""
+        source = self.sources[name]
+        if source.inflight is None:
+            source.inflight = asyncio.create_task(self._refresh(source))
+            source.inflight.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(source.inflight)
+
+    def trigger(self, name: str = None):
+        """Adelantar el próximo refresco de una fuente (o de todas)"""
+        names = [name] if name else list(self.sources)
+        for source_name in names:
+            source = self.sources.get(source_name)
+            if source:
+                source.wakeup.set()
+
+    def get_stats(self) -> Dict:
+        """Estado de cada fuente: edad de la instantánea, fallos y próximo refresco"""
+        now = time.time()
+        stats = {}
+        for name, source in self.sources.items():
+            stats[name] = {
+                "age_s": round(now - source.updated_at, 1) if source.updated_at else None,
+                "interval_s": source.interval(),
+                "next_in_s": round(max(source.next_run - now, 0.0), 1) if source.next_run else None,
+                "refreshes": source.refreshes,
+                "failures": source.failures,
+                "rate_limited": source.rate_limited,
+                "last_error": source.last_error
+            }
+        return stats
+
+    async def _refresh(self, source: DataSource) -> Any:
+        """Pedir datos a la fuente y guardar la instantánea"""
+        try:
+            snapshot = await source.fetch()
+        finally:
+            source.inflight = None
+        source.snapshot = snapshot
+        source.updated_at = time.time()
+        source.refreshes += 1
+        source.failures = 0
+        source.last_error = None
+        return snapshot
+
+    async def _run(self, source: DataSource):
+        """Bucle de refresco con jitter, backoff exponencial y respeto a límites"""
+        while self.running:
+            interval = max(float(source.interval()), 1.0)
+            source.wakeup.clear()
+            try:
+                await self.refresh(source.name)
+                delay = interval
+            except asyncio.CancelledError:
+                raise
+            except RateLimitedError as e:
+                source.rate_limited += 1
+                source.last_error = str(e)
+                delay = max(e.retry_after, interval)
+            except Exception as e:
+                source.failures += 1
+                source.last_error = str(e)
+                delay = min(interval * (2 ** source.failures), max(self.max_backoff, interval))
+                print(f"Error refrescando {source.name}: {e}")
+
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+            source.next_run = time.time() + delay
+            try:
+                await asyncio.wait_for(source.wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
@@ -4,108 +4,472 @@ Integración con AIS Stream
 """
 import asyncio
 import json
+import random
+import time
 import websockets
-from datetime import datetime
-from typing import Dict, List
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
 from models.config import ShipsConfig
+from services.spatial_index import GridIndex, ExpiryQueue
+from services.clustering import ZoomClusters, clip_bbox
+from services.layer_versions import LayerChangeLog, make_etag
+from services.stream_hub import StreamHub
+from services.vessels import VesselRecord, StaticDataTable
+
+# orjson es opcional: decodifica los lotes AIS bastante más rápido que json
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+POSITION_MESSAGES = ("PositionReport", "StandardClassBPositionReport", "ExtendedClassBPositionReport")
 
 class ShipsService:
-    def __init__(self):
-        self.ships_data = {}
+    def __init__(self, stream_hub: StreamHub = None):
+        self.hub = stream_hub
+        self.pending_updates = set()
+        self.pending_removals = set()
+        self.publish_interval = 1.0
+        self.publish_task = None
+        self.ships_data: Dict[str, VesselRecord] = {}
+        self.changes = LayerChangeLog()
+        self.index = GridIndex()
+        self.clusters = ZoomClusters()
+        self.expiry = ExpiryQueue()
+        self.ttl_seconds = ShipsConfig().ttl_seconds
+        self.static_data = StaticDataTable(ShipsConfig().static_ttl_seconds)
+        self.handlers: Dict[str, Callable] = {name: self._on_position_report for name in POSITION_MESSAGES}
+        self.handlers["ShipStaticData"] = self._on_static_data
+        
+        # Ingesta supervisada: una única conexión viva, reconexión con backoff
+        self.get_config: Callable[[], ShipsConfig] = None
+        self.supervisor_task = None
+        self.reconfigured = asyncio.Event()
+        self.batch_size = 200
+        self.batch_window = 0.05
         self.websocket = None
         self.running = False
+        self.stats = {
+            "state": "stopped",
+            "connects": 0,
+            "reconnects": 0,
+            "idle_timeouts": 0,
+            "backoff_seconds": 0,
+            "received": 0,
+            "decode_errors": 0,
+            "handler_errors": 0,
+            "ignored": 0,
+            "by_type": {},
+            "batches": 0,
+            "msgs_per_second": 0.0,
+            "decode_us": 0.0,
+            "lag_seconds": None,
+            "last_msg_ts": None
+        }
+        self.rate_window = (time.monotonic(), 0)
     
     async def get_ships(self, config: ShipsConfig) -> Dict:
         """Obtener datos de barcos"""
         if not config.enabled:
             return {"type": "FeatureCollection", "features": []}
         
-        # Si no hay datos en cache, iniciar conexión WebSocket
-        if not self.running:
-            asyncio.create_task(self._connect_ais(config))
-        
         # Retornar datos actuales
         features = []
         now = datetime.now().timestamp()
+        self.ttl_seconds = config.ttl_seconds
+        self._evict_expired(now)
         
-        for mmsi, ship in self.ships_data.items():
-            # Filtrar por TTL
-            if now - ship.get("ts", 0) > config.ttl_seconds:
-                continue
-            
-            # Filtrar por bounding box
-            lon, lat = ship.get("coordinates", [0, 0])
-            if not (config.bbox[0] <= lon <= config.bbox[2] and 
-                   config.bbox[1] <= lat <= config.bbox[3]):
-                continue
-            
-            features.append({
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lon, lat]
-                },
-                "properties": {
-                    "name": ship.get("name", "Unknown"),
-                    "mmsi": mmsi,
-                    "sog": ship.get("sog", 0),  # Speed over ground
-                    "cog": ship.get("cog", 0),  # Course over ground
-                    "heading": ship.get("heading", 0),
-                    "ts": ship.get("ts", now)
-                }
-            })
+        # Solo se recorren las celdas de la rejilla que cubren el bbox
+        for mmsi in self.index.query(config.bbox):
+            features.append(self._ship_feature(mmsi, self.ships_data[mmsi]))
             
             if len(features) >= config.max_points:
                 break
         
-        return {"type": "FeatureCollection", "features": features}
+        return {"type": "FeatureCollection", "features": features, "cursor": self.changes.version}
     
-    async def _connect_ais(self, config: ShipsConfig):
-        """Conectar a AIS Stream WebSocket"""
-        self.running = True
-        try:
-            import websockets
-            auth_header = None
-            if config.auth and config.auth.get("token"):
-                auth_header = {"Authorization": f"Bearer {config.auth['token']}"}
+    async def get_ship_columns(self, config: ShipsConfig) -> Dict:
+        """Barcos en columnas para el formato binario (sin construir features)"""
+        self.ttl_seconds = config.ttl_seconds
+        self._evict_expired(datetime.now().timestamp())
+        
+        mmsis = []
+        for mmsi in self.index.query(config.bbox):
+            mmsis.append(mmsi)
+            if len(mmsis) >= config.max_points:
+                break
+        
+        ships = [self.ships_data[mmsi] for mmsi in mmsis]
+        return {
+            "mmsi": ("u", [int(mmsi) for mmsi in mmsis]),
+            "lon": ("f", [ship.lon for ship in ships]),
+            "lat": ("f", [ship.lat for ship in ships]),
+            "sog": ("f", [ship.sog or 0 for ship in ships]),
+            "cog": ("f", [ship.cog or 0 for ship in ships]),
+            "heading": ("i", [ship.heading or 0 for ship in ships]),
+            "ts": ("t", [ship.ts * 1000 for ship in ships]),
+            "name": ("s", [self._ship_name(mmsi) for mmsi in mmsis])
+        }
+    
+    async def get_ship_clusters(self, config: ShipsConfig, zoom: int, bbox: List[float] = None) -> Dict:
+        """Barcos agrupados para un nivel de zoom (dentro del bbox configurado)"""
+        self.ttl_seconds = config.ttl_seconds
+        self._evict_expired(datetime.now().timestamp())
+        features = self.clusters.query(
+            zoom,
+            clip_bbox(bbox, config.bbox),
+            lambda mmsi: self._ship_feature(mmsi, self.ships_data[mmsi])
+        )
+        return {"type": "FeatureCollection", "features": features, "cursor": self.changes.version, "zoom": zoom}
+    
+    async def get_tile_features(self, config: ShipsConfig, bbox: List[float], level: Optional[int] = None) -> List[Dict]:
+        """Barcos de una tesela: agrupados si level no es None, si no puntos del índice"""
+        if level is not None:
+            return (await self.get_ship_clusters(config, level, bbox))["features"]
+        self.ttl_seconds = config.ttl_seconds
+        self._evict_expired(datetime.now().timestamp())
+        features = []
+        for mmsi in self.index.query(clip_bbox(bbox, config.bbox)):
+            features.append(self._ship_feature(mmsi, self.ships_data[mmsi]))
+            if len(features) >= config.max_points:
+                break
+        return features
+    
+    def get_etag(self, config: ShipsConfig) -> str:
+        """ETag de la capa para la configuración actual"""
+        self._evict_expired(datetime.now().timestamp())
+        return make_etag("ships", self.changes.version, tuple(config.bbox), config.max_points)
+    
+    def get_changes(self, config: ShipsConfig, cursor: int) -> Optional[Dict]:
+        """Barcos añadidos, movidos y caducados desde cursor (None si hay que pedir todo)"""
+        self.ttl_seconds = config.ttl_seconds
+        self._evict_expired(datetime.now().timestamp())
+        changes = self.changes.since(cursor)
+        if changes is None:
+            return None
+        
+        lon_min, lat_min, lon_max, lat_max = config.bbox
+        result = {"cursor": self.changes.version, "added": [], "moved": [], "expired": changes["expired"]}
+        for state in ("added", "moved"):
+            for mmsi in changes[state]:
+                ship = self.ships_data[mmsi]
+                lon, lat = ship.lon, ship.lat
+                if lon_min <= lon <= lon_max and lat_min <= lat <= lat_max:
+                    result[state].append(self._ship_feature(mmsi, ship))
+                elif state == "moved":
+                    # Ha salido del bbox: para el cliente equivale a caducado
+                    result["expired"].append(mmsi)
+        return result
+    
+    def _ship_feature(self, mmsi: str, ship: VesselRecord) -> Dict:
+        """Construir la feature GeoJSON de un barco (posición + datos estáticos)"""
+        properties = self.static_data.properties(mmsi)
+        properties["mmsi"] = mmsi
+        properties["sog"] = ship.sog  # Speed over ground
+        properties["cog"] = ship.cog  # Course over ground
+        properties["heading"] = ship.heading
+        properties["ts"] = ship.ts
+        return {
+            "type": "Feature",
+            "id": mmsi,
+            "geometry": {
+                "type": "Point",
+                "coordinates": [ship.lon, ship.lat]
+            },
+            "properties": properties
+        }
+    
+    def _ship_name(self, mmsi: str) -> str:
+        """Nombre del buque desde la tabla de datos estáticos"""
+        static = self.static_data.get(mmsi)
+        return (static and static.name) or "Unknown"
+    
+    async def _publish_loop(self):
+        """Agrupar cambios de posición y empujarlos a los clientes cada segundo"""
+        while True:
+            await asyncio.sleep(self.publish_interval)
+            if self.pending_removals:
+                ids = list(self.pending_removals)
+                self.pending_removals.clear()
+                self.hub.publish("ships", "remove", ids=ids)
+            if self.pending_updates:
+                features = [
+                    self._ship_feature(mmsi, self.ships_data[mmsi])
+                    for mmsi in self.pending_updates if mmsi in self.ships_data
+                ]
+                self.pending_updates.clear()
+                self.hub.publish("ships", "upsert", features)
+    
+    async def start(self, get_config: Callable[[], ShipsConfig]):
+        """Arrancar la ingesta AIS supervisada (get_config devuelve la configuración vigente)"""
+        self.get_config = get_config
+        if self.hub and (self.publish_task is None or self.publish_task.done()):
+            self.publish_task = asyncio.create_task(self._publish_loop())
+        if self.supervisor_task is None or self.supervisor_task.done():
+            self.supervisor_task = asyncio.create_task(self._supervise())
+    
+    async def stop(self):
+        """Detener la ingesta y el envío de cambios"""
+        for task in (self.supervisor_task, self.publish_task):
+            if task:
+                task.cancel()
+        await asyncio.gather(
+            *(task for task in (self.supervisor_task, self.publish_task) if task),
+            return_exceptions=True
+        )
+        self.supervisor_task = None
+        self.publish_task = None
+        self.stats["state"] = "stopped"
+    
+    def reconfigure(self):
+        """Reconectar con la configuración actual (bbox, filtros, token)"""
+        self.reconfigured.set()
+        if self.websocket is not None:
+            asyncio.create_task(self.websocket.close())
+    
+    async def test_connection(self, config: ShipsConfig, timeout: float = 10.0) -> int:
+        """Abrir una conexión de prueba y contar los mensajes recibidos durante timeout segundos"""
+        received = 0
+        async with websockets.connect(config.ws_url, additional_headers=self._auth_headers(config)) as websocket:
+            await websocket.send(json.dumps(self._subscription(config)))
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                try:
+                    await asyncio.wait_for(websocket.recv(), timeout=deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+                received += 1
+        return received
+    
+    async def _supervise(self):
+        """Mantener una conexión AIS viva: reconecta con backoff exponencial y jitter"""
+        backoff = 1.0
+        while True:
+            config = self.get_config()
+            self.reconfigured.clear()
+            self.ttl_seconds = config.ttl_seconds
+            self.static_data.ttl_seconds = config.static_ttl_seconds
+            if not config.enabled:
+                self.stats["state"] = "disabled"
+                await self.reconfigured.wait()
+                continue
             
-            async with websockets.connect(
-                config.ws_url,
-                extra_headers=auth_header
-            ) as websocket:
-                # Enviar suscripción
-                subscription = {
-                    "BoundingBoxes": config.subscription.BoundingBoxes,
-                    "FilterMessageTypes": config.subscription.FilterMessageTypes
-                }
-                await websocket.send(json.dumps(subscription))
+            received = self.stats["received"]
+            try:
+                await self._run_session(config)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self.reconfigured.is_set():
+                    print(f"Error conectando a AIS Stream: {e}")
+            finally:
+                self.websocket = None
+                self.running = False
+            
+            if self.reconfigured.is_set():
+                backoff = 1.0
+                continue
+            if self.stats["received"] > received:
+                # La sesión llegó a recibir datos: volver al retardo mínimo
+                backoff = 1.0
+            delay = backoff * random.uniform(0.8, 1.2)
+            self.stats["state"] = "backoff"
+            self.stats["reconnects"] += 1
+            self.stats["backoff_seconds"] = round(delay, 1)
+            try:
+                await asyncio.wait_for(self.reconfigured.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, config.reconnect_max_seconds)
+    
+    async def _run_session(self, config: ShipsConfig):
+        """Una conexión: suscribirse y procesar mensajes por lotes hasta cierre o inactividad"""
+        self.stats["state"] = "connecting"
+        async with websockets.connect(
+            config.ws_url,
+            additional_headers=self._auth_headers(config),
+            ping_interval=20,
+            ping_timeout=20
+        ) as websocket:
+            self.websocket = websocket
+            self.running = True
+            self.stats["state"] = "connected"
+            self.stats["connects"] += 1
+            await websocket.send(json.dumps(self._subscription(config)))
+            
+            loop = asyncio.get_running_loop()
+            while not self.reconfigured.is_set():
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=config.idle_timeout_seconds)
+                except asyncio.TimeoutError:
+                    # Conexión abierta pero sin datos: reconectar
+                    self.stats["idle_timeouts"] += 1
+                    print(f"AIS Stream sin mensajes en {config.idle_timeout_seconds}s, reconectando")
+                    return
                 
-                # Recibir mensajes
-                async for message in websocket:
+                # Agrupar lo que llegue en la ventana del lote para decodificar de una vez
+                batch = [message]
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
                     try:
-                        data = json.loads(message)
-                        self._process_ais_message(data)
-                    except Exception as e:
-                        print(f"Error procesando mensaje AIS: {e}")
+                        batch.append(await asyncio.wait_for(websocket.recv(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+                    except websockets.ConnectionClosed:
+                        # No perder lo ya recibido antes del cierre
+                        self._process_batch(batch)
+                        raise
+                self._process_batch(batch)
+    
+    def _auth_headers(self, config: ShipsConfig) -> Optional[Dict[str, str]]:
+        if config.auth and config.auth.get("token"):
+            return {"Authorization": f"Bearer {config.auth['token']}"}
+        return None
+    
+    def _subscription(self, config: ShipsConfig) -> Dict:
+        subscription = {
+            "BoundingBoxes": config.subscription.BoundingBoxes,
+            "FilterMessageTypes": config.subscription.FilterMessageTypes
+        }
+        if config.auth and config.auth.get("token"):
+            subscription["APIKey"] = config.auth["token"]
+        return subscription
+    
+    def _process_batch(self, messages: List):
+        """Decodificar y aplicar un lote de mensajes AIS"""
+        started = time.perf_counter()
+        now = datetime.now().timestamp()
+        by_type = self.stats["by_type"]
+        last = None
+        for message in messages:
+            try:
+                data = loads(message)
+            except Exception:
+                self.stats["decode_errors"] += 1
+                continue
+            message_type = self._dispatch(data, now)
+            by_type[message_type] = by_type.get(message_type, 0) + 1
+            last = data
+        self._evict_expired(now)
+        
+        elapsed = time.perf_counter() - started
+        count = len(messages)
+        self.stats["received"] += count
+        self.stats["batches"] += 1
+        self.stats["decode_us"] = round(elapsed / count * 1e6, 1)
+        self.stats["last_msg_ts"] = now
+        if last is not None:
+            self.stats["lag_seconds"] = self._lag(last, now)
+        
+        window_start, window_count = self.rate_window
+        window_count += count
+        elapsed_window = time.monotonic() - window_start
+        if elapsed_window >= 5:
+            self.stats["msgs_per_second"] = round(window_count / elapsed_window, 1)
+            self.rate_window = (time.monotonic(), 0)
+        else:
+            self.rate_window = (window_start, window_count)
+    
+    def _dispatch(self, data: Dict, now: float) -> str:
+        """Pasar un mensaje decodificado a su manejador por tipo"""
+        message_type = data.get("MessageType") or next(iter(data.get("Message") or {}), "Unknown")
+        handler = self.handlers.get(message_type)
+        if handler is None:
+            self.stats["ignored"] += 1
+            return message_type
+        try:
+            handler(data, data["Message"][message_type], now)
         except Exception as e:
-            print(f"Error conectando a AIS Stream: {e}")
-            self.running = False
-        finally:
-            self.running = False
-    
-    def _process_ais_message(self, data: Dict):
-        """Procesar mensaje AIS"""
-        if "Message" in data and "PositionReport" in data["Message"]:
-            msg = data["Message"]["PositionReport"]
-            mmsi = str(msg.get("MessageId", ""))
-            
-            if mmsi:
-                self.ships_data[mmsi] = {
-                    "name": msg.get("VesselName", "Unknown"),
-                    "coordinates": [msg.get("Longitude", 0), msg.get("Latitude", 0)],
-                    "sog": msg.get("Sog", 0),
-                    "cog": msg.get("Cog", 0),
-                    "heading": msg.get("TrueHeading", 0),
-                    "ts": datetime.now().timestamp()
-                }
+            self.stats["handler_errors"] += 1
+            print(f"Error procesando mensaje AIS {message_type}: {e}")
+        return message_type
+    
+    @staticmethod
+    def _lag(data: Dict, now: float) -> Optional[float]:
+        """Retraso entre la hora del mensaje (MetaData.time_utc) y su procesado"""
+        time_utc = (data.get("MetaData") or {}).get("time_utc")
+        if not time_utc:
+            return None
+        try:
+            sent = datetime.strptime(time_utc[:26], "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+        return round(now - sent.timestamp(), 2)
+    
+    def _on_position_report(self, data: Dict, msg: Dict, now: float):
+        """Posición de clase A o B"""
+        # MessageId es el tipo de mensaje AIS; el MMSI viene en UserID/MetaData
+        meta = data.get("MetaData") or {}
+        mmsi = str(msg.get("UserID") or meta.get("MMSI", ""))
+        lon = msg.get("Longitude", 0)
+        lat = msg.get("Latitude", 0)
+        # 181/91 significan "no disponible" en AIS
+        if not mmsi or abs(lon) > 180 or abs(lat) > 90:
+            return
+        
+        ship = self.ships_data.get(mmsi)
+        if ship is None:
+            self.changes.record("add", mmsi)
+            self.ships_data[mmsi] = VesselRecord(
+                lon, lat, msg.get("Sog", 0), msg.get("Cog", 0), msg.get("TrueHeading", 0), now
+            )
+            self.static_data.note_name(mmsi, (meta.get("ShipName") or "").strip(), now)
+        else:
+            # Actualización in situ: sin reconstruir el registro en cada mensaje
+            self.changes.record("move", mmsi)
+            ship.update(lon, lat, msg.get("Sog", 0), msg.get("Cog", 0), msg.get("TrueHeading", 0), now)
+        self.index.upsert(mmsi, lon, lat)
+        self.clusters.upsert(mmsi, lon, lat)
+        self.expiry.push(now, mmsi)
+        if self.hub and self.hub.subscribers:
+            self.pending_updates.add(mmsi)
+    
+    def _on_static_data(self, data: Dict, msg: Dict, now: float):
+        """Datos estáticos del buque (nombre, tipo, dimensiones, destino)"""
+        mmsi = str(msg.get("UserID") or (data.get("MetaData") or {}).get("MMSI", ""))
+        if not mmsi:
+            return
+        dimension = msg.get("Dimension") or {}
+        self.static_data.update(
+            mmsi,
+            now,
+            name=(msg.get("Name") or "").strip(" @"),
+            call_sign=(msg.get("CallSign") or "").strip(" @"),
+            ship_type=msg.get("Type", 0),
+            destination=(msg.get("Destination") or "").strip(" @"),
+            length=(dimension.get("A") or 0) + (dimension.get("B") or 0),
+            beam=(dimension.get("C") or 0) + (dimension.get("D") or 0)
+        )
+        # Las propiedades de la feature cambian: nueva versión de capa si el buque está en el mapa
+        if mmsi in self.ships_data:
+            self.changes.record("move", mmsi)
+            if self.hub and self.hub.subscribers:
+                self.pending_updates.add(mmsi)
+
+    def get_stats(self) -> Dict:
+        """Estado de la conexión y métricas de ingesta AIS"""
+        stats = dict(self.stats)
+        stats["by_type"] = dict(self.stats["by_type"])
+        stats["vessels"] = len(self.ships_data)
+        stats["static"] = len(self.static_data)
+        return stats
+    
+    def _evict_expired(self, now: float):
+        """Eliminar barcos sin posición reciente (O(1) amortizado por actualización)"""
+        expired = self.expiry.expire(
+            now - self.ttl_seconds,
+            lambda mmsi: self.ships_data[mmsi].ts if mmsi in self.ships_data else None
+        )
+        for mmsi in expired:
+            del self.ships_data[mmsi]
+            self.index.remove(mmsi)
+            self.clusters.remove(mmsi)
+            self.changes.record("expire", mmsi)
+            self.pending_updates.discard(mmsi)
+            if self.hub and self.hub.subscribers:
+                self.pending_removals.add(mmsi)
 
@@ -0,0 +1,110 @@
+"""
+Índices espaciales y temporales en memoria
+Rejilla uniforme lon/lat y cola de caducidad ordenada por tiempo
+"""
+import math
+from collections import deque
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+Cell = Tuple[int, int]
+
+class GridIndex:
+    def __init__(self, cell_size: float = 0.25):
+        self.cell_size = cell_size
+        self.cells: Dict[Cell, Set[Hashable]] = {}
+        self.positions: Dict[Hashable, Tuple[float, float, Cell]] = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.positions
+
+    def upsert(self, key: Hashable, lon: float, lat: float):
+        """Insertar o mover un elemento; solo toca las celdas de origen y destino"""
+        cell = self._cell(lon, lat)
+        previous = self.positions.get(key)
+        if previous is not None and previous[2] != cell:
+            self._discard(key, previous[2])
+        if previous is None or previous[2] != cell:
+            self.cells.setdefault(cell, set()).add(key)
+        self.positions[key] = (lon, lat, cell)
+
+    def remove(self, key: Hashable):
+        """Eliminar un elemento del índice"""
+        previous = self.positions.pop(key, None)
+        if previous is not None:
+            self._discard(key, previous[2])
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, float]]:
+        """Posición (lon, lat) de un elemento"""
+        position = self.positions.get(key)
+        return (position[0], position[1]) if position else None
+
+    def query(self, bbox: List[float]) -> Iterator[Hashable]:
+        """Elementos dentro de [lon_min, lat_min, lon_max, lat_max] recorriendo solo las celdas afectadas"""
+        lon_min, lat_min, lon_max, lat_max = bbox
+        cx_min, cy_min = self._cell(lon_min, lat_min)
+        cx_max, cy_max = self._cell(lon_max, lat_max)
+
+        # Con pocas celdas ocupadas es más barato recorrer las existentes
+        span = (cx_max - cx_min + 1) * (cy_max - cy_min + 1)
+        if span > len(self.cells):
+            candidates = [
+                (cell, keys) for cell, keys in self.cells.items()
+                if cx_min <= cell[0] <= cx_max and cy_min <= cell[1] <= cy_max
+            ]
+        else:
+            candidates = []
+            for cx in range(cx_min, cx_max + 1):
+                for cy in range(cy_min, cy_max + 1):
+                    keys = self.cells.get((cx, cy))
+                    if keys:
+                        candidates.append(((cx, cy), keys))
+
+        for (cx, cy), keys in candidates:
+            inner = cx_min < cx < cx_max and cy_min < cy < cy_max
+            for key in keys:
+                if inner:
+                    yield key
+                    continue
+                lon, lat, _ = self.positions[key]
+                if lon_min <= lon <= lon_max and lat_min <= lat <= lat_max:
+                    yield key
+
+    def _cell(self, lon: float, lat: float) -> Cell:
+        return (math.floor(lon / self.cell_size), math.floor(lat / self.cell_size))
+
+    def _discard(self, key: Hashable, cell: Cell):
+        keys = self.cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.cells[cell]
+
+class ExpiryQueue:
+    """Cola FIFO de (ts, clave) para caducar elementos en O(1) amortizado.
+
+    Cada actualización añade una entrada nueva; las entradas antiguas de
+    una clave que se ha vuelto a actualizar se descartan al salir de la
+    cola comparando con el ts vigente.
+    """
+
+    def __init__(self):
+        self.entries = deque()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def push(self, ts: float, key: Hashable):
+        self.entries.append((ts, key))
+
+    def expire(self, cutoff: float, current_ts: Callable[[Hashable], Optional[float]]) -> List[Hashable]:
+        """Sacar las entradas anteriores a cutoff y devolver las claves realmente caducadas"""
+        expired = []
+        entries = self.entries
+        while entries and entries[0][0] < cutoff:
+            ts, key = entries.popleft()
+            if current_ts(key) == ts:
+                expired.append(key)
+        return expired
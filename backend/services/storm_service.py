@@ -4,16 +4,47 @@ Integración con Blitzortung vía MQTT
 """
 import asyncio
 import json
+from collections import deque
+import numpy as np
 import paho.mqtt.client as mqtt
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
 from models.config import StormConfig
+from services.strike_store import StrikeRingBuffer
+from services.geodesy import radius_filter
+from services.stream_hub import StreamHub
+from services.layer_versions import make_etag
+from services.clustering import ZoomClusters, clip_bbox
 
 class StormService:
-    def __init__(self):
-        self.strikes = []
+    def __init__(self, stream_hub: StreamHub = None):
+        self.hub = stream_hub
+        defaults = StormConfig()
+        self.config = defaults
+        self.strikes = StrikeRingBuffer(defaults.max_points)
+        self.ttl_seconds = defaults.ttl_seconds
+        self.clusters = ZoomClusters()
+        self.clustered_ids = (0, 0)  # rango [desde, hasta) de ids insertados en clusters
         self.mqtt_client = None
         self.running = False
+        
+        # Puente hilo MQTT -> bucle asyncio: el hilo de paho solo encola bytes
+        self.loop = None
+        self.inbox = deque()
+        self.queue_size = defaults.queue_size
+        self.batch_size = 500
+        self.wakeup = asyncio.Event()
+        self.wakeup_pending = False
+        self.consumer_task = None
+        self.stats = {
+            "received": 0,
+            "dropped": 0,
+            "decoded": 0,
+            "decode_errors": 0,
+            "batches": 0,
+            "max_batch": 0,
+            "last_msg_ts": None
+        }
     
     async def get_storms(self, config: StormConfig) -> Dict:
         """Obtener datos de rayos"""
@@ -24,49 +55,213 @@ class StormService:
         if not self.running:
             asyncio.create_task(self._connect_mqtt(config))
         
-        # Filtrar rayos por TTL y radio
+        self._apply_config(config)
+        
+        # Caducar rayos antiguos y filtrar por radio
         now = datetime.now().timestamp() * 1000
-        ttl_ms = config.ttl_seconds * 1000
-        features = []
+        self.strikes.expire(now - self.ttl_seconds * 1000)
         
-        center_lat = config.location.get("lat", 0) if config.location else 0
-        center_lon = config.location.get("lon", 0) if config.location else 0
+        features = self._features_from_store(config)
+        return {"type": "FeatureCollection", "features": features, "cursor": self.strikes.total}
+    
+    async def get_storm_clusters(self, config: StormConfig, zoom: int, bbox: List[float] = None) -> Dict:
+        """Rayos agrupados para un nivel de zoom (dentro del radio configurado)"""
+        if not self.running:
+            asyncio.create_task(self._connect_mqtt(config))
         
-        for strike in self.strikes:
-            # Filtrar por TTL
-            age = now - strike.get("ts", 0)
-            if age > ttl_ms:
-                continue
-            
-            # Filtrar por radio si hay ubicación configurada
-            if center_lat and center_lon:
-                lon, lat = strike.get("coordinates", [0, 0])
-                # Calcular distancia (simplificado)
-                distance_km = ((lat - center_lat) ** 2 + (lon - center_lon) ** 2) ** 0.5 * 111
-                if distance_km > config.max_radius_km:
-                    continue
-            
+        self._apply_config(config)
+        self.strikes.expire(datetime.now().timestamp() * 1000 - self.ttl_seconds * 1000)
+        self._sync_clusters()
+        
+        limit = [-180.0, -85.0, 180.0, 85.0]
+        if config.location:
+            # Bbox del círculo de radio max_radius_km; los rayos sueltos se filtran por radio exacto
+            lat = config.location.get("lat", 0)
+            lon = config.location.get("lon", 0)
+            dlat = config.max_radius_km / 111.0
+            dlon = config.max_radius_km / (111.0 * max(np.cos(np.radians(lat)), 0.01))
+            limit = [lon - dlon, lat - dlat, lon + dlon, lat + dlat]
+        features = self.clusters.query(zoom, clip_bbox(bbox, limit), lambda strike_id: self._strike_feature(config, strike_id))
+        return {"type": "FeatureCollection", "features": features, "cursor": self.strikes.total, "zoom": zoom}
+    
+    async def get_tile_features(self, config: StormConfig, bbox: List[float], level: Optional[int] = None) -> List[Dict]:
+        """Rayos de una tesela: agrupados si level no es None, si no filtrados por bbox y radio"""
+        if level is not None:
+            return (await self.get_storm_clusters(config, level, bbox))["features"]
+        if not self.running:
+            asyncio.create_task(self._connect_mqtt(config))
+        
+        self._apply_config(config)
+        self.strikes.expire(datetime.now().timestamp() * 1000 - self.ttl_seconds * 1000)
+        ids, ts, lons, lats, amplitude, station_count = self._store_columns()
+        inside = (lons >= bbox[0]) & (lons <= bbox[2]) & (lats >= bbox[1]) & (lats <= bbox[3])
+        return self._build_features(
+            config, ids[inside], ts[inside], lons[inside], lats[inside], amplitude[inside], station_count[inside]
+        )
+    
+    def get_etag(self, config: StormConfig) -> str:
+        """ETag de la capa: cambia al llegar o caducar rayos"""
+        self._apply_config(config)
+        self.strikes.expire(datetime.now().timestamp() * 1000 - self.ttl_seconds * 1000)
+        version = f"{self.strikes.total}.{self.strikes.oldest_id}"
+        location = tuple(sorted(config.location.items())) if config.location else None
+        return make_etag("storms", version, location, config.max_radius_km, config.max_points)
+    
+    def get_changes(self, config: StormConfig, cursor: int) -> Optional[Dict]:
+        """Rayos nuevos y caducados desde cursor (id del siguiente rayo esperado)"""
+        if cursor < 0 or cursor > self.strikes.total:
+            return None
+        self._apply_config(config)
+        self.strikes.expire(datetime.now().timestamp() * 1000 - self.ttl_seconds * 1000)
+        
+        # Los rayos son inmutables: solo hay altas y caducidades, nunca movimientos
+        oldest = self.strikes.oldest_id
+        expired = list(range(max(cursor - self.strikes.capacity, 0), min(oldest, cursor)))
+        return {
+            "cursor": self.strikes.total,
+            "added": self._features_from_store(config, since_id=cursor),
+            "moved": [],
+            "expired": expired
+        }
+    
+    async def get_storm_columns(self, config: StormConfig) -> Dict:
+        """Rayos en columnas para el formato binario (sin construir features)"""
+        if not self.running:
+            asyncio.create_task(self._connect_mqtt(config))
+        
+        self._apply_config(config)
+        self.strikes.expire(datetime.now().timestamp() * 1000 - self.ttl_seconds * 1000)
+        
+        columns = self._select_columns(config, *self._store_columns())
+        result = {
+            "id": ("u", columns["id"]),
+            "lon": ("f", columns["lon"]),
+            "lat": ("f", columns["lat"]),
+            "ts": ("t", columns["ts"]),
+            "amp": ("f", columns["amplitude"]),
+            "stations": ("i", columns["station_count"])
+        }
+        if "distance_km" in columns:
+            result["dist_km"] = ("f", columns["distance_km"])
+            result["bearing"] = ("f", columns["bearing"])
+        return result
+    
+    def _store_columns(self, since_id: int = None) -> tuple:
+        """Columnas del almacén en orden cronológico (desde since_id si se indica)"""
+        order = self.strikes.order(since_id)
+        first_id = self.strikes.total - len(order)
+        return (
+            first_id + np.arange(len(order)),
+            self.strikes.column("ts")[order],
+            self.strikes.column("lon")[order],
+            self.strikes.column("lat")[order],
+            self.strikes.column("amplitude")[order],
+            self.strikes.column("station_count")[order]
+        )
+    
+    def _strike_feature(self, config: StormConfig, strike_id: int) -> Optional[Dict]:
+        """Feature de un rayo retenido por id (None si ya no está o queda fuera del radio)"""
+        if not self.strikes.oldest_id <= strike_id < self.strikes.total:
+            return None
+        order = np.array([self.strikes.slot(strike_id)])
+        features = self._build_features(
+            config,
+            np.array([strike_id]),
+            self.strikes.column("ts")[order],
+            self.strikes.column("lon")[order],
+            self.strikes.column("lat")[order],
+            self.strikes.column("amplitude")[order],
+            self.strikes.column("station_count")[order]
+        )
+        return features[0] if features else None
+    
+    def _sync_clusters(self):
+        """Llevar a los clusters los rayos nuevos y retirar los caducados o sobrescritos"""
+        start, end = self.clustered_ids
+        oldest, total = self.strikes.oldest_id, self.strikes.total
+        for strike_id in range(start, min(oldest, end)):
+            self.clusters.remove(strike_id)
+        first = max(end, oldest)
+        if first < total:
+            order = self.strikes.order(first)
+            lons = self.strikes.column("lon")[order].tolist()
+            lats = self.strikes.column("lat")[order].tolist()
+            for k, strike_id in enumerate(range(first, total)):
+                self.clusters.upsert(strike_id, lons[k], lats[k])
+        self.clustered_ids = (oldest, total)
+    
+    def _features_from_store(self, config: StormConfig, since_id: int = None) -> List[Dict]:
+        """Features de los rayos retenidos (desde since_id si se indica)"""
+        return self._build_features(config, *self._store_columns(since_id))
+    
+    def _select_columns(
+        self,
+        config: StormConfig,
+        ids: np.ndarray,
+        ts: np.ndarray,
+        lons: np.ndarray,
+        lats: np.ndarray,
+        amplitude: np.ndarray,
+        station_count: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """Filtrar columnas por radio y max_points"""
+        columns = {}
+        
+        # Filtrar por radio (ortodrómico, vectorizado) si hay ubicación configurada
+        if config.location:
+            center_lat = config.location.get("lat", 0)
+            center_lon = config.location.get("lon", 0)
+            selected, distances, bearings = radius_filter(
+                center_lat, center_lon, config.max_radius_km, lats, lons
+            )
+            selected = selected[:config.max_points]
+            columns["distance_km"] = distances[:config.max_points].round(2)
+            columns["bearing"] = bearings[:config.max_points].round(1)
+        else:
+            selected = np.arange(min(len(ts), config.max_points))
+        
+        columns["id"] = ids[selected]
+        columns["ts"] = ts[selected]
+        columns["lon"] = lons[selected]
+        columns["lat"] = lats[selected]
+        columns["amplitude"] = amplitude[selected]
+        columns["station_count"] = station_count[selected]
+        return columns
+    
+    def _build_features(self, config: StormConfig, *store_columns) -> List[Dict]:
+        """Filtrar por radio y construir features GeoJSON desde columnas"""
+        columns = {name: values.tolist() for name, values in self._select_columns(config, *store_columns).items()}
+        distances = columns.get("distance_km")
+        bearings = columns.get("bearing")
+        
+        features = []
+        for k in range(len(columns["id"])):
+            properties = {
+                "ts": columns["ts"][k],
+                "amplitude": columns["amplitude"][k],
+                "station_count": columns["station_count"][k]
+            }
+            if distances is not None:
+                properties["distance_km"] = distances[k]
+                properties["bearing"] = bearings[k]
             features.append({
                 "type": "Feature",
+                "id": columns["id"][k],
                 "geometry": {
                     "type": "Point",
-                    "coordinates": strike.get("coordinates", [0, 0])
+                    "coordinates": [columns["lon"][k], columns["lat"][k]]
                 },
-                "properties": {
-                    "ts": strike.get("ts", now),
-                    "amplitude": strike.get("amplitude", 0),
-                    "station_count": strike.get("station_count", 0)
-                }
+                "properties": properties
             })
-            
-            if len(features) >= config.max_points:
-                break
-        
-        return {"type": "FeatureCollection", "features": features}
+        return features
     
     async def _connect_mqtt(self, config: StormConfig):
         """Conectar a MQTT para recibir datos de Blitzortung"""
         self.running = True
+        self._apply_config(config)
+        self.loop = asyncio.get_running_loop()
+        if self.consumer_task is None or self.consumer_task.done():
+            self.consumer_task = asyncio.create_task(self._consume())
         
         def on_connect(client, userdata, flags, rc):
             if rc == 0:
@@ -76,11 +271,8 @@ class StormService:
                 print(f"Error conectando a MQTT: {rc}")
         
         def on_message(client, userdata, msg):
-            try:
-                data = json.loads(msg.payload.decode())
-                self._process_strike(data)
-            except Exception as e:
-                print(f"Error procesando mensaje MQTT: {e}")
+            # Hilo de red de paho: no tocar el almacén, solo encolar
+            self._enqueue(msg.payload)
         
         try:
             self.mqtt_client = mqtt.Client(client_id=config.mqtt.client_id)
@@ -94,7 +286,8 @@ class StormService:
             self.mqtt_client.on_connect = on_connect
             self.mqtt_client.on_message = on_message
             
-            self.mqtt_client.connect(
+            # connect_async evita bloquear el bucle; el hilo de paho conecta y reconecta
+            self.mqtt_client.connect_async(
                 config.mqtt.host,
                 config.mqtt.port,
                 60
@@ -105,20 +298,108 @@ class StormService:
             print(f"Error iniciando MQTT: {e}")
             self.running = False
     
-    def _process_strike(self, data: Dict):
-        """Procesar un rayo recibido"""
-        # Formato depende de Blitzortung API
-        # Ejemplo: {"lat": 39.98, "lon": -0.03, "time": 1234567890, "amplitude": 12345}
-        strike = {
-            "coordinates": [data.get("lon", 0), data.get("lat", 0)],
-            "ts": data.get("time", datetime.now().timestamp()) * 1000,
-            "amplitude": data.get("amplitude", 0),
-            "station_count": data.get("station_count", 0)
-        }
+    async def stop(self):
+        """Detener el cliente MQTT y el consumidor"""
+        if self.mqtt_client:
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
+            self.mqtt_client = None
+        if self.consumer_task:
+            self.consumer_task.cancel()
+            await asyncio.gather(self.consumer_task, return_exceptions=True)
+            self.consumer_task = None
+        self.running = False
+    
+    def _enqueue(self, payload: bytes):
+        """Encolar un mensaje desde el hilo MQTT (cola acotada, descarta si está llena)"""
+        self.stats["received"] += 1
+        if len(self.inbox) >= self.queue_size:
+            self.stats["dropped"] += 1
+            return
+        self.inbox.append(payload)
+        if not self.wakeup_pending:
+            self.wakeup_pending = True
+            try:
+                self.loop.call_soon_threadsafe(self.wakeup.set)
+            except RuntimeError:
+                # El bucle se ha cerrado (parada de la aplicación)
+                pass
+    
+    async def _consume(self):
+        """Consumidor en el bucle: decodifica e inserta los mensajes por lotes"""
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            self.wakeup_pending = False
+            while self.inbox:
+                batch = []
+                while self.inbox and len(batch) < self.batch_size:
+                    batch.append(self.inbox.popleft())
+                self._process_batch(batch)
+                # Ceder el bucle entre lotes para no retrasar otras peticiones
+                await asyncio.sleep(0)
+    
+    def _process_batch(self, payloads: List[bytes]):
+        """Decodificar un lote de mensajes e insertarlo en bloque"""
+        now = datetime.now().timestamp() * 1000
+        ts, lon, lat, amplitude, station_count = [], [], [], [], []
+        for payload in payloads:
+            try:
+                data = json.loads(payload)
+                row = (
+                    float(data.get("time", now / 1000)) * 1000,
+                    float(data.get("lon") or 0),
+                    float(data.get("lat") or 0),
+                    float(data.get("amplitude") or 0),
+                    int(data.get("station_count") or 0)
+                )
+            except Exception as e:
+                self.stats["decode_errors"] += 1
+                print(f"Error procesando mensaje MQTT: {e}")
+                continue
+            ts.append(row[0])
+            lon.append(row[1])
+            lat.append(row[2])
+            amplitude.append(row[3])
+            station_count.append(row[4])
         
-        self.strikes.append(strike)
+        first_id = self.strikes.total
+        self.strikes.extend(ts, lon, lat, amplitude, station_count)
+        self.strikes.expire(now - self.ttl_seconds * 1000)
+        self._sync_clusters()
         
-        # Limpiar rayos antiguos
-        now = datetime.now().timestamp() * 1000
-        self.strikes = [s for s in self.strikes if now - s.get("ts", 0) < 600000]  # 10 minutos
+        # Empujar los rayos nuevos a los clientes suscritos
+        if ts and self.hub and self.hub.subscribers:
+            features = self._build_features(
+                self.config,
+                first_id + np.arange(len(ts)),
+                np.asarray(ts),
+                np.asarray(lon),
+                np.asarray(lat),
+                np.asarray(amplitude),
+                np.asarray(station_count)
+            )
+            if features:
+                self.hub.publish("storms", "add", features)
+        self.stats["decoded"] += len(ts)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(payloads))
+        if ts:
+            self.stats["last_msg_ts"] = now / 1000
+    
+    def get_stats(self) -> Dict:
+        """Contadores de ingesta, cola y almacén"""
+        stats = dict(self.stats)
+        stats["queue_depth"] = len(self.inbox)
+        stats["queue_size"] = self.queue_size
+        stats["store"] = self.strikes.get_stats()
+        return stats
+    
+    def _apply_config(self, config: StormConfig):
+        """Aplicar TTL y capacidad configurados al almacén de rayos"""
+        self.config = config
+        self.ttl_seconds = config.ttl_seconds
+        self.queue_size = config.queue_size
+        if config.max_points != self.strikes.capacity:
+            self.strikes.resize(config.max_points)
 
@@ -0,0 +1,80 @@
+"""
+Difusión de actualizaciones en tiempo real
+Reparte cambios por capa (barcos, aviones, rayos) a los clientes suscritos
+"""
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set
+
+LAYERS = ("ships", "flights", "storms")
+
+class StreamSubscriber:
+    def __init__(self, layers: Iterable[str], bbox: Optional[List[float]] = None, queue_size: int = 256):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.layers: Set[str] = set()
+        self.bbox: Optional[List[float]] = None
+        self.dropped = 0
+        self.update(layers, bbox)
+
+    def update(self, layers: Iterable[str], bbox: Optional[List[float]] = None):
+        """Cambiar capas y bounding box de la suscripción"""
+        self.layers = {layer for layer in layers if layer in LAYERS}
+        self.bbox = list(bbox) if bbox and len(bbox) == 4 else None
+
+    def accepts(self, feature: Dict) -> bool:
+        """¿Está el punto dentro del bbox de la suscripción?"""
+        if self.bbox is None:
+            return True
+        lon, lat = feature["geometry"]["coordinates"][:2]
+        return self.bbox[0] <= lon <= self.bbox[2] and self.bbox[1] <= lat <= self.bbox[3]
+
+    def offer(self, message: Dict):
+        """Encolar sin bloquear; si el cliente va lento se le pide resincronizar"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"layer": message["layer"], "op": "resync"})
+
+class StreamHub:
+    def __init__(self):
+        self.subscribers: Set[StreamSubscriber] = set()
+        self.stats = {"published": 0, "delivered": 0}
+
+    def subscribe(self, layers: Iterable[str], bbox: Optional[List[float]] = None) -> StreamSubscriber:
+        subscriber = StreamSubscriber(layers, bbox)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: StreamSubscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, layer: str, op: str, features: List[Dict] = None, ids: List[str] = None):
+        """Publicar un cambio de capa.
+
+        op: "snapshot" (sustituye la capa), "add" (nuevos elementos),
+        "upsert" (nuevos o movidos) o "remove" (ids caducados).
+        """
+        if not self.subscribers:
+            return
+        self.stats["published"] += 1
+        for subscriber in list(self.subscribers):
+            if layer not in subscriber.layers:
+                continue
+            message = {"layer": layer, "op": op}
+            if features is not None:
+                selected = [f for f in features if subscriber.accepts(f)]
+                if not selected and op in ("add", "upsert"):
+                    continue
+                message["features"] = selected
+            if ids is not None:
+                message["ids"] = ids
+            subscriber.offer(message)
+            self.stats["delivered"] += 1
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["subscribers"] = len(self.subscribers)
+        stats["dropped"] = sum(subscriber.dropped for subscriber in self.subscribers)
+        return stats
@@ -0,0 +1,131 @@
+"""
+Almacén de rayos en buffer circular
+Columnas preasignadas (ts, lon, lat, amplitud, estaciones) con inserción O(1)
+"""
+from array import array
+from typing import Dict, Iterator, Tuple
+import numpy as np
+
+class StrikeRingBuffer:
+    """Buffer circular de rayos ordenado por llegada.
+
+    Al llenarse se sobrescribe el rayo más antiguo; la caducidad avanza
+    la cola mientras el rayo más antiguo quede fuera del TTL, por lo que
+    asume timestamps aproximadamente crecientes (orden de llegada MQTT).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(int(capacity), 1)
+        self.ts = array("d", bytes(8 * self.capacity))
+        self.lon = array("d", bytes(8 * self.capacity))
+        self.lat = array("d", bytes(8 * self.capacity))
+        self.amplitude = array("d", bytes(8 * self.capacity))
+        self.station_count = array("i", bytes(4 * self.capacity))
+        self.head = 0  # siguiente posición de escritura
+        self.size = 0
+        self.total = 0  # rayos añadidos desde el arranque; el id de un rayo es su número de orden
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def oldest_id(self) -> int:
+        """Id del rayo más antiguo retenido"""
+        return self.total - self.size
+
+    @property
+    def tail(self) -> int:
+        """Posición del rayo más antiguo"""
+        return (self.head - self.size) % self.capacity
+
+    def append(self, ts: float, lon: float, lat: float, amplitude: float = 0.0, station_count: int = 0):
+        """Añadir un rayo en O(1), sobrescribiendo el más antiguo si está lleno"""
+        i = self.head
+        self.ts[i] = ts
+        self.lon[i] = lon
+        self.lat[i] = lat
+        self.amplitude[i] = amplitude
+        self.station_count[i] = station_count
+        self.head = (i + 1) % self.capacity
+        self.total += 1
+        if self.size < self.capacity:
+            self.size += 1
+
+    def extend(self, ts, lon, lat, amplitude, station_count):
+        """Añadir un lote de rayos con escrituras por bloques (columnas de igual longitud)"""
+        n = len(ts)
+        if n == 0:
+            return
+        self.total += n
+        columns = (
+            ("ts", np.asarray(ts, dtype=np.float64)),
+            ("lon", np.asarray(lon, dtype=np.float64)),
+            ("lat", np.asarray(lat, dtype=np.float64)),
+            ("amplitude", np.asarray(amplitude, dtype=np.float64)),
+            ("station_count", np.asarray(station_count, dtype=np.int32))
+        )
+        if n > self.capacity:
+            # Solo sobreviven los más recientes
+            columns = tuple((name, values[n - self.capacity:]) for name, values in columns)
+            n = self.capacity
+
+        head = self.head
+        first = min(n, self.capacity - head)
+        for name, values in columns:
+            target = self.column(name)
+            target[head:head + first] = values[:first]
+            target[:n - first] = values[first:]
+        self.head = (head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def expire(self, cutoff: float) -> int:
+        """Descartar rayos con ts anterior a cutoff avanzando la cola"""
+        removed = 0
+        tail = self.tail
+        while self.size and self.ts[tail] < cutoff:
+            tail = (tail + 1) % self.capacity
+            self.size -= 1
+            removed += 1
+        return removed
+
+    def resize(self, capacity: int):
+        """Cambiar la capacidad conservando los rayos más recientes"""
+        capacity = max(int(capacity), 1)
+        if capacity == self.capacity:
+            return
+        rows = list(self)[-capacity:]
+        total = self.total
+        self.__init__(capacity)
+        for row in rows:
+            self.append(*row)
+        self.total = total
+
+    def indices(self) -> Iterator[int]:
+        """Posiciones ocupadas del más antiguo al más reciente"""
+        tail = self.tail
+        for k in range(self.size):
+            yield (tail + k) % self.capacity
+
+    def order(self, since_id: int = None) -> np.ndarray:
+        """Posiciones ocupadas como array NumPy (más antiguo primero), opcionalmente solo ids >= since_id"""
+        skip = 0 if since_id is None else min(max(since_id - self.oldest_id, 0), self.size)
+        return (self.tail + np.arange(skip, self.size)) % self.capacity
+
+    def slot(self, strike_id: int) -> int:
+        """Posición de un rayo retenido a partir de su id (O(1))"""
+        return (self.tail + strike_id - self.oldest_id) % self.capacity
+
+    def column(self, name: str) -> np.ndarray:
+        """Vista NumPy sin copia de una columna completa (incluye huecos libres)"""
+        return np.frombuffer(getattr(self, name), dtype=np.float64 if name != "station_count" else np.int32)
+
+    def __iter__(self) -> Iterator[Tuple[float, float, float, float, int]]:
+        for i in self.indices():
+            yield (self.ts[i], self.lon[i], self.lat[i], self.amplitude[i], self.station_count[i])
+
+    def get_stats(self) -> Dict:
+        return {
+            "count": self.size,
+            "capacity": self.capacity,
+            "bytes": self.capacity * (4 * 8 + 4)
+        }
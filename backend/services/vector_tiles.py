@@ -0,0 +1,149 @@
+"""
+Teselas vectoriales (Mapbox Vector Tile) de las capas en tiempo real
+Codificador protobuf MVT de puntos y caché por tesela invalidada por versión de capa
+"""
+import math
+import struct
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from services.clustering import mercator
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+EXTENT = 4096
+BUFFER = 64  # margen en unidades de tesela para no cortar iconos en los bordes
+
+# Capas cuyo id es un entero (MMSI, id de rayo); los aviones usan icao24 en
+# hexadecimal, que no siempre es numérico, y se codifican sin id
+NUMERIC_ID_LAYERS = ("ships", "storms")
+
+# Tipos de campo protobuf
+VARINT, FIXED64, LENGTH, FIXED32 = 0, 1, 2, 5
+
+def tile_bounds(z: int, x: int, y: int, buffer: int = 0) -> List[float]:
+    """bbox [lon_min, lat_min, lon_max, lat_max] de una tesela (con margen opcional)"""
+    n = 1 << z
+    pad = buffer / EXTENT
+
+    def lon(tx: float) -> float:
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return [lon(x - pad), lat(y + 1 + pad), lon(x + 1 + pad), lat(y - pad)]
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= 22 and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+def _length_field(field: int, payload: bytes) -> bytes:
+    return _key(field, LENGTH) + _varint(len(payload)) + payload
+
+def _packed(field: int, values: List[int]) -> bytes:
+    return _length_field(field, b"".join(_varint(v) for v in values))
+
+def _value(value) -> bytes:
+    """Mensaje Value de MVT para un valor de propiedad"""
+    if isinstance(value, bool):
+        return _key(7, VARINT) + _varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _key(5, VARINT) + _varint(value)
+        return _key(6, VARINT) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, FIXED64) + struct.pack("<d", value)
+    return _length_field(1, str(value).encode("utf-8"))
+
+def _feature_id(layer: str, value) -> Optional[int]:
+    """Id numérico de la feature (MMSI, id de rayo); None en otras capas o si no es un entero"""
+    if layer not in NUMERIC_ID_LAYERS or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value >= 0 else None
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+def encode_tile(layer: str, features: List[Dict], z: int, x: int, y: int) -> bytes:
+    """Codificar features GeoJSON de tipo Point como una tesela MVT de una capa"""
+    n = 1 << z
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, object], int] = {}
+    encoded = []
+    for feature in features:
+        lon, lat = feature["geometry"]["coordinates"][:2]
+        mx, my = mercator(lon, lat)
+        px = int(round((mx * n - x) * EXTENT))
+        py = int(round((my * n - y) * EXTENT))
+        if not (-BUFFER <= px <= EXTENT + BUFFER and -BUFFER <= py <= EXTENT + BUFFER):
+            continue
+
+        tags = []
+        for name, value in feature.get("properties", {}).items():
+            if value is None or isinstance(value, (dict, list)):
+                continue
+            tags.append(keys.setdefault(name, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+
+        body = b""
+        feature_id = _feature_id(layer, feature.get("id"))
+        if feature_id is not None:
+            body += _key(1, VARINT) + _varint(feature_id)
+        if tags:
+            body += _packed(2, tags)
+        body += _key(3, VARINT) + _varint(1)  # GeomType.POINT
+        body += _packed(4, [(1 << 3) | 1, _zigzag(px), _zigzag(py)])  # MoveTo(1)
+        encoded.append(_length_field(2, body))
+
+    if not encoded:
+        return b""
+
+    layer_body = _key(15, VARINT) + _varint(2) + _length_field(1, layer.encode("utf-8"))
+    layer_body += b"".join(encoded)
+    layer_body += b"".join(_length_field(3, name.encode("utf-8")) for name in keys)
+    layer_body += b"".join(_length_field(4, _value(value)) for _, value in values)
+    layer_body += _key(5, VARINT) + _varint(EXTENT)
+    return _length_field(3, layer_body)
+
+class TileCache:
+    """Caché LRU de teselas codificadas; una entrada vale mientras no cambie la versión de su capa"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Tuple[str, bytes]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: Hashable, version: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, key: Hashable, version: str, tile: bytes):
+        self.entries[key] = (version, tile)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["entries"] = len(self.entries)
+        stats["bytes"] = sum(len(tile) for _, tile in self.entries.values())
+        return stats
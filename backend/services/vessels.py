@@ -0,0 +1,96 @@
+"""
+Registros compactos de buques
+Posición dinámica con __slots__ actualizada in situ y tabla de datos estáticos de larga duración
+"""
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class VesselRecord:
+    """Última posición de un buque; se actualiza en el sitio en cada mensaje"""
+    __slots__ = ("lon", "lat", "sog", "cog", "heading", "ts")
+
+    def __init__(self, lon: float, lat: float, sog: float, cog: float, heading: int, ts: float):
+        self.lon = lon
+        self.lat = lat
+        self.sog = sog
+        self.cog = cog
+        self.heading = heading
+        self.ts = ts
+
+    def update(self, lon: float, lat: float, sog: float, cog: float, heading: int, ts: float):
+        self.lon = lon
+        self.lat = lat
+        self.sog = sog
+        self.cog = cog
+        self.heading = heading
+        self.ts = ts
+
+class StaticRecord:
+    """Datos estáticos de un buque (ShipStaticData o nombre de MetaData)"""
+    __slots__ = ("name", "call_sign", "ship_type", "destination", "length", "beam", "ts")
+
+    def __init__(self, name: str = "", call_sign: str = "", ship_type: int = 0, destination: str = "",
+                 length: int = 0, beam: int = 0, ts: float = 0.0):
+        self.name = name
+        self.call_sign = call_sign
+        self.ship_type = ship_type
+        self.destination = destination
+        self.length = length
+        self.beam = beam
+        self.ts = ts
+
+class StaticDataTable:
+    """Tabla MMSI -> StaticRecord con TTL largo y tamaño acotado.
+
+    Los datos estáticos llegan cada ~6 minutos por buque y cambian muy poco,
+    así que se guardan aparte de las posiciones y se unen al construir la
+    respuesta. Las entradas se ordenan por última actualización para
+    caducarlas desde el principio.
+    """
+
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 20000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.records: "OrderedDict[str, StaticRecord]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, mmsi: str) -> Optional[StaticRecord]:
+        return self.records.get(mmsi)
+
+    def update(self, mmsi: str, now: float, **fields):
+        """Crear o actualizar el registro estático de un buque"""
+        record = self.records.get(mmsi)
+        if record is None:
+            record = self.records[mmsi] = StaticRecord()
+        for name, value in fields.items():
+            setattr(record, name, value)
+        record.ts = now
+        self.records.move_to_end(mmsi)
+        self.expire(now)
+
+    def note_name(self, mmsi: str, name: str, now: float):
+        """Nombre de MetaData.ShipName si aún no hay datos estáticos del buque"""
+        if name and mmsi not in self.records:
+            self.update(mmsi, now, name=name)
+
+    def expire(self, now: float):
+        records = self.records
+        cutoff = now - self.ttl_seconds
+        while records and (len(records) > self.max_entries or next(iter(records.values())).ts < cutoff):
+            records.popitem(last=False)
+
+    def properties(self, mmsi: str) -> Dict:
+        """Propiedades estáticas para la feature GeoJSON"""
+        record = self.records.get(mmsi)
+        if record is None:
+            return {"name": "Unknown"}
+        properties = {"name": record.name or "Unknown"}
+        if record.ship_type:
+            properties["ship_type"] = record.ship_type
+        if record.length:
+            properties["length"] = record.length
+        if record.destination:
+            properties["destination"] = record.destination
+        return properties
@@ -2,17 +2,29 @@
 Servicio de datos meteorológicos
 Integración con Open-Meteo o OpenWeatherMap
 """
-import aiohttp
 from typing import Dict
 from models.config import WeatherConfig
+from services.http_client import HttpClient
+from services.response_cache import ResponseCache
 
 class WeatherService:
-    def __init__(self):
-        self.cache = {}
-        self.cache_ttl = 300  # 5 minutos
+    def __init__(self, http_client: HttpClient = None):
+        self.http = http_client or HttpClient()
+        self.cache = ResponseCache("weather")
     
-    async def get_weather(self, config: WeatherConfig) -> Dict:
-        """Obtener datos meteorológicos"""
+    async def get_weather(self, config: WeatherConfig, refresh: bool = False) -> Dict:
+        """Obtener datos meteorológicos (cacheados por ubicación, unidades e idioma)"""
+        key = (
+            config.provider,
+            config.location["latitude"],
+            config.location["longitude"],
+            config.units,
+            config.language
+        )
+        return await self.cache.get_or_fetch(key, config.cache_ttl, lambda: self._fetch_weather(config), refresh=refresh)
+    
+    async def _fetch_weather(self, config: WeatherConfig) -> Dict:
+        """Obtener datos meteorológicos del proveedor configurado"""
         if config.provider == "Open-Meteo":
             return await self._get_openmeteo(config)
         elif config.provider == "OpenWeatherMap":
@@ -39,40 +51,41 @@ class WeatherService:
             "wind_speed_unit": wind_speed_unit
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    current = data["current"]
-                    hourly = data["hourly"]
+        session = self.http.get_session()
+        async with session.get(url, params=params, trace_request_ctx={"service": "open-meteo"}) as response:
+            self.http.raise_for_rate_limit(response, "Open-Meteo")
+            if response.status == 200:
+                data = await response.json()
+                current = data["current"]
+                hourly = data["hourly"]
                     
-                    # Mapear weather_code a icono y descripción
-                    weather_code = current["weather_code"]
-                    icon, description = self._map_weather_code(weather_code, lang)
+                # Mapear weather_code a icono y descripción
+                weather_code = current["weather_code"]
+                icon, description = self._map_weather_code(weather_code, lang)
                     
-                    # Pronóstico para próximas horas
-                    forecast = []
-                    for i in range(3):
-                        if i < len(hourly["time"]):
-                            time_str = hourly["time"][i]
-                            hour = time_str.split("T")[1].split(":")[0]
-                            forecast.append({
-                                "time": f"{hour}:00",
-                                "temperature": hourly["temperature_2m"][i]
-                            })
+                # Pronóstico para próximas horas
+                forecast = []
+                for i in range(3):
+                    if i < len(hourly["time"]):
+                        time_str = hourly["time"][i]
+                        hour = time_str.split("T")[1].split(":")[0]
+                        forecast.append({
+                            "time": f"{hour}:00",
+                            "temperature": hourly["temperature_2m"][i]
+                        })
                     
-                    return {
-                        "temperature": current["temperature_2m"],
-                        "feels_like": current["apparent_temperature"],
-                        "wind_speed": current["wind_speed_10m"],
-                        "wind_direction": current["wind_direction_10m"],
-                        "cloud_cover": current["cloud_cover"],
-                        "icon": icon,
-                        "description": description,
-                        "forecast": forecast
-                    }
-                else:
-                    raise Exception(f"Error en Open-Meteo: {response.status}")
+                return {
+                    "temperature": current["temperature_2m"],
+                    "feels_like": current["apparent_temperature"],
+                    "wind_speed": current["wind_speed_10m"],
+                    "wind_direction": current["wind_direction_10m"],
+                    "cloud_cover": current["cloud_cover"],
+                    "icon": icon,
+                    "description": description,
+                    "forecast": forecast
+                }
+            else:
+                raise Exception(f"Error en Open-Meteo: {response.status}")
     
     async def _get_openweathermap(self, config: WeatherConfig) -> Dict:
         """Obtener datos de OpenWeatherMap"""
@@ -93,24 +106,25 @@ class WeatherService:
             "lang": lang
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    weather = data["weather"][0]
+        session = self.http.get_session()
+        async with session.get(url, params=params, trace_request_ctx={"service": "openweathermap"}) as response:
+            self.http.raise_for_rate_limit(response, "OpenWeatherMap")
+            if response.status == 200:
+                data = await response.json()
+                weather = data["weather"][0]
                     
-                    return {
-                        "temperature": data["main"]["temp"],
-                        "feels_like": data["main"]["feels_like"],
-                        "wind_speed": data["wind"]["speed"],
-                        "wind_direction": data["wind"].get("deg", 0),
-                        "cloud_cover": data["clouds"]["all"],
-                        "icon": weather["icon"],
-                        "description": weather["description"].capitalize(),
-                        "forecast": []  # Requerir llamada adicional para pronóstico
-                    }
-                else:
-                    raise Exception(f"Error en OpenWeatherMap: {response.status}")
+                return {
+                    "temperature": data["main"]["temp"],
+                    "feels_like": data["main"]["feels_like"],
+                    "wind_speed": data["wind"]["speed"],
+                    "wind_direction": data["wind"].get("deg", 0),
+                    "cloud_cover": data["clouds"]["all"],
+                    "icon": weather["icon"],
+                    "description": weather["description"].capitalize(),
+                    "forecast": []  # Requerir llamada adicional para pronóstico
+                }
+            else:
+                raise Exception(f"Error en OpenWeatherMap: {response.status}")
     
     def _map_weather_code(self, code: int, lang: str) -> tuple:
         """Mapear código WMO a icono y descripción"""
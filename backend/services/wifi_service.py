@@ -6,19 +6,19 @@ import subprocess
 import re
 from typing import List, Dict
 from models.config import WifiConfig
+from services.executor import BlockingExecutor
 
 class WifiService:
-    def __init__(self):
+    def __init__(self, executor: BlockingExecutor = None):
+        self.executor = executor or BlockingExecutor()
         self.cache = {}
     
     async def scan_networks(self, config: WifiConfig) -> List[Dict]:
         """Escanear redes Wi-Fi"""
         try:
             # Usar nmcli (NetworkManager) para escanear redes
-            result = subprocess.run(
+            result = await self.executor.run_process(
                 ["nmcli", "-t", "-f", "SSID,SIGNAL", "device", "wifi", "list"],
-                capture_output=True,
-                text=True,
                 timeout=10
             )
             
@@ -59,10 +59,8 @@ class WifiService:
         """Conectar a una red Wi-Fi"""
         try:
             # Usar nmcli para conectar
-            result = subprocess.run(
+            result = await self.executor.run_process(
                 ["nmcli", "device", "wifi", "connect", ssid, "password", password],
-                capture_output=True,
-                text=True,
                 timeout=30
             )
             
@@ -1,7 +1,11 @@
 import React, { useRef, useEffect, useState } from 'react';
 import maplibregl from 'maplibre-gl';
-import type { Map as MapInstance, GeoJSONSource } from 'maplibre-gl';
+import type { Map as MapInstance, GeoJSONSource, VectorTileSource } from 'maplibre-gl';
 import type { AppConfig, ShipData, FlightData, StormData, AemetRadarData } from '../types';
+import { layerTileUrl } from '../services/api';
+
+const LIVE_LAYERS = ['ships', 'flights', 'storms'] as const;
+const TILE_REFRESH_MS = 5000;
 
 interface MainMapProps {
     config: AppConfig;
@@ -74,22 +78,32 @@ export const MainMap: React.FC<MainMapProps> = ({ config, shipData, flightData,
                         URL.revokeObjectURL(url);
                     };
 
-                    // Add sources and layers
-                    mapInstance.addSource('ships', { type: 'geojson', data: { type: 'FeatureCollection', features: [] } });
+                    // Add sources and layers (GeoJSON fed by the app, or MVT tiles fetched by MapLibre)
+                    const useTiles = mapConfig.live_layers === 'tiles';
+                    const addLiveSource = (layer: typeof LIVE_LAYERS[number]) => {
+                        if (useTiles) {
+                            mapInstance.addSource(layer, { type: 'vector', tiles: [layerTileUrl(layer)], minzoom: 0, maxzoom: 14 });
+                        } else {
+                            mapInstance.addSource(layer, { type: 'geojson', data: { type: 'FeatureCollection', features: [] } });
+                        }
+                    };
+                    const sourceLayer = (layer: string) => (useTiles ? { 'source-layer': layer } : {});
+
+                    addLiveSource('ships');
                     mapInstance.addLayer({
-                        id: 'ships-layer', type: 'symbol', source: 'ships',
+                        id: 'ships-layer', type: 'symbol', source: 'ships', ...sourceLayer('ships'),
                         layout: { 'icon-image': 'ferry-15', 'icon-rotate': ['get', 'cog'], 'icon-rotation-alignment': 'map', 'icon-allow-overlap': true, 'icon-ignore-placement': true }
                     });
 
-                    mapInstance.addSource('flights', { type: 'geojson', data: { type: 'FeatureCollection', features: [] } });
+                    addLiveSource('flights');
                     mapInstance.addLayer({
-                        id: 'flights-layer', type: 'symbol', source: 'flights',
+                        id: 'flights-layer', type: 'symbol', source: 'flights', ...sourceLayer('flights'),
                         layout: { 'icon-image': 'airport-15', 'icon-rotate': ['get', 'head'], 'icon-rotation-alignment': 'map', 'icon-allow-overlap': true, 'icon-ignore-placement': true }
                     });
 
-                    mapInstance.addSource('storms', { type: 'geojson', data: { type: 'FeatureCollection', features: [] } });
+                    addLiveSource('storms');
                     mapInstance.addLayer({
-                        id: 'storms-layer', type: 'symbol', source: 'storms',
+                        id: 'storms-layer', type: 'symbol', source: 'storms', ...sourceLayer('storms'),
                         layout: { 'icon-image': 'lightning-bolt', 'icon-size': 0.6, 'icon-allow-overlap': true, 'icon-ignore-placement': true },
                         paint: {}
                     });
@@ -117,13 +131,25 @@ export const MainMap: React.FC<MainMapProps> = ({ config, shipData, flightData,
 
     // Effect for updating GeoJSON data sources
     useEffect(() => {
-        if (!mapLoaded || !map.current) return;
+        if (!mapLoaded || !map.current || config.map.live_layers === 'tiles') return;
         
         (map.current.getSource('ships') as GeoJSONSource)?.setData(shipData || { type: 'FeatureCollection', features: [] });
         (map.current.getSource('flights') as GeoJSONSource)?.setData(flightData || { type: 'FeatureCollection', features: [] });
         (map.current.getSource('storms') as GeoJSONSource)?.setData(stormData || { type: 'FeatureCollection', features: [] });
 
-    }, [shipData, flightData, stormData, mapLoaded]);
+    }, [shipData, flightData, stormData, mapLoaded, config.map.live_layers]);
+
+    // Effect for refreshing vector tiles: setTiles reloads the visible tiles and the browser
+    // revalidates them with If-None-Match, so unchanged tiles come back as 304
+    useEffect(() => {
+        if (!mapLoaded || !map.current || config.map.live_layers !== 'tiles') return;
+        const interval = setInterval(() => {
+            LIVE_LAYERS.forEach(layer => {
+                (map.current?.getSource(layer) as VectorTileSource | undefined)?.setTiles([layerTileUrl(layer)]);
+            });
+        }, TILE_REFRESH_MS);
+        return () => clearInterval(interval);
+    }, [mapLoaded, config.map.live_layers]);
     
     // Effect for storm decay animation
     useEffect(() => {
@@ -147,11 +173,15 @@ export const MainMap: React.FC<MainMapProps> = ({ config, shipData, flightData,
         const radarSource = map.current.getSource('aemet-radar') as maplibregl.ImageSource;
         if (!radarSource) return;
 
+        // Corners of the AEMET national composite (sent by the backend with cached frames)
+        const coordinates = aemetRadarData.coordinates ?? [[-9.5, 44], [4.5, 44], [4.5, 35], [-9.5, 35]];
+
         const interval = setInterval(() => {
             const frame = aemetRadarData.frames[frameIndex];
-            // In a real scenario, coordinates would come from AEMET API
-            const coordinates: [[number, number], [number, number], [number, number], [number, number]] = [[-9.5, 44], [4.5, 44], [4.5, 35], [-9.5, 35]];
-            radarSource.updateImage({ url: frame.url, coordinates });
+            // Pre-reprojected overlays are cached by the browser per rounded zoom level
+            const zoom = Math.round(map.current?.getZoom() ?? 0);
+            const url = frame.overlay_url ? `${frame.overlay_url}?zoom=${zoom}` : frame.url;
+            radarSource.updateImage({ url, coordinates });
             frameIndex = (frameIndex + 1) % aemetRadarData.frames.length;
         }, 1000 / config.aemet.animation_speed);
 
@@ -4,8 +4,30 @@ import { MainMap } from '../components/MainMap';
 import { Clock } from '../components/Clock';
 import { WeatherDisplay } from '../components/WeatherDisplay';
 import { InfoCarousel } from '../components/InfoCarousel';
-import type { ShipData, WeatherData, FlightData, StormData, StormStrike, AemetRadarData } from '../types';
-import { fetchShipData, fetchWeatherData, fetchFlightData, fetchStormData, fetchAemetRadarData } from '../services/api';
+import type { ShipData, WeatherData, FlightData, StormData, StormStrike, AemetRadarData, Ship, Flight } from '../types';
+import { fetchShipData, fetchWeatherData, fetchFlightData, fetchPredictedFlights, fetchStormData, fetchAemetRadarData, openLayerStream } from '../services/api';
+import type { LayerStreamMessage, StreamLayer } from '../services/api';
+
+// Add a client-side timestamp to calculate age for visual decay
+const withReceivedAt = (features: StormStrike[]): StormStrike[] => {
+    const now = Date.now();
+    return features.map(f => ({ ...f, properties: { ...f.properties, received_at: now } }));
+};
+
+// Apply a snapshot/upsert/remove stream message to a FeatureCollection keyed by id
+function applyKeyedUpdate<F, C extends { type: 'FeatureCollection'; features: F[] }>(
+    prev: C | null,
+    message: LayerStreamMessage,
+    keyOf: (feature: F) => string,
+): C {
+    if (message.op === 'snapshot' || !prev) {
+        return { type: 'FeatureCollection', features: (message.features || []) as F[] } as C;
+    }
+    const byId = new Map(prev.features.map(f => [keyOf(f), f] as [string, F]));
+    (message.ids || []).forEach(id => byId.delete(id));
+    ((message.features || []) as F[]).forEach(f => byId.set(keyOf(f), f));
+    return { ...prev, features: Array.from(byId.values()) };
+}
 
 export const Kiosk: React.FC = () => {
     const config = useContext(ConfigContext);
@@ -30,55 +52,119 @@ export const Kiosk: React.FC = () => {
         return () => clearInterval(interval);
     }, []);
 
-    // Fetch real-time geo data at different intervals
+    // Real-time geo data: pushed over /api/stream, polling only while the stream is down.
+    // In tiles mode MainMap reads the MVT tiles, so full collections are not fetched at all
     useEffect(() => {
-        if (!config) return;
+        if (!config || config.map.live_layers === 'tiles') return;
 
-        const intervals: number[] = [];
+        const layers: StreamLayer[] = [];
+        const pollers: [() => void, number][] = [];
+
+        const fetchShips = async () => {
+            try {
+                setShipData(await fetchShipData());
+            } catch (error) {
+                console.error("Error fetching ship data:", error);
+            }
+        };
+        const fetchFlights = async () => {
+            try {
+                setFlightData(await fetchFlightData());
+            } catch (error) {
+                console.error("Error fetching flight data:", error);
+            }
+        };
+        const fetchStorms = async () => {
+            try {
+                const data = await fetchStormData();
+                setStormData({ ...data, features: withReceivedAt(data.features) });
+            } catch (error) {
+                console.error("Error fetching storm data:", error);
+            }
+        };
 
         if (config.ships.enabled) {
-            const fetchShips = async () => {
-                try {
-                    setShipData(await fetchShipData());
-                } catch (error) {
-                    console.error("Error fetching ship data:", error);
-                }
-            };
-            fetchShips();
-            intervals.push(window.setInterval(fetchShips, 10000));
+            layers.push('ships');
+            pollers.push([fetchShips, 10000]);
         }
-
         if (config.flights.enabled) {
-            const fetchFlights = async () => {
-                try {
-                    setFlightData(await fetchFlightData());
-                } catch (error) {
-                    console.error("Error fetching flight data:", error);
-                }
-            };
-            fetchFlights();
-            intervals.push(window.setInterval(fetchFlights, 8000));
+            layers.push('flights');
+            pollers.push([fetchFlights, 8000]);
         }
-
         if (config.storm.enabled) {
-            const fetchStorms = async () => {
-                try {
-                    const data = await fetchStormData();
-                    const now = Date.now();
-                    const featuresWithTimestamp = data.features.map((f: StormStrike) => ({
-                        ...f,
-                        properties: { ...f.properties, received_at: now }
-                    }));
-                    setStormData({ ...data, features: featuresWithTimestamp });
-                } catch (error) {
-                    console.error("Error fetching storm data:", error);
-                }
-            };
-            fetchStorms();
-            intervals.push(window.setInterval(fetchStorms, 3000));
+            layers.push('storms');
+            pollers.push([fetchStorms, 3000]);
         }
+        if (layers.length === 0) return;
 
-        return () => intervals.forEach(clearInterval);
+        let intervals: number[] = [];
+        const startPolling = () => {
+            if (intervals.length > 0) return;
+            pollers.forEach(([poll, delay]) => {
+                poll();
+                intervals.push(window.setInterval(poll, delay));
+            });
+        };
+        const stopPolling = () => {
+            intervals.forEach(clearInterval);
+            intervals = [];
+        };
+
+        const handleMessage = (message: LayerStreamMessage) => {
+            if (message.op === 'resync') {
+                if (message.layer === 'ships') fetchShips();
+                if (message.layer === 'flights') fetchFlights();
+                if (message.layer === 'storms') fetchStorms();
+                return;
+            }
+            if (message.layer === 'ships') {
+                setShipData(prev => applyKeyedUpdate(prev, message, (f: Ship) => f.properties.mmsi));
+            } else if (message.layer === 'flights') {
+                setFlightData(prev => applyKeyedUpdate(prev, message, (f: Flight) => f.properties.icao24));
+            } else if (message.layer === 'storms') {
+                const incoming = withReceivedAt(message.features || []);
+                setStormData(prev => {
+                    if (message.op === 'snapshot' || !prev) {
+                        return { type: 'FeatureCollection', features: incoming };
+                    }
+                    const cutoff = Date.now() - config.storm.ttl_seconds * 1000;
+                    const features = prev.features
+                        .filter(f => f.properties.ts >= cutoff)
+                        .concat(incoming)
+                        .slice(-config.storm.max_points);
+                    return { type: 'FeatureCollection', features };
+                });
+            }
+        };
+
+        startPolling();
+        const closeStream = openLayerStream(layers, handleMessage, (connected) => {
+            if (connected) {
+                stopPolling();
+            } else {
+                startPolling();
+            }
+        });
+
+        return () => {
+            closeStream();
+            stopPolling();
+        };
+    }, [config]);
+
+    // Smooth aircraft motion between OpenSky polls: the backend extrapolates the
+    // last state vectors, so this does not spend upstream credits
+    useEffect(() => {
+        if (!config || !config.flights.enabled || config.map.live_layers === 'tiles') return;
+        const interpolate = async () => {
+            try {
+                setFlightData(await fetchPredictedFlights());
+            } catch (error) {
+                console.error("Error fetching predicted flights:", error);
+            }
+        };
+        const interval = window.setInterval(interpolate, 2000);
+        return () => clearInterval(interval);
     }, [config]);
 
     if (!config) {
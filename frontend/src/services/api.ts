@@ -13,6 +13,7 @@ import type {
     StormData,
     AemetRadarData
 } from '../types';
+import { LAYER_MEDIA_TYPE, decodeLayer, toShipData, toStormData } from './layerCodec';
 
 // API Base URL - usar proxy en desarrollo o URL directa en producción
 const API_BASE = import.meta.env.VITE_API_BASE || '/api';
@@ -34,6 +35,22 @@ async function fetchAPI<T>(endpoint: string, options?: RequestInit): Promise<T>
     return response.json();
 }
 
+// Dense map layers: request the columnar binary format, fall back to JSON if the server sends it
+async function fetchLayer<T>(endpoint: string, fromBinary: (buffer: ArrayBuffer) => T): Promise<T> {
+    const response = await fetch(`${API_BASE}${endpoint}`, {
+        headers: { Accept: `${LAYER_MEDIA_TYPE}, application/json;q=0.5` },
+    });
+
+    if (!response.ok) {
+        throw new Error(`API Error: ${response.status} ${response.statusText}`);
+    }
+
+    if (response.headers.get('Content-Type')?.startsWith(LAYER_MEDIA_TYPE)) {
+        return fromBinary(await response.arrayBuffer());
+    }
+    return response.json();
+}
+
 // --- CONFIGURATION MANAGEMENT ---
 
 export const fetchConfig = (): Promise<AppConfig> => {
@@ -67,14 +84,26 @@ export const fetchWeatherData = (): Promise<WeatherData> => {
 
 // --- AEMET RADAR ---
 
-export const fetchAemetRadarData = (): Promise<AemetRadarData> => {
-    return fetchAPI<AemetRadarData>('/aemet/radar');
+// Frames cached by the backend come as '/api/aemet/...': resolve them against API_BASE
+const resolveApiUrl = (url: string): string =>
+    url.startsWith('/api/') ? new URL(`${API_BASE}${url.slice(4)}`, window.location.href).href : url;
+
+export const fetchAemetRadarData = async (): Promise<AemetRadarData> => {
+    const data = await fetchAPI<AemetRadarData>('/aemet/radar');
+    return {
+        ...data,
+        frames: data.frames.map(frame => ({
+            ...frame,
+            url: resolveApiUrl(frame.url),
+            overlay_url: frame.overlay_url && resolveApiUrl(frame.overlay_url),
+        })),
+    };
 };
 
 // --- SHIPS DATA ---
 
 export const fetchShipData = (): Promise<ShipData> => {
-    return fetchAPI<ShipData>('/ships');
+    return fetchLayer<ShipData>('/ships', buffer => toShipData(decodeLayer(buffer)));
 };
 
 // --- FLIGHTS DATA ---
@@ -83,10 +112,82 @@ export const fetchFlightData = (): Promise<FlightData> => {
     return fetchAPI<FlightData>('/flights');
 };
 
+// Positions dead-reckoned by the backend from the last OpenSky state vectors (no upstream request)
+export const fetchPredictedFlights = (): Promise<FlightData> => {
+    return fetchAPI<FlightData>('/flights/predicted');
+};
+
 // --- STORM DATA ---
 
 export const fetchStormData = (): Promise<StormData> => {
-    return fetchAPI<StormData>('/storms');
+    return fetchLayer<StormData>('/storms', buffer => toStormData(decodeLayer(buffer)));
+};
+
+// --- VECTOR TILES ---
+
+// Absolute MVT URL template for a live layer (MapLibre needs absolute tile URLs)
+export const layerTileUrl = (layer: 'ships' | 'flights' | 'storms'): string => {
+    const url = new URL(`${API_BASE}/tiles/${layer}/{z}/{x}/{y}.mvt`, window.location.href).href;
+    // URL() escapes the template braces
+    return url.replace(/%7B/g, '{').replace(/%7D/g, '}');
+};
+
+// --- REAL-TIME LAYER STREAM ---
+
+export type StreamLayer = 'ships' | 'flights' | 'storms';
+
+export interface LayerStreamMessage {
+    layer: StreamLayer;
+    op: 'snapshot' | 'add' | 'upsert' | 'remove' | 'resync';
+    features?: any[];
+    ids?: string[];
+}
+
+// Opens the /api/stream WebSocket and reconnects with backoff. Returns a close function.
+export const openLayerStream = (
+    layers: StreamLayer[],
+    onMessage: (message: LayerStreamMessage) => void,
+    onStatus?: (connected: boolean) => void,
+    bbox?: [number, number, number, number],
+): (() => void) => {
+    let socket: WebSocket | null = null;
+    let closed = false;
+    let retryDelay = 1000;
+    let retryTimer: number | undefined;
+
+    const connect = () => {
+        const base = API_BASE.startsWith('http')
+            ? API_BASE.replace(/^http/, 'ws')
+            : `${window.location.protocol === 'https:' ? 'wss' : 'ws'}://${window.location.host}${API_BASE}`;
+        const params = new URLSearchParams({ layers: layers.join(',') });
+        if (bbox) params.set('bbox', bbox.join(','));
+        socket = new WebSocket(`${base}/stream?${params.toString()}`);
+
+        socket.onopen = () => {
+            retryDelay = 1000;
+            onStatus?.(true);
+        };
+        socket.onmessage = (event) => {
+            try {
+                onMessage(JSON.parse(event.data));
+            } catch (error) {
+                console.error("Error parsing stream message:", error);
+            }
+        };
+        socket.onclose = () => {
+            onStatus?.(false);
+            if (closed) return;
+            retryTimer = window.setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    };
+
+    connect();
+    return () => {
+        closed = true;
+        window.clearTimeout(retryTimer);
+        socket?.close();
+    };
 };
 
 // --- NEWS ---
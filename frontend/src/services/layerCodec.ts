@@ -0,0 +1,131 @@
+import type { ShipData, StormData, Ship, StormStrike } from '../types';
+
+// Columnar binary layer format served by /api/ships and /api/storms when the
+// request sends `Accept: application/vnd.reloj.layer` (see backend/services/layer_codec.py).
+export const LAYER_MEDIA_TYPE = 'application/vnd.reloj.layer';
+
+const HEADER_SIZE = 24;
+const COLUMN_SIZE = 12;
+
+export type LayerColumn = Float32Array | Int32Array | Uint32Array | Float64Array | string[];
+
+export interface DecodedLayer {
+    count: number;
+    cursor: number;
+    columns: Record<string, LayerColumn>;
+}
+
+export const decodeLayer = (buffer: ArrayBuffer): DecodedLayer => {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'RLYR') {
+        throw new Error(`Invalid layer buffer (magic ${magic})`);
+    }
+    const ncols = view.getUint8(5);
+    const count = view.getUint32(8, true);
+    const cursor = view.getUint32(12, true);
+    const baseTs = view.getFloat64(16, true);
+
+    const ascii = new TextDecoder('ascii');
+    const utf8 = new TextDecoder('utf-8');
+    const directory: Array<{ name: string; kind: string }> = [];
+    for (let c = 0; c < ncols; c++) {
+        const offset = HEADER_SIZE + c * COLUMN_SIZE;
+        const name = ascii.decode(new Uint8Array(buffer, offset, 8)).replace(/\0+$/, '');
+        directory.push({ name, kind: String.fromCharCode(view.getUint8(offset + 8)) });
+    }
+
+    // Typed array views share the buffer: no copy for numeric columns
+    const columns: Record<string, LayerColumn> = {};
+    let offset = HEADER_SIZE + ncols * COLUMN_SIZE;
+    for (const { name, kind } of directory) {
+        if (kind === 's') {
+            const length = view.getUint32(offset, true);
+            const text = utf8.decode(new Uint8Array(buffer, offset + 4, length));
+            columns[name] = count ? text.split('\n') : [];
+            offset += 4 + length + ((4 - (length % 4)) % 4);
+            continue;
+        }
+        if (kind === 'f') {
+            columns[name] = new Float32Array(buffer, offset, count);
+        } else if (kind === 'u') {
+            columns[name] = new Uint32Array(buffer, offset, count);
+        } else if (kind === 'i') {
+            columns[name] = new Int32Array(buffer, offset, count);
+        } else if (kind === 't') {
+            const offsets = new Int32Array(buffer, offset, count);
+            const ts = new Float64Array(count);
+            for (let k = 0; k < count; k++) ts[k] = baseTs + offsets[k];
+            columns[name] = ts;
+        } else {
+            throw new Error(`Unknown layer column type ${kind}`);
+        }
+        offset += count * 4;
+    }
+    return { count, cursor, columns };
+};
+
+// Float32 columns carry ~1 m precision; round for stable feature properties
+const round = (value: number, digits: number): number => {
+    const factor = 10 ** digits;
+    return Math.round(value * factor) / factor;
+};
+
+export const toShipData = ({ count, cursor, columns }: DecodedLayer): ShipData => {
+    const mmsi = columns.mmsi as Uint32Array;
+    const lon = columns.lon as Float32Array;
+    const lat = columns.lat as Float32Array;
+    const sog = columns.sog as Float32Array;
+    const cog = columns.cog as Float32Array;
+    const heading = columns.heading as Int32Array;
+    const ts = columns.ts as Float64Array;
+    const name = columns.name as string[];
+    const features: Ship[] = new Array(count);
+    for (let k = 0; k < count; k++) {
+        const id = String(mmsi[k]);
+        features[k] = {
+            type: 'Feature',
+            id,
+            geometry: { type: 'Point', coordinates: [round(lon[k], 6), round(lat[k], 6)] },
+            properties: {
+                name: name[k],
+                mmsi: id,
+                sog: round(sog[k], 1),
+                cog: round(cog[k], 1),
+                heading: heading[k],
+                ts: ts[k] / 1000,
+            },
+        };
+    }
+    return { type: 'FeatureCollection', features, cursor };
+};
+
+export const toStormData = ({ count, cursor, columns }: DecodedLayer): StormData => {
+    const id = columns.id as Uint32Array;
+    const lon = columns.lon as Float32Array;
+    const lat = columns.lat as Float32Array;
+    const ts = columns.ts as Float64Array;
+    const amplitude = columns.amp as Float32Array;
+    const stations = columns.stations as Int32Array;
+    const distance = columns.dist_km as Float32Array | undefined;
+    const bearing = columns.bearing as Float32Array | undefined;
+    const features: StormStrike[] = new Array(count);
+    for (let k = 0; k < count; k++) {
+        const strike: StormStrike = {
+            type: 'Feature',
+            id: id[k],
+            geometry: { type: 'Point', coordinates: [round(lon[k], 6), round(lat[k], 6)] },
+            properties: {
+                ts: ts[k],
+                amplitude: round(amplitude[k], 2),
+                station_count: stations[k],
+            },
+        };
+        if (distance && bearing) {
+            strike.properties.distance_km = round(distance[k], 2);
+            strike.properties.bearing = round(bearing[k], 1);
+        }
+        features[k] = strike;
+    }
+    return { type: 'FeatureCollection', features, cursor };
+};
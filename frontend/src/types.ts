@@ -8,6 +8,9 @@ export interface MapConfig {
     center: [number, number];
     zoom_min: number;
     zoom_max: number;
+    cluster_max_zoom: number; // below this zoom ?zoom= requests return clusters
+    cluster_radius_px: number;
+    live_layers: 'geojson' | 'tiles'; // 'tiles' loads ships/flights/storms from /api/tiles
 }
 
 export interface AemetConfig {
@@ -16,6 +19,7 @@ export interface AemetConfig {
     animation_speed: number;
     frame_count: number;
     cache_ttl: number;
+    frame_cache_mb: number; // disk cache for radar frames served from /api/aemet/frames
 }
 
 export interface WeatherConfig {
@@ -27,6 +31,7 @@ export interface WeatherConfig {
         latitude: number;
         longitude: number;
     };
+    cache_ttl: number;
 }
 
 export interface NewsSource {
@@ -36,6 +41,10 @@ export interface NewsSource {
 
 export interface NewsConfig {
     sources: NewsSource[];
+    cache_ttl: number;
+    max_items: number;
+    max_per_source: number;
+    source_timeout: number;
 }
 
 export interface AstronomyConfig {
@@ -50,8 +59,18 @@ export interface EphemeridesConfig {
     language: 'es' | 'en';
 }
 
+export interface CalendarSource {
+    name: string;
+    url: string; // https:// or webcal:// ICS feed
+    username?: string;
+    password?: string;
+}
+
 export interface CalendarConfig {
     ics_filename?: string;
+    sources: CalendarSource[];
+    source_timeout: number;
+    horizon_days: number; // recurring events (RRULE) are expanded this far ahead
 }
 
 
@@ -72,6 +91,7 @@ export interface StormConfig {
         lat: number;
         lon: number;
     };
+    queue_size: number;
 }
 
 export interface ShipsConfig {
@@ -83,11 +103,14 @@ export interface ShipsConfig {
     ws_url: string;
     subscription: {
         BoundingBoxes: [[number, number, number, number]];
-        FilterMessageTypes: ["PositionReport"];
+        FilterMessageTypes: string[]; // e.g. PositionReport, StandardClassBPositionReport, ShipStaticData
     };
     auth?: {
         token: string;
     };
+    reconnect_max_seconds: number;
+    idle_timeout_seconds: number;
+    static_ttl_seconds: number;
 }
 
 
@@ -98,6 +121,11 @@ export interface FlightsConfig {
     ttl_seconds: number;
     client_id: string;
     client_secret: string;
+    track_points: number;
+    max_extrapolation_seconds: number;
+    max_features: number;
+    shard_max_area: number; // square degrees; larger bboxes are fetched as parallel shards
+    daily_credits: number; // 0 = OpenSky default (400 anonymous / 4000 with credentials)
 }
 
 
@@ -105,6 +133,26 @@ export interface WifiConfig {
     interface: string;
 }
 
+export interface HttpConfig {
+    connect_timeout: number;
+    total_timeout: number;
+    limit: number;
+    limit_per_host: number;
+    keepalive_timeout: number;
+    dns_cache_ttl: number;
+}
+
+export interface SchedulerConfig {
+    weather_seconds: number;
+    aemet_seconds: number;
+    flights_seconds: number;
+    news_seconds: number;
+    astronomy_seconds: number;
+    calendar_seconds: number;
+    jitter: number;
+    max_backoff_seconds: number;
+}
+
 export interface DebugConfig {
     log_level: 'DEBUG' | 'INFO' | 'WARNING' | 'ERROR';
 }
@@ -122,6 +170,8 @@ export interface AppConfig {
     ships: ShipsConfig;
     flights: FlightsConfig;
     wifi: WifiConfig;
+    http: HttpConfig;
+    scheduler: SchedulerConfig;
     debug: DebugConfig;
 }
 
@@ -133,6 +183,9 @@ export interface HealthStatus {
     config_source: string;
     config_checksum: string;
     services: Record<string, { status: 'running' | 'stopped' | 'error' | 'connected' | 'ok', details?: string, last_msg_ts?: number, count?: number, last_update_ts?: number }>;
+    // histogram name -> "route method status" / "service status" -> summary
+    latency?: Record<string, Record<string, { count: number; avg_ms: number | null; p50_ms: number; p95_ms: number }>>;
+    stats?: Record<string, any>;
 }
 
 export interface WeatherData {
@@ -147,15 +200,18 @@ export interface WeatherData {
 }
 
 export interface AemetRadarFrame {
-    url: string;
+    url: string; // /api/aemet/frames/{ts} when served from the backend disk cache
     timestamp: number;
+    overlay_url?: string; // Web Mercator, transparent background; accepts ?zoom=
 }
 export interface AemetRadarData {
     frames: AemetRadarFrame[];
+    coordinates?: [[number, number], [number, number], [number, number], [number, number]]; // NW, NE, SE, SW
 }
 
 export interface StormStrike {
     type: 'Feature';
+    id?: number;
     geometry: {
         type: 'Point';
         coordinates: [number, number];
@@ -164,6 +220,8 @@ export interface StormStrike {
         ts: number; // epoch ms
         amplitude?: number;
         station_count?: number;
+        distance_km?: number; // distance from the configured storm location
+        bearing?: number; // degrees from the configured storm location
         received_at?: number; // client-side timestamp
     };
 }
@@ -171,10 +229,12 @@ export interface StormStrike {
 export interface StormData {
     type: 'FeatureCollection';
     features: StormStrike[];
+    cursor?: number; // pass back as ?since= to receive only changes
 }
 
 export interface Ship {
     type: 'Feature';
+    id?: string;
     geometry: {
         type: 'Point';
         coordinates: [number, number];
@@ -186,16 +246,21 @@ export interface Ship {
         cog: number;
         heading: number;
         ts: number;
+        ship_type?: number;
+        length?: number;
+        destination?: string;
     };
 }
 
 export interface ShipData {
     type: 'FeatureCollection';
     features: Ship[];
+    cursor?: number; // pass back as ?since= to receive only changes
 }
 
 export interface Flight {
     type: 'Feature';
+    id?: string;
     geometry: {
         type: 'Point';
         coordinates: [number, number];
@@ -210,18 +275,52 @@ export interface Flight {
         head: number;
         country: string;
         ts: number;
+        extrapolated_seconds?: number; // set by /api/flights/predicted
     };
 }
 
+// Returned by /api/ships, /api/flights and /api/storms with ?zoom= below map.cluster_max_zoom
+export interface ClusterFeature {
+    type: 'Feature';
+    id: string;
+    geometry: {
+        type: 'Point';
+        coordinates: [number, number];
+    };
+    properties: {
+        cluster: true;
+        point_count: number;
+    };
+}
+
+export interface ClusterData {
+    type: 'FeatureCollection';
+    features: Array<ClusterFeature | Ship | Flight | StormStrike>;
+    cursor: number;
+    zoom: number;
+}
+
+export interface LayerDelta<F> {
+    type: 'FeatureCollectionDelta';
+    cursor: number;
+    added: F[];
+    moved: F[];
+    expired: Array<string | number>;
+}
+
 export interface FlightData {
     type: 'FeatureCollection';
     features: Flight[];
+    cursor?: number; // pass back as ?since= to receive only changes
 }
 
 
 export interface NewsItem {
     title: string;
     source: string;
+    link?: string;
+    published?: string;
+    published_ts?: number | null;
 }
 
 export interface EphemeridesData {
@@ -233,13 +332,34 @@ export interface CalendarEvent {
     summary: string;
     start: string;
     end: string;
+    all_day?: boolean;
+    location?: string;
+    calendar?: string; // source name for events from remote calendars
+}
+
+export interface MoonPhaseEvent {
+    phase: 'new_moon' | 'first_quarter' | 'full_moon' | 'last_quarter';
+    name: string;
+    icon: string;
+    date: string;
 }
 
 export interface AstronomyData {
-    sunrise: string;
-    sunset: string;
+    sunrise: string | null;
+    sunset: string | null;
+    solar_noon?: string;
+    civil_dawn?: string | null;
+    civil_dusk?: string | null;
+    nautical_dawn?: string | null;
+    nautical_dusk?: string | null;
+    astronomical_dawn?: string | null;
+    astronomical_dusk?: string | null;
+    moonrise?: string | null;
+    moonset?: string | null;
+    moon_illumination?: number;
     moon_phase: string;
     moon_phase_icon: string;
+    next_phases?: MoonPhaseEvent[];
 }
 
 export interface SeasonalDataItem {